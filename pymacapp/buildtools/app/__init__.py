@@ -1 +1,8 @@
-from .appfactory import App, UTIExtension
\ No newline at end of file
+from .appfactory import App, UTIExtension
+from ._workpath import WorkpathCache
+from ._universal import LipoMerger, merge_universal
+from ._signing import BundleSigner
+from ._inventory import BundleInventory
+from ._qt_pruning import QtProfile
+from ._archive import BundleArchiver
+from ._content_manifest import ContentManifest, bundle_digest
@@ -0,0 +1,267 @@
+import os
+import stat
+import struct
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ...logger import logger
+
+_LOCAL_HEADER = 0x04034b50
+_DATA_DESCRIPTOR = 0x08074b50
+_CENTRAL_HEADER = 0x02014b50
+_END_OF_CENTRAL_DIRECTORY = 0x06054b50
+_ZIP64_END_OF_CENTRAL_DIRECTORY = 0x06064b50
+_ZIP64_LOCATOR = 0x07064b50
+_ZIP64_EXTRA = 0x0001
+
+_STORED = 0
+_DEFLATED = 8
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_MADE_BY_UNIX = 3 << 8
+_VERSION_DEFAULT = 20
+_VERSION_ZIP64 = 45
+_MAX_32 = 0xffffffff
+_MAX_16 = 0xffff
+# members this large may need 64-bit sizes (deflate can grow incompressible data slightly)
+_ZIP64_THRESHOLD = 0xf0000000
+# deflate looks back at most this far, so this much of the previous chunk primes the next one
+_WINDOW = 32 * 1024
+
+
+def _dos_time(mtime: float) -> "tuple[int, int]":
+    t = time.localtime(max(mtime, 315532800))  # zip cannot represent dates before 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), \
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def _deflate_chunk(data: bytes, zdict: bytes, level: int, last: bool) -> bytes:
+    """raw-deflate one chunk of a member; chunks end on a byte boundary (sync flush) so they can be concatenated, and
+    only the last one closes the stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+        zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _needs_zip64_end(count: int, directory_size: int, directory_offset: int) -> bool:
+    return count >= _MAX_16 or directory_size >= _MAX_32 or directory_offset >= _MAX_32
+
+
+class _Member:
+    def __init__(self, arcname: str, path: str, st: os.stat_result) -> None:
+        self.arcname = arcname
+        self.name = arcname.encode("utf-8")
+        self.path = path
+        self.mode = st.st_mode
+        self.time, self.date = _dos_time(st.st_mtime)
+        self.size = st.st_size
+        self.offset = 0
+        self.crc = 0
+        self.compressed_size = 0
+        self.uncompressed_size = 0
+        self.method = _DEFLATED if stat.S_ISREG(self.mode) else _STORED
+        self.zip64 = stat.S_ISREG(self.mode) and self.size >= _ZIP64_THRESHOLD
+
+    @property
+    def flags(self) -> int:
+        return _FLAG_UTF8 | (_FLAG_DATA_DESCRIPTOR if self.method == _DEFLATED else 0)
+
+    @property
+    def version(self) -> int:
+        return _VERSION_ZIP64 if self.zip64 else _VERSION_DEFAULT
+
+
+class BundleArchiver:
+    def __init__(self, level: int = 6, chunk_size: int = 1024 ** 2, max_workers: int = None,
+                 keep_parent: bool = True) -> None:
+        """write a bundle into a zip suitable for notarytool, like `ditto -c -k --keepParent`, but compressing in
+        parallel: members are split into chunks that worker threads deflate independently (each primed with the end of
+        the previous chunk), while a single writer streams headers and compressed data to the output in order, so
+        neither the bundle nor the archive is ever held in memory
+
+        symlinks are stored as symlinks and unix permissions (exec bits) are kept; zip64 is used where needed
+
+        :param level: the deflate level, defaults to 6
+        :type level: int, optional
+        :param chunk_size: the size of the pieces files are compressed in, defaults to 1 MiB
+        :type chunk_size: int, optional
+        :param max_workers: how many chunks are compressed at the same time, defaults to None (os.cpu_count())
+        :type max_workers: int, optional
+        :param keep_parent: store paths as "<name>.app/...", as notarization of an .app expects, defaults to True
+        :type keep_parent: bool, optional
+        """
+        self.level = level
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.keep_parent = keep_parent
+
+    def __repr__(self) -> str:
+        return f"BundleArchiver({self.level=}, {self.chunk_size=}, {self.max_workers=})"
+
+    def members(self, source: str) -> "list[_Member]":
+        """every directory, file and symlink under `source`, in a stable order (directories before their contents)"""
+        source = os.path.abspath(source).rstrip(os.sep)
+        base = os.path.dirname(source) if self.keep_parent else source
+        members = []
+        if self.keep_parent:
+            members.append(_Member(os.path.basename(source) + "/", source, os.lstat(source)))
+        for directory, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for name in sorted(dirnames + filenames):
+                path = os.path.join(directory, name)
+                st = os.lstat(path)
+                arcname = os.path.relpath(path, base).replace(os.sep, "/")
+                if stat.S_ISDIR(st.st_mode):
+                    arcname += "/"
+                elif not (stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode)):
+                    continue
+                members.append(_Member(arcname, path, st))
+        return members
+
+    def _jobs(self, members: "list[_Member]"):
+        """("begin", member) / ("chunk", member, data, zdict, last) / ("end", member), reading files sequentially"""
+        for member in members:
+            yield "begin", member
+            if member.method == _DEFLATED:
+                with open(member.path, "rb") as fp:
+                    zdict = None
+                    data = fp.read(self.chunk_size)
+                    while True:
+                        following = fp.read(self.chunk_size) if data else b""
+                        last = not following
+                        yield "chunk", member, data, zdict, last
+                        if last:
+                            break
+                        zdict = data[-_WINDOW:]
+                        data = following
+            yield "end", member
+
+    def write(self, source: str, output: str) -> dict:
+        """archive `source` (e.g. an .app) into `output`; the archive is written to a temp file and renamed into place
+
+        :param source: the directory to archive
+        :type source: str
+        :param output: the .zip to create
+        :type output: str
+        :return: {"members", "bytes_in", "bytes_out", "seconds"}
+        :rtype: dict
+        """
+        start = time.time()
+        members = self.members(source)
+        # a temp file of its own, so concurrent archives to the same output (e.g. retries) cannot clobber each other
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output)), suffix=".tmp")
+        window = self.max_workers * 2
+        try:
+            with os.fdopen(fd, "wb", buffering=self.chunk_size) as fp, \
+                    ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # mkstemp creates the file owner-only
+                os.fchmod(fp.fileno(), 0o644)
+                pending = deque()
+                for job in self._jobs(members):
+                    if job[0] == "chunk":
+                        _, member, data, zdict, last = job
+                        pending.append((job, executor.submit(_deflate_chunk, data, zdict, self.level, last)))
+                    else:
+                        pending.append((job, None))
+                    while len(pending) > window:
+                        self._emit(fp, *pending.popleft())
+                while pending:
+                    self._emit(fp, *pending.popleft())
+                self._write_central_directory(fp, members)
+                size = fp.tell()
+            os.replace(tmp, output)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        report = {"members": len(members), "bytes_in": sum(m.uncompressed_size for m in members), "bytes_out": size,
+                  "seconds": round(time.time() - start, 2)}
+        logger.info(f"archived '{source}' into '{output}': {report}")
+        return report
+
+    def _emit(self, fp, job: tuple, future):
+        kind, member = job[0], job[1]
+        if kind == "begin":
+            member.offset = fp.tell()
+            if member.method == _DEFLATED:
+                self._write_local_header(fp, member)
+            else:
+                content = os.readlink(member.path).encode("utf-8") if stat.S_ISLNK(member.mode) else b""
+                member.crc = zlib.crc32(content)
+                member.compressed_size = member.uncompressed_size = len(content)
+                self._write_local_header(fp, member)
+                fp.write(content)
+        elif kind == "chunk":
+            data = job[2]
+            compressed = future.result()
+            member.crc = zlib.crc32(data, member.crc)
+            member.uncompressed_size += len(data)
+            member.compressed_size += len(compressed)
+            fp.write(compressed)
+        elif member.method == _DEFLATED:
+            if member.zip64:
+                fp.write(struct.pack("<IIQQ", _DATA_DESCRIPTOR, member.crc, member.compressed_size,
+                                     member.uncompressed_size))
+            else:
+                fp.write(struct.pack("<IIII", _DATA_DESCRIPTOR, member.crc, member.compressed_size,
+                                     member.uncompressed_size))
+
+    @staticmethod
+    def _write_local_header(fp, member: _Member):
+        if member.method == _DEFLATED:
+            # sizes and crc follow the data in a descriptor
+            crc, compressed, uncompressed = 0, 0, 0
+        else:
+            crc, compressed, uncompressed = member.crc, member.compressed_size, member.uncompressed_size
+        extra = b""
+        if member.zip64:
+            extra = struct.pack("<HHQQ", _ZIP64_EXTRA, 16, 0, 0)
+            compressed = uncompressed = _MAX_32
+        fp.write(struct.pack("<IHHHHHIIIHH", _LOCAL_HEADER, member.version, member.flags, member.method, member.time,
+                             member.date, crc, compressed, uncompressed, len(member.name), len(extra)))
+        fp.write(member.name)
+        fp.write(extra)
+
+    @staticmethod
+    def _write_central_directory(fp, members: "list[_Member]"):
+        directory_offset = fp.tell()
+        for member in members:
+            fields = []
+            uncompressed, compressed, offset = member.uncompressed_size, member.compressed_size, member.offset
+            if uncompressed >= _MAX_32 or member.zip64:
+                fields.append(uncompressed)
+                uncompressed = _MAX_32
+            if compressed >= _MAX_32 or member.zip64:
+                fields.append(compressed)
+                compressed = _MAX_32
+            if offset >= _MAX_32:
+                fields.append(offset)
+                offset = _MAX_32
+            extra = struct.pack(f"<HH{len(fields)}Q", _ZIP64_EXTRA, 8 * len(fields), *fields) if fields else b""
+            version = _VERSION_ZIP64 if fields else member.version
+            external = (member.mode & 0xffff) << 16
+            if stat.S_ISDIR(member.mode):
+                external |= 0x10  # MS-DOS directory attribute
+            fp.write(struct.pack("<IHHHHHHIIIHHHHHII", _CENTRAL_HEADER, _MADE_BY_UNIX | version, version,
+                                 member.flags, member.method, member.time, member.date, member.crc, compressed,
+                                 uncompressed, len(member.name), len(extra), 0, 0, 0, external, offset))
+            fp.write(member.name)
+            fp.write(extra)
+        directory_size = fp.tell() - directory_offset
+        count = len(members)
+        if _needs_zip64_end(count, directory_size, directory_offset):
+            zip64_offset = fp.tell()
+            fp.write(struct.pack("<IQHHIIQQQQ", _ZIP64_END_OF_CENTRAL_DIRECTORY, 44, _MADE_BY_UNIX | _VERSION_ZIP64,
+                                 _VERSION_ZIP64, 0, 0, count, count, directory_size, directory_offset))
+            fp.write(struct.pack("<IIQI", _ZIP64_LOCATOR, 0, zip64_offset, 1))
+            count, directory_size, directory_offset = min(count, _MAX_16), min(directory_size, _MAX_32), \
+                min(directory_offset, _MAX_32)
+        fp.write(struct.pack("<IHHHHIIH", _END_OF_CENTRAL_DIRECTORY, 0, 0, count, count, directory_size,
+                             directory_offset, 0))
+
+
+def archive_bundle(source: str, output: str, **kwargs) -> dict:
+    """write `source` into the zip `output` with a BundleArchiver(**kwargs)"""
+    return BundleArchiver(**kwargs).write(source, output)
@@ -0,0 +1,131 @@
+import ast
+import os
+import platform
+import sys
+from importlib import metadata
+from ...hashing import sha256_file, sha256_json
+from ...helpers import load_json, write_json_atomic
+from ...logger import logger
+from ...pyinstaller import pyinstaller_version
+
+_FORMAT_VERSION = 1
+
+
+def _module_files(root: str, module: str) -> "list[str]":
+    """files under `root` that importing `module` (dotted) would execute: every package __init__ on the way and the
+    module itself"""
+    files = []
+    parts = module.split(".")
+    for depth in range(1, len(parts) + 1):
+        base = os.path.join(root, *parts[:depth])
+        for candidate in (base + ".py", os.path.join(base, "__init__.py")):
+            if os.path.isfile(candidate):
+                files.append(candidate)
+    return files
+
+
+def project_modules(main_script: str) -> "list[str]":
+    """the main script plus every module of the project (the main script's directory) that it imports, transitively;
+    third-party and standard library imports are covered by the environment fingerprint instead"""
+    root = os.path.dirname(os.path.abspath(main_script))
+    seen = set()
+    pending = [os.path.abspath(main_script)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            with open(path, "rb") as fp:
+                tree = ast.parse(fp.read(), filename=path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        package = os.path.relpath(os.path.dirname(path), root).replace(os.sep, ".").strip(".")
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    anchor = package.split(".") if package else []
+                    anchor = anchor[:len(anchor) - (node.level - 1)] if node.level > 1 else anchor
+                    base = ".".join(anchor + ([node.module] if node.module else []))
+                else:
+                    base = node.module or ""
+                # `from pkg import name` may import the submodule pkg.name
+                names = [base] + [f"{base}.{alias.name}" if base else alias.name for alias in node.names]
+            else:
+                continue
+            for name in names:
+                if name:
+                    pending.extend(_module_files(root, name))
+    return sorted(seen)
+
+
+def spec_data_files(spec_file: str) -> "list[str]":
+    """the files referenced by literal `datas=[(src, dest), ...]` entries of a .spec"""
+    try:
+        with open(spec_file, "rb") as fp:
+            tree = ast.parse(fp.read(), filename=spec_file)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    spec_dir = os.path.dirname(os.path.abspath(spec_file))
+    files = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.keyword) and node.arg == "datas":
+            try:
+                datas = ast.literal_eval(node.value)
+            except ValueError:
+                logger.debug(f"datas in '{spec_file}' is not a literal; data files are not tracked")
+                continue
+            for src, _ in datas:
+                src = os.path.join(spec_dir, src)
+                if os.path.isdir(src):
+                    for directory, _, filenames in os.walk(src):
+                        files.extend(os.path.join(directory, filename) for filename in filenames)
+                elif os.path.isfile(src):
+                    files.append(src)
+    return sorted(files)
+
+
+def environment_fingerprint() -> dict:
+    """the interpreter and every installed distribution (name and version)"""
+    distributions = sorted({f"{dist.metadata['Name']}=={dist.version}" for dist in metadata.distributions()
+                            if dist.metadata['Name']})
+    return {"python": sys.version, "executable": sys.executable, "machine": platform.machine(),
+            "pyinstaller": pyinstaller_version(), "distributions": sha256_json(distributions)}
+
+
+class BuildManifest:
+    def __init__(self, spec_file: str, main_script: str = None, extra_files: "list[str]" = None) -> None:
+        """content hashes of everything a pyinstaller build depends on, so an unchanged app can be reused
+
+        :param spec_file: the .spec pyinstaller builds from
+        :type spec_file: str
+        :param main_script: the app's main script; it and the project modules it imports are tracked, defaults to None
+        :type main_script: str, optional
+        :param extra_files: any other inputs (icon, entitlements, ...), defaults to None
+        :type extra_files: list[str], optional
+        """
+        files = [spec_file] + spec_data_files(spec_file) + [f for f in (extra_files or []) if f]
+        if main_script:
+            files += project_modules(main_script)
+        self.data = {
+            "version": _FORMAT_VERSION,
+            "files": {os.path.abspath(f): sha256_file(f) for f in sorted(set(files)) if os.path.isfile(f)},
+            "environment": environment_fingerprint(),
+        }
+
+    def __repr__(self) -> str:
+        return f"BuildManifest(files={len(self.data['files'])})"
+
+    @staticmethod
+    def path_for(app: str) -> str:
+        """where the manifest of a built `.app` is kept (next to it)"""
+        return f"{app.rstrip(os.sep)}.build-manifest.json"
+
+    def matches(self, path: str) -> bool:
+        """whether the manifest saved at `path` describes exactly the same inputs"""
+        return load_json(path) == self.data
+
+    def write(self, path: str):
+        write_json_atomic(path, self.data)
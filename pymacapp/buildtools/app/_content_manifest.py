@@ -0,0 +1,139 @@
+import hashlib
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ...hashing import sha256_mmap
+from ...helpers import load_json, write_json_atomic
+from ...logger import logger
+
+_FORMAT_VERSION = 1
+# files at least this large are hashed from a memory map, one per task
+MMAP_THRESHOLD = 1024 ** 2
+# smaller files are read whole, this many per task, so thousands of .pyc files do not cost a task each
+SMALL_FILE_BATCH = 64
+
+
+def _hash_small_files(paths: "list[str]") -> "list[str]":
+    digests = []
+    for path in paths:
+        with open(path, "rb") as fp:
+            digests.append(hashlib.sha256(fp.read()).hexdigest())
+    return digests
+
+
+class ContentManifest:
+    def __init__(self, entries: "dict[str, str]") -> None:
+        """the canonical contents of a bundle: every path (relative to the bundle, "/"-separated) mapped to what it is,
+        i.e. "file:<mode>:<sha256>", "link:<target>" or "dir:<mode>", plus one root digest over all of it
+
+        two bundles with the same root digest have the same files, links, directories and permissions, so the digest can
+        be used as a cache key or to tell whether a bundle has to be signed or uploaded again; timestamps are ignored
+
+        :param entries: path -> entry, as built by ContentManifest.of(...)
+        :type entries: dict[str, str]
+        """
+        self.entries = dict(sorted(entries.items()))
+        self._root_digest = None
+
+    def __repr__(self) -> str:
+        return f"ContentManifest({len(self.entries)} entries, {self.root_digest=})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ContentManifest) and self.root_digest == other.root_digest
+
+    @property
+    def root_digest(self) -> str:
+        """hex sha256 over every entry, in path order"""
+        if self._root_digest is None:
+            digest = hashlib.sha256()
+            for path, entry in self.entries.items():
+                digest.update(f"{path}\0{entry}\n".encode("utf-8"))
+            self._root_digest = digest.hexdigest()
+        return self._root_digest
+
+    @classmethod
+    def of(cls, bundle: str, max_workers: int = None, mmap_threshold: int = MMAP_THRESHOLD,
+           batch_size: int = SMALL_FILE_BATCH) -> "ContentManifest":
+        """walk `bundle` and hash its files in a thread pool: large files from a memory map one at a time, small files
+        in batches
+
+        :param bundle: the directory (e.g. an .app) to describe
+        :type bundle: str
+        :param max_workers: how many files are hashed at the same time, defaults to None (executor default)
+        :type max_workers: int, optional
+        :param mmap_threshold: files at least this many bytes are memory mapped, defaults to MMAP_THRESHOLD (1 MiB)
+        :type mmap_threshold: int, optional
+        :param batch_size: how many small files one task reads, defaults to SMALL_FILE_BATCH
+        :type batch_size: int, optional
+        :return: the manifest
+        :rtype: ContentManifest
+        """
+        start = time.time()
+        bundle = os.path.abspath(bundle).rstrip(os.sep)
+        entries, modes, large, small = {}, {}, [], []
+        pending = [bundle]
+        while pending:
+            directory = pending.pop()
+            for entry in os.scandir(directory):
+                rel = os.path.relpath(entry.path, bundle).replace(os.sep, "/")
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISLNK(st.st_mode):
+                    entries[rel] = f"link:{os.readlink(entry.path)}"
+                elif stat.S_ISDIR(st.st_mode):
+                    entries[rel] = f"dir:{stat.S_IMODE(st.st_mode):o}"
+                    pending.append(entry.path)
+                elif stat.S_ISREG(st.st_mode):
+                    modes[rel] = stat.S_IMODE(st.st_mode)
+                    (large if st.st_size >= mmap_threshold else small).append((rel, entry.path))
+        batches = [small[i:i + batch_size] for i in range(0, len(small), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            large_digests = executor.map(sha256_mmap, [path for _, path in large])
+            small_digests = executor.map(_hash_small_files, [[path for _, path in batch] for batch in batches])
+            for (rel, _), digest in zip(large, large_digests):
+                entries[rel] = f"file:{modes[rel]:o}:{digest}"
+            for batch, digests in zip(batches, small_digests):
+                for (rel, _), digest in zip(batch, digests):
+                    entries[rel] = f"file:{modes[rel]:o}:{digest}"
+        manifest = cls(entries)
+        logger.debug(f"hashed {len(modes)} file(s) of '{bundle}' in {round(time.time() - start, 2)} second(s): "
+                     f"{manifest.root_digest}")
+        return manifest
+
+    def diff(self, other: "ContentManifest") -> "dict[str, list[str]]":
+        """what changed from this manifest to `other`
+
+        :param other: the newer manifest
+        :type other: ContentManifest
+        :return: {"added": [paths], "removed": [paths], "changed": [paths]}, each sorted; all empty if the root digests match
+        :rtype: dict[str, list[str]]
+        """
+        if self.root_digest == other.root_digest:
+            return {"added": [], "removed": [], "changed": []}
+        return {"added": sorted(other.entries.keys() - self.entries.keys()),
+                "removed": sorted(self.entries.keys() - other.entries.keys()),
+                "changed": sorted(path for path in self.entries.keys() & other.entries.keys()
+                                  if self.entries[path] != other.entries[path])}
+
+    def to_json(self) -> dict:
+        return {"version": _FORMAT_VERSION, "root": self.root_digest, "entries": self.entries}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ContentManifest":
+        """a manifest written by .to_json(), or None if `data` is not one (or was written by another format version)"""
+        if not isinstance(data, dict) or data.get("version") != _FORMAT_VERSION or "entries" not in data:
+            return None
+        return cls(data["entries"])
+
+    def write(self, path: str):
+        write_json_atomic(path, self.to_json())
+
+    @classmethod
+    def load(cls, path: str) -> "ContentManifest":
+        """the manifest written to `path`, or None"""
+        return cls.from_json(load_json(path))
+
+
+def bundle_digest(bundle: str, **kwargs) -> str:
+    """the root digest of ContentManifest.of(bundle, **kwargs)"""
+    return ContentManifest.of(bundle, **kwargs).root_digest
@@ -1,8 +1,7 @@
-import plistlib
 from ...logger import logger
-import os
 from dataclasses import dataclass
-from ...command import Command
+from ._info_plist import InfoPlistEditor
+from ._uti_index import uti_index, iter_dump_file, match_dump
 
 
 @dataclass(frozen=True)
@@ -30,7 +29,7 @@ class UTIExtension:
         :param ext: a valid UTI extension
         """
         if validate:
-            if ext not in self.find_local(ext):
+            if ext not in uti_index:
                 logger.warning(f"extension '{ext}' is not currently registered on this machine; may not be valid")
         self.ext = ext
         self.rank = rank
@@ -45,59 +44,65 @@ class UTIExtension:
     @staticmethod
     def find_local(search: str) -> "list[str]":
         """
-        Search the local machine for all registered UTIs containing 'search'
+        Search the local machine for all registered UTIs containing 'search'; answered from a persistent index of the lsregister dump that is rebuilt only when LaunchServices changes
         :param search: the (sub)string to search for
         :return: a list of matches (strings)
         """
         logger.info(f"searching for '{search}'")
-        proc, out, err = Command.run("/System/Library/Frameworks/CoreServices.framework/Frameworks/LaunchServices.framework/Versions/A/Support/lsregister -dump", suppress_log=True)
-        possible_utis = []
-        for line in out.splitlines():
-            if "uti" in line[0:3]:
-                uti = (line.split(":")[1]).strip()
-                if search in uti:
-                    logger.debug(f"found possible uti for '{search}': '{uti}'")
-                    if uti not in possible_utis:
-                        possible_utis.append(uti)
+        possible_utis = uti_index.search(search)
         logger.info(f"found {len(possible_utis)} possible utis (returned as list)")
         return possible_utis
 
     @staticmethod
-    def add_custom_doc_types(pl_file: str, extensions: "list[UTIExtension]"):
+    def validate_many(extensions: "list", dump: str = None) -> "dict[str, bool]":
         """
-        add a list of extensions to a plist file
-        :param pl_file: the Info.plist file to add to
-        :param extensions: list of UTIExtensions
-        :return: True (if finishes without error)
+        Check many extensions against the UTIs registered on this machine in a single pass over the lsregister dump
+        :param extensions: UTIs (strings or UTIExtensions) to validate
+        :param dump: path to a saved `lsregister -dump` output to check against instead of the local machine, defaults to None
+        :return: a dict mapping each extension (as a string) to whether it is registered, in the order given
         """
-        # load the plist and init
-        pl = None
-        with open(pl_file, 'rb') as fp:
-            pl = plistlib.load(fp)
-        os.remove(pl_file)
-        logger.debug(f"loaded Info.plist: {pl}")
+        names = [str(ext) for ext in extensions]
+        if dump:
+            found = match_dump(iter_dump_file(dump), names)
+        else:
+            found = {name for name in names if name in uti_index}
+        results = {name: name in found for name in names}
+        for name, valid in results.items():
+            if not valid:
+                logger.warning(f"extension '{name}' is not currently registered on this machine; may not be valid")
+        return results
 
-        # add the data
-        pl['CFBundleDocumentTypes'] = []
+    @staticmethod
+    def document_types(extensions: "list[UTIExtension]") -> "list[dict]":
+        """
+        build the CFBundleDocumentTypes entries for a list of extensions
+        :param extensions: list of UTIExtensions
+        :return: a list of document type dicts
+        """
+        document_types = []
         for ext in extensions:
             logger.debug(f"attempting to add document type '{ext}' to info.plist")
             try:
                 file_ext = str(ext).split(".")[-1:][0]
             except Exception as e:
                 file_ext = str(ext)
-            pl['CFBundleDocumentTypes'].append({
+            document_types.append({
                 'CFBundleTypeName': f"{str(ext)}",
                 'CFBundleTypeRole': ext.role,
                 'LSHandlerRank': ext.rank,
                 'LSItemContentTypes': [str(ext)],
                 'CFBundleTypeExtensions': [file_ext]
             })
+        return document_types
 
-        # save data
-        with open(pl_file, 'w') as fp:
-            pass
-        with open(pl_file, 'wb') as fp:
-            plistlib.dump(pl, fp)
-
-        # done
+    @staticmethod
+    def add_custom_doc_types(pl_file: str, extensions: "list[UTIExtension]"):
+        """
+        add a list of extensions to a plist file
+        :param pl_file: the Info.plist file to add to
+        :param extensions: list of UTIExtensions
+        :return: True (if finishes without error)
+        """
+        with InfoPlistEditor(pl_file) as pl:
+            pl.set_document_types(UTIExtension.document_types(extensions))
         return True
@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from ...hashing import sha256_file
+from ...logger import logger
+from ._signing import _is_bundle, _is_bundle_executable
+
+# files a code signature owns; they must stay regular files
+_SIGNATURE_NAMES = ("_CodeSignature", "CodeResources", "Info.plist", "PkgInfo")
+
+
+def _candidates(app: str, min_size: int) -> "list[tuple[str, str, int, int]]":
+    """(path, innermost bundle, size, mode) of every regular file that may be replaced by a symlink"""
+    found = []
+    pending = [(app, app)]
+    while pending:
+        directory, bundle = pending.pop()
+        for entry in os.scandir(directory):
+            if entry.is_symlink() or entry.name in _SIGNATURE_NAMES:
+                continue
+            if entry.is_dir():
+                pending.append((entry.path, entry.path if _is_bundle(entry.path) else bundle))
+            elif entry.is_file():
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_size >= min_size and stat.st_nlink == 1 and not _is_bundle_executable(entry.path, bundle):
+                    found.append((entry.path, bundle, stat.st_size, stat.st_mode & 0o7777))
+    return found
+
+
+def _replace_with_link(path: str, target: str):
+    link = os.path.relpath(target, os.path.dirname(path))
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.dedup")
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(link, tmp)
+    os.replace(tmp, path)
+
+
+def deduplicate(app: str, min_size: int = 1024, max_workers: int = None, dry_run: bool = False) -> dict:
+    """replace byte-identical copies of a file with relative symlinks to one of them
+
+    links never cross a nested bundle (framework, helper app, plugin bundle) boundary, since a bundle's seal only
+    accepts symlinks that resolve inside it; signature files and bundle executables are never replaced, and copies
+    only count as identical if their permissions match too; run before signing
+
+    :param app: the built .app
+    :type app: str
+    :param min_size: ignore files smaller than this many bytes, defaults to 1024
+    :type min_size: int, optional
+    :param max_workers: how many files are hashed at the same time, defaults to None (executor default)
+    :type max_workers: int, optional
+    :param dry_run: only report what would be replaced, defaults to False
+    :type dry_run: bool, optional
+    :return: {"files": replaced count, "bytes_saved": int, "groups": [{"kept": path, "linked": [paths], "size": int}]}
+    :rtype: dict
+    """
+    app = os.path.abspath(app).rstrip(os.sep)
+    candidates = _candidates(app, min_size)
+    # only files that share a size with another file in the same bundle can be duplicates; hash just those
+    by_size = {}
+    for path, bundle, size, mode in candidates:
+        by_size.setdefault((bundle, size, mode), []).append(path)
+    to_hash = [path for paths in by_size.values() if len(paths) > 1 for path in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        digests = dict(zip(to_hash, executor.map(sha256_file, to_hash)))
+    groups = {}
+    for (bundle, size, mode), paths in by_size.items():
+        for path in paths:
+            if path in digests:
+                groups.setdefault((bundle, size, mode, digests[path]), []).append(path)
+    report = {"files": 0, "bytes_saved": 0, "groups": []}
+    for (_, size, _, _), paths in sorted(groups.items(), key=lambda item: item[1][0]):
+        if len(paths) < 2:
+            continue
+        # keep the copy in Frameworks/ (where PyInstaller puts the real binaries), then the shortest path
+        kept = min(paths, key=lambda p: (f"{os.sep}Frameworks{os.sep}" not in p, len(p), p))
+        linked = sorted(p for p in paths if p != kept)
+        if not dry_run:
+            for path in linked:
+                _replace_with_link(path, kept)
+        report["groups"].append({"kept": os.path.relpath(kept, app), "size": size,
+                                 "linked": [os.path.relpath(p, app) for p in linked]})
+        report["files"] += len(linked)
+        report["bytes_saved"] += size * len(linked)
+    logger.info(f"{'would replace' if dry_run else 'replaced'} {report['files']} duplicate file(s) in '{app}' with "
+                f"symlinks ({report['bytes_saved']} bytes)")
+    return report
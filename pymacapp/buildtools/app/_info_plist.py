@@ -0,0 +1,104 @@
+import copy
+import os
+import plistlib
+import tempfile
+from ...logger import logger
+
+_BINARY_HEADER = b"bplist00"
+
+
+class InfoPlistEditor:
+    def __init__(self, path: str, binary: bool = None) -> None:
+        """collect changes to an Info.plist and write them all at once; the file is replaced atomically (temp file +
+        rename), so a failure part-way through never leaves the bundle without an Info.plist
+
+        use as a context manager; changes are committed when the block exits without an exception::
+
+            with InfoPlistEditor(pl_file) as pl:
+                pl.set_url_types(identifier, [schema])
+                pl["LSMinimumSystemVersion"] = "11.0"
+
+        :param path: the Info.plist to edit
+        :type path: str
+        :param binary: write the binary plist format (faster to load at launch); defaults to None (keep the current format)
+        :type binary: bool, optional
+        """
+        self.path = path
+        with open(self.path, "rb") as fp:
+            raw = fp.read()
+        self._was_binary = raw.startswith(_BINARY_HEADER)
+        self.binary = self._was_binary if binary is None else binary
+        self._original: dict = plistlib.loads(raw)
+        self.data: dict = copy.deepcopy(self._original)
+        logger.debug(f"loaded Info.plist: {self._original}")
+
+    def __repr__(self) -> str:
+        return f"InfoPlistEditor({self.path=})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def __getitem__(self, key: str):
+        return self.data[key]
+
+    def __setitem__(self, key: str, value):
+        self.data[key] = value
+
+    def __delitem__(self, key: str):
+        del self.data[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+    def update(self, values: dict):
+        self.data.update(values)
+
+    def set_url_types(self, identifier: str, schemes: "list[str]"):
+        """register the app as the handler of custom url schemes (CFBundleURLTypes)"""
+        self.data['CFBundleURLTypes'] = [{
+            'CFBundleURLName': identifier,
+            'CFBundleURLSchemes': list(schemes)
+        }]
+
+    def set_document_types(self, document_types: "list[dict]"):
+        """register the document types the app can open (CFBundleDocumentTypes)"""
+        self.data['CFBundleDocumentTypes'] = list(document_types)
+
+    @property
+    def changed(self) -> bool:
+        return self.data != self._original or self.binary != self._was_binary
+
+    def commit(self) -> bool:
+        """write the pending changes, if there are any
+
+        :return: True if the Info.plist was rewritten
+        :rtype: bool
+        """
+        if not self.changed:
+            logger.debug(f"no changes to {self.path}")
+            return False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".Info.", suffix=".plist")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                plistlib.dump(self.data, fp, fmt=plistlib.FMT_BINARY if self.binary else plistlib.FMT_XML)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.chmod(tmp, os.stat(self.path).st_mode & 0o7777)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        logger.debug(f"wrote Info.plist: {self.data}")
+        self._original = copy.deepcopy(self.data)
+        self._was_binary = self.binary
+        return True
@@ -0,0 +1,169 @@
+import os
+import plistlib
+from concurrent.futures import ThreadPoolExecutor
+from ...logger import logger
+from ...macho import MachOError, MachOFile, MH_BUNDLE, MH_EXECUTE, parse_macho
+
+# libraries the OS provides; they are never expected inside a bundle
+SYSTEM_PREFIXES = ("/usr/lib/", "/System/Library/")
+
+
+def _is_python_library(path: str) -> bool:
+    # the PyInstaller bootloader dlopen()s the interpreter instead of linking it
+    name = os.path.basename(path)
+    return name == "Python" or name.startswith("libpython")
+
+
+class BundleInventory:
+    def __init__(self, app: str, max_workers: int = None) -> None:
+        """every Mach-O file of a bundle (found by its magic bytes), what it links against and what links against it
+
+        :param app: the .app bundle
+        :type app: str
+        :param max_workers: how many files are parsed at the same time, defaults to None (executor default)
+        :type max_workers: int, optional
+        """
+        self.app = os.path.realpath(app)
+        self.binaries: "dict[str, MachOFile]" = {}
+        paths = []
+        for directory, _, filenames in os.walk(self.app):
+            paths.extend(os.path.join(directory, name) for name in filenames)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, binary in zip(paths, executor.map(self._parse, paths)):
+                if binary:
+                    self.binaries[path] = binary
+        self.main_executable = self._main_executable()
+        # binary -> resolved dependencies inside the bundle, and the install names that could not be resolved
+        self.edges: "dict[str, list[str]]" = {}
+        self.missing: "dict[str, list[str]]" = {}
+        for path, binary in self.binaries.items():
+            self.edges[path] = []
+            for name in binary.dependencies:
+                if name.startswith(SYSTEM_PREFIXES):
+                    continue
+                resolved = self.resolve(path, name)
+                if resolved:
+                    self.edges[path].append(resolved)
+                elif name not in binary.weak_dependencies:
+                    self.missing.setdefault(path, []).append(name)
+
+    def __repr__(self) -> str:
+        return f"BundleInventory({self.app=}, binaries={len(self.binaries)})"
+
+    @staticmethod
+    def _parse(path: str) -> MachOFile:
+        try:
+            return parse_macho(path)
+        except (MachOError, OSError) as e:
+            logger.warning(f"unable to parse '{path}': {e}")
+            return None
+
+    def _main_executable(self) -> str:
+        name = os.path.splitext(os.path.basename(self.app))[0]
+        try:
+            with open(os.path.join(self.app, "Contents", "Info.plist"), "rb") as fp:
+                name = plistlib.load(fp).get("CFBundleExecutable", name)
+        except (OSError, plistlib.InvalidFileException):
+            pass
+        path = os.path.join(self.app, "Contents", "MacOS", name)
+        return path if path in self.binaries else None
+
+    def _expand(self, path: str, loader: str) -> str:
+        if path.startswith("@executable_path/") and self.main_executable:
+            return os.path.join(os.path.dirname(self.main_executable), path[len("@executable_path/"):])
+        if path.startswith("@loader_path/"):
+            return os.path.join(os.path.dirname(loader), path[len("@loader_path/"):])
+        return path
+
+    def resolve(self, loader: str, name: str) -> str:
+        """the binary of this bundle that dyld would load for the install name `name` linked by `loader`, or None
+
+        @rpath is searched in the rpaths of `loader` and then of the main executable
+        """
+        if name.startswith("@rpath/"):
+            rest = name[len("@rpath/"):]
+            candidates = [os.path.join(self._expand(rpath, loader), rest) for rpath in self.binaries[loader].rpaths]
+            if self.main_executable and loader != self.main_executable:
+                candidates += [os.path.join(self._expand(rpath, self.main_executable), rest)
+                               for rpath in self.binaries[self.main_executable].rpaths]
+        else:
+            candidates = [self._expand(name, loader)]
+        for candidate in candidates:
+            if candidate.startswith("@"):
+                continue
+            candidate = os.path.realpath(candidate)
+            if candidate in self.binaries:
+                return candidate
+        return None
+
+    def dependents(self) -> "dict[str, list[str]]":
+        """binary -> the binaries of this bundle linking against it"""
+        dependents = {path: [] for path in self.binaries}
+        for path, dependencies in self.edges.items():
+            for dependency in dependencies:
+                dependents[dependency].append(path)
+        return dependents
+
+    def default_roots(self) -> "list[str]":
+        """binaries loaded without being linked: the main executable, other executables, loadable bundles (python
+        extension modules, Qt plugins) and the python library"""
+        return [path for path, binary in self.binaries.items()
+                if path == self.main_executable or binary.filetype in (MH_EXECUTE, MH_BUNDLE) or
+                _is_python_library(path)]
+
+    def reachable(self, roots: "list[str]" = None) -> "set[str]":
+        seen = set()
+        pending = list(self.default_roots() if roots is None else roots)
+        while pending:
+            path = pending.pop()
+            if path in seen or path not in self.edges:
+                continue
+            seen.add(path)
+            pending.extend(self.edges[path])
+        return seen
+
+    def unreachable(self, roots: "list[str]" = None) -> "list[str]":
+        """binaries that nothing reaches from `roots` (defaults to .default_roots()); candidates for removal
+
+        :param roots: the binaries that are loaded directly, defaults to None
+        :type roots: list[str], optional
+        :return: the unreachable binaries
+        :rtype: list[str]
+        """
+        reachable = self.reachable(roots)
+        return sorted(path for path in self.binaries if path not in reachable)
+
+    def dependency_order(self) -> "list[list[str]]":
+        """the binaries in levels where every binary comes after everything it links against (cycles, which dyld
+        allows for upward links, are put in a last level together)"""
+        remaining = {path: set(dependencies) - {path} for path, dependencies in self.edges.items()}
+        levels = []
+        while remaining:
+            level = sorted(path for path, dependencies in remaining.items() if not dependencies)
+            if not level:
+                levels.append(sorted(remaining))
+                break
+            levels.append(level)
+            for path in level:
+                del remaining[path]
+            for dependencies in remaining.values():
+                dependencies.difference_update(level)
+        return levels
+
+    def report(self, roots: "list[str]" = None) -> dict:
+        """a JSON-serializable summary: every binary with its architectures and in-bundle dependencies, unresolved
+        install names, and unreachable binaries with the bytes they take up (paths are relative to the bundle)"""
+        def rel(path):
+            return os.path.relpath(path, self.app)
+
+        unreachable = self.unreachable(roots)
+        return {
+            "app": self.app,
+            "main_executable": rel(self.main_executable) if self.main_executable else None,
+            "binaries": {rel(path): {"architectures": binary.architectures, "install_name": binary.install_name,
+                                     "dependencies": [rel(d) for d in self.edges[path]]}
+                         for path, binary in sorted(self.binaries.items())},
+            "missing": {rel(path): names for path, names in sorted(self.missing.items())},
+            "unreachable": [rel(path) for path in unreachable],
+            "unreachable_bytes": sum(os.path.getsize(path) for path in unreachable),
+        }
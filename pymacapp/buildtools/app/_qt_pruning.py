@@ -0,0 +1,191 @@
+import os
+import shutil
+from dataclasses import dataclass, field
+from ...logger import logger
+from ._inventory import BundleInventory
+
+# every Qt module a binding may ship; those not kept by a QtProfile are excluded from the spec
+QT_MODULES = [
+    "Qt3DAnimation", "Qt3DCore", "Qt3DExtras", "Qt3DInput", "Qt3DLogic", "Qt3DRender", "QtBluetooth", "QtCharts",
+    "QtConcurrent", "QtCore", "QtDBus", "QtDataVisualization", "QtDesigner", "QtGraphs", "QtGui", "QtHelp",
+    "QtHttpServer", "QtLocation", "QtMultimedia", "QtMultimediaWidgets", "QtNetwork", "QtNetworkAuth", "QtNfc",
+    "QtOpenGL", "QtOpenGLWidgets", "QtPdf", "QtPdfWidgets", "QtPositioning", "QtPrintSupport", "QtQml", "QtQuick",
+    "QtQuick3D", "QtQuickControls2", "QtQuickWidgets", "QtRemoteObjects", "QtScxml", "QtSensors", "QtSerialBus",
+    "QtSerialPort", "QtSpatialAudio", "QtSql", "QtStateMachine", "QtSvg", "QtSvgWidgets", "QtTest", "QtTextToSpeech",
+    "QtUiTools", "QtWebChannel", "QtWebEngineCore", "QtWebEngineQuick", "QtWebEngineWidgets", "QtWebSockets",
+    "QtWidgets", "QtXml",
+]
+
+# modules that cannot be imported without others
+QT_MODULE_DEPENDENCIES = {
+    "QtGui": ["QtCore"],
+    "QtWidgets": ["QtGui"],
+    "QtNetwork": ["QtCore"],
+    "QtSvg": ["QtGui"],
+    "QtSvgWidgets": ["QtSvg", "QtWidgets"],
+    "QtPrintSupport": ["QtWidgets"],
+    "QtOpenGL": ["QtGui"],
+    "QtOpenGLWidgets": ["QtOpenGL", "QtWidgets"],
+    "QtQml": ["QtNetwork"],
+    "QtQuick": ["QtQml", "QtGui"],
+    "QtQuickWidgets": ["QtQuick", "QtWidgets"],
+    "QtQuickControls2": ["QtQuick"],
+    "QtMultimedia": ["QtNetwork", "QtGui"],
+    "QtMultimediaWidgets": ["QtMultimedia", "QtWidgets"],
+    "QtPdf": ["QtGui"],
+    "QtPdfWidgets": ["QtPdf", "QtWidgets"],
+    "QtWebChannel": ["QtCore"],
+    "QtWebEngineCore": ["QtQuick", "QtWebChannel", "QtNetwork", "QtPositioning"],
+    "QtWebEngineWidgets": ["QtWebEngineCore", "QtWidgets", "QtPrintSupport"],
+    "QtWebEngineQuick": ["QtWebEngineCore"],
+    "QtUiTools": ["QtWidgets"],
+}
+
+DEFAULT_QT_MODULES = ["QtCore", "QtGui", "QtWidgets"]
+# "category" keeps a whole plugin directory, "category/name" a single plugin (file name without its extension)
+DEFAULT_QT_PLUGINS = [
+    "platforms/libqcocoa",
+    "styles/libqmacstyle",
+    "imageformats/libqgif",
+    "imageformats/libqico",
+    "imageformats/libqjpeg",
+    "imageformats/libqsvg",
+    "iconengines/libqsvgicon",
+]
+
+
+def _size(path: str) -> int:
+    if os.path.islink(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            filepath = os.path.join(directory, filename)
+            if not os.path.islink(filepath):
+                total += os.path.getsize(filepath)
+    return total
+
+
+def _remove(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+@dataclass(repr=True)
+class QtProfile:
+    """which parts of Qt an app uses; everything else is excluded from the spec or pruned from the built bundle
+
+    :param modules: the Qt modules the app imports (their dependencies are kept too), defaults to DEFAULT_QT_MODULES
+    :type modules: list[str], optional
+    :param plugins: the plugins to keep, as "category" or "category/name", defaults to DEFAULT_QT_PLUGINS
+    :type plugins: list[str], optional
+    :param translations: keep Qt's translations, defaults to False
+    :type translations: bool, optional
+    :param binding: the Qt binding the app uses, defaults to "PySide6"
+    :type binding: str, optional
+    """
+    modules: "list[str]" = field(default_factory=lambda: list(DEFAULT_QT_MODULES))
+    plugins: "list[str]" = field(default_factory=lambda: list(DEFAULT_QT_PLUGINS))
+    translations: bool = False
+    binding: str = "PySide6"
+
+    def kept_modules(self) -> "set[str]":
+        kept = set()
+        pending = list(self.modules) + ["QtCore"]
+        while pending:
+            module = pending.pop()
+            if module not in kept:
+                kept.add(module)
+                pending.extend(QT_MODULE_DEPENDENCIES.get(module, []))
+        return kept
+
+    def excluded_modules(self) -> "list[str]":
+        """the python modules to exclude from the spec (e.g. "PySide6.QtWebEngineCore")"""
+        kept = self.kept_modules()
+        return [f"{self.binding}.{module}" for module in QT_MODULES if module not in kept]
+
+    def keeps_plugin(self, category: str, name: str) -> bool:
+        return category in self.plugins or f"{category}/{name}" in self.plugins
+
+    def _qt_directories(self, app: str) -> "list[str]":
+        """the bundle's real (not symlinked) <binding>/Qt directories"""
+        found = []
+        for directory, dirnames, _ in os.walk(app):
+            if os.path.basename(directory) == self.binding and "Qt" in dirnames:
+                qt = os.path.join(directory, "Qt")
+                if not os.path.islink(qt):
+                    found.append(qt)
+        return found
+
+    def prune(self, app: str) -> dict:
+        """remove unlisted plugins, translations and the Qt frameworks nothing loads anymore from a built bundle
+
+        frameworks are only removed when no remaining binary links against them, so pruning never breaks the app
+
+        :param app: the built .app
+        :type app: str
+        :return: a size report: bytes before and after, and bytes removed per kind ("plugins", "translations", "frameworks")
+        :rtype: dict
+        """
+        before = _size(app)
+        removed = {"plugins": [], "translations": [], "frameworks": []}
+        removed_bytes = {kind: 0 for kind in removed}
+
+        def drop(kind, path):
+            removed_bytes[kind] += _size(path)
+            removed[kind].append(os.path.relpath(path, app))
+            _remove(path)
+
+        qt_directories = self._qt_directories(app)
+        for qt in qt_directories:
+            plugins = os.path.join(qt, "plugins")
+            if os.path.isdir(plugins):
+                for category in sorted(os.listdir(plugins)):
+                    category_path = os.path.join(plugins, category)
+                    if not os.path.isdir(category_path) or category in self.plugins:
+                        continue
+                    for plugin in sorted(os.listdir(category_path)):
+                        if not self.keeps_plugin(category, os.path.splitext(plugin)[0]):
+                            drop("plugins", os.path.join(category_path, plugin))
+                    if not os.listdir(category_path):
+                        os.rmdir(category_path)
+            translations = os.path.join(qt, "translations")
+            if not self.translations and os.path.isdir(translations):
+                drop("translations", translations)
+        # with plugins gone, frameworks only they needed become unreachable
+        kept = self.kept_modules()
+        inventory = BundleInventory(app)
+        unreachable = set(inventory.unreachable())
+        for qt in qt_directories:
+            lib = os.path.join(qt, "lib")
+            if not os.path.isdir(lib):
+                continue
+            for framework in sorted(os.listdir(lib)):
+                module = framework[:-len(".framework")] if framework.endswith(".framework") else None
+                path = os.path.join(lib, framework)
+                if module is None or module in kept:
+                    continue
+                binaries = [binary for binary in inventory.binaries if binary.startswith(path + os.sep)]
+                if binaries and all(binary in unreachable for binary in binaries):
+                    drop("frameworks", path)
+        self._remove_dangling_links(app)
+        after = _size(app)
+        report = {"before": before, "after": after, "removed": removed_bytes,
+                  "files": {kind: paths for kind, paths in removed.items()}}
+        logger.info(f"pruned Qt from '{app}': {round(before / 1024 ** 2, 1)} MiB -> {round(after / 1024 ** 2, 1)} MiB "
+                    f"(plugins {removed_bytes['plugins']}, translations {removed_bytes['translations']}, "
+                    f"frameworks {removed_bytes['frameworks']} bytes)")
+        return report
+
+    @staticmethod
+    def _remove_dangling_links(app: str):
+        # PyInstaller mirrors Frameworks/ into Resources/ with symlinks, which must not point at removed files
+        for directory, dirnames, filenames in os.walk(app):
+            for name in dirnames + filenames:
+                path = os.path.join(directory, name)
+                if os.path.islink(path) and not os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,54 @@
+import os
+from ...helpers import load_json, write_json_atomic
+from ._content_manifest import ContentManifest
+
+_FORMAT_VERSION = 2
+
+
+class SigningManifest:
+    def __init__(self, app: str, settings: dict) -> None:
+        """what a signed bundle looked like right after it was signed, and how it was signed (identity, entitlements,
+        options), so the next signing pass can skip everything that did not change
+
+        the manifest is kept next to the bundle, never inside it, since any file added to a bundle breaks its seal
+
+        :param app: the signed .app bundle
+        :type app: str
+        :param settings: everything about the signer that affects the signatures
+        :type settings: dict
+        """
+        self.app = os.path.abspath(app).rstrip(os.sep)
+        self.settings = settings
+
+    def __repr__(self) -> str:
+        return f"SigningManifest({self.app=})"
+
+    @property
+    def path(self) -> str:
+        return f"{self.app}.sign-manifest.json"
+
+    def load(self) -> ContentManifest:
+        """the bundle's contents recorded by the last signing pass with the same settings, or None"""
+        data = load_json(self.path)
+        if not data or data.get("version") != _FORMAT_VERSION or data.get("settings") != self.settings:
+            return None
+        return ContentManifest.from_json(data.get("contents"))
+
+    def write(self):
+        """record the bundle as it is now; call right after signing succeeded"""
+        write_json_atomic(self.path, {"version": _FORMAT_VERSION, "settings": self.settings,
+                                      "contents": ContentManifest.of(self.app).to_json()})
+
+    def discard(self):
+        """forget the last signing pass (e.g. before re-signing, so a failure part-way is never mistaken for success)"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def changed_paths(self) -> "set[str]":
+        """paths (relative to the bundle) added, removed or modified since the last signing pass; None if there is no
+        usable manifest, meaning everything has to be signed"""
+        previous = self.load()
+        if previous is None:
+            return None
+        diff = previous.diff(ContentManifest.of(self.app))
+        return {rel.replace("/", os.sep) for paths in diff.values() for rel in paths}
@@ -0,0 +1,227 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from ...command import Command
+from ...exceptions import BuildException
+from ...hashing import sha256_file
+from ...jobs import JobRunner, run_command
+from ...logger import logger
+from ...macho import is_macho
+from ...tracing import span
+from ._sign_manifest import SigningManifest
+
+# directories codesign seals as a whole; everything inside them must be signed first
+BUNDLE_EXTENSIONS = (".app", ".framework", ".bundle", ".xpc", ".appex", ".plugin")
+
+
+@dataclass(repr=True)
+class SignItem:
+    path: str
+    depth: int
+    bundle: bool
+
+
+def _is_bundle(path: str) -> bool:
+    return path.endswith(BUNDLE_EXTENSIONS) and os.path.isdir(path) and not os.path.islink(path)
+
+
+def _is_bundle_executable(path: str, bundle: str) -> bool:
+    """whether `path` is the main executable of `bundle`, which codesign signs together with the bundle itself"""
+    stem = os.path.splitext(os.path.basename(bundle))[0]
+    if os.path.basename(path) != stem:
+        return False
+    parent = os.path.dirname(path)
+    if bundle.endswith(".framework"):
+        # Foo.framework/Versions/A/Foo
+        return os.path.basename(os.path.dirname(parent)) == "Versions" and \
+            os.path.dirname(os.path.dirname(parent)) == bundle
+    # Foo.app/Contents/MacOS/Foo
+    return parent == os.path.join(bundle, "Contents", "MacOS")
+
+
+def collect_signables(app: str) -> "list[SignItem]":
+    """every nested bundle and Mach-O file of `app` that has to be signed before `app` itself
+
+    the depth of an item is the number of nested bundles it sits in, plus one for plain binaries, so that sorting by
+    descending depth signs the contents of every bundle before the bundle; symlinks are never followed
+
+    :param app: the .app bundle
+    :type app: str
+    :return: the items, deepest first
+    :rtype: list[SignItem]
+    """
+    app = os.path.abspath(app).rstrip(os.sep)
+    items = []
+    # (directory, enclosing nested bundles), the outer app not included
+    pending = [(app, [])]
+    while pending:
+        directory, bundles = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_symlink():
+                continue
+            if entry.is_dir():
+                if _is_bundle(entry.path):
+                    items.append(SignItem(entry.path, len(bundles) + 1, True))
+                    pending.append((entry.path, bundles + [entry.path]))
+                else:
+                    pending.append((entry.path, bundles))
+            elif entry.is_file() and is_macho(entry.path):
+                if _is_bundle_executable(entry.path, bundles[-1] if bundles else app):
+                    continue
+                items.append(SignItem(entry.path, len(bundles) + 1, False))
+    return sorted(items, key=lambda item: (-item.depth, item.path))
+
+
+def signing_levels(items: "list[SignItem]") -> "list[list[SignItem]]":
+    """group items by depth, deepest level first; items within a level do not contain each other"""
+    levels = {}
+    for item in items:
+        levels.setdefault(item.depth, []).append(item)
+    return [levels[depth] for depth in sorted(levels, reverse=True)]
+
+
+class BundleSigner:
+    def __init__(self, identity: str, entitlements: str = None, codesign: str = "codesign", max_workers: int = None,
+                 timestamp: bool = True, hardened_runtime: bool = True) -> None:
+        """sign a bundle inside-out without `codesign --deep`: nested binaries and bundles are signed level by level
+        (deepest first), every level in parallel, and the outer bundle last
+
+        :param identity: the signing identity (hash of a Developer ID Application)
+        :type identity: str
+        :param entitlements: an entitlements .plist applied to everything that is signed, defaults to None
+        :type entitlements: str, optional
+        :param codesign: the codesign executable (or a stand-in accepting the same arguments), defaults to "codesign"
+        :type codesign: str, optional
+        :param max_workers: how many items are signed at the same time, defaults to None (min(32, os.cpu_count() + 4),
+            since codesign mostly waits on disk and the timestamp server)
+        :type max_workers: int, optional
+        :param timestamp: request a secure timestamp (--timestamp), defaults to True
+        :type timestamp: bool, optional
+        :param hardened_runtime: enable the hardened runtime (--options runtime), defaults to True
+        :type hardened_runtime: bool, optional
+        """
+        self.identity = identity
+        self.entitlements = entitlements
+        self.codesign = codesign
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.timestamp = timestamp
+        self.hardened_runtime = hardened_runtime
+
+    def __repr__(self) -> str:
+        return f"BundleSigner({self.codesign=}, {self.max_workers=})"
+
+    def command(self, path: str) -> "list[str]":
+        """the codesign invocation for one item"""
+        command = [self.codesign, "--force"]
+        if self.timestamp:
+            command.append("--timestamp")
+        if self.hardened_runtime:
+            command += ["--options", "runtime"]
+        if self.entitlements:
+            command += ["--entitlements", self.entitlements]
+        return command + ["--sign", self.identity, path]
+
+    def plan(self, app: str) -> "list[list[SignItem]]":
+        """the signing order for `app`: levels of nested items (deepest first) and finally the app itself"""
+        return signing_levels(collect_signables(app)) + [[SignItem(os.path.abspath(app).rstrip(os.sep), 0, True)]]
+
+    def settings(self) -> dict:
+        """everything about this signer that ends up in the signatures"""
+        return {"identity": self.identity, "timestamp": self.timestamp, "hardened_runtime": self.hardened_runtime,
+                "entitlements": sha256_file(self.entitlements) if self.entitlements else None}
+
+    def manifest(self, app: str) -> SigningManifest:
+        return SigningManifest(app, self.settings())
+
+    def incremental_plan(self, app: str) -> "list[list[SignItem]]":
+        """like .plan(...), but only with the binaries that changed since `app` was last signed by an equivalent
+        signer, and the bundles containing them; empty if nothing changed"""
+        changed = self.manifest(app).changed_paths()
+        if changed is None:
+            return self.plan(app)
+        if not changed:
+            return []
+        root = os.path.abspath(app).rstrip(os.sep)
+        changed = {os.path.join(root, rel) for rel in changed}
+        levels = []
+        for level in self.plan(app):
+            if level[0].depth == 0:
+                levels.append(level)
+                continue
+            level = [item for item in level if item.path in changed or
+                     (item.bundle and any(path.startswith(item.path + os.sep) for path in changed))]
+            if level:
+                levels.append(level)
+        return levels
+
+    def _prepare(self, app: str, levels: "list[list[SignItem]]", incremental: bool) -> "list[list[SignItem]]":
+        if levels is None:
+            levels = self.incremental_plan(app) if incremental else self.plan(app)
+        # a stale manifest must not survive a pass that fails part-way
+        self.manifest(app).discard()
+        return levels
+
+    def _finish(self, app: str, levels: "list[list[SignItem]]", start: float) -> int:
+        self.manifest(app).write()
+        count = sum(len(level) for level in levels)
+        if count:
+            logger.info(f"signed {count} item(s) of '{app}' in {len(levels)} level(s) "
+                        f"in {round(time.time() - start, 2)} second(s)")
+        else:
+            logger.info(f"'{app}' is unchanged since it was signed; nothing to sign")
+        return count
+
+    @staticmethod
+    def _check(process: Command, item: SignItem):
+        if not process or process.process.returncode != 0:
+            raise BuildException(f"unable to sign '{item.path}': {process.error if process else ''}")
+
+    def _sign_item(self, item: SignItem) -> Command:
+        process = Command.run(self.command(item.path), suppress_log=True)
+        self._check(process, item)
+        return process
+
+    def sign(self, app: str, levels: "list[list[SignItem]]" = None, incremental: bool = False) -> int:
+        """sign `app` and everything nested in it; a signing manifest is written next to the app afterwards
+
+        :param app: the .app bundle
+        :type app: str
+        :param levels: the signing order, defaults to None (.plan(app) or .incremental_plan(app))
+        :type levels: list[list[SignItem]], optional
+        :param incremental: only sign what changed since the last signing pass with the same identity, entitlements and options (see .incremental_plan(...)), defaults to False
+        :type incremental: bool, optional
+        :raises BuildException: if any item fails to sign (after the rest of its level has finished)
+        :return: the number of items signed, the app included
+        :rtype: int
+        """
+        start = time.time()
+        levels = self._prepare(app, levels, incremental)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for depth, level in enumerate(levels):
+                # a level must be fully signed before the bundles containing it; a failure stops before the next level
+                with span("sign.level", level=depth, items=len(level)):
+                    list(executor.map(self._sign_item, level))
+        return self._finish(app, levels, start)
+
+    async def sign_async(self, app: str, levels: "list[list[SignItem]]" = None, runner: JobRunner = None,
+                         incremental: bool = False) -> int:
+        """awaitable version of .sign(...); items of a level run concurrently, limited by `runner` if one is given
+
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (a JobRunner of max_workers)
+        :type runner: JobRunner, optional
+        """
+        start = time.time()
+        levels = self._prepare(app, levels, incremental)
+        runner = runner or JobRunner(self.max_workers)
+        for depth, level in enumerate(levels):
+            with span("sign.level", level=depth, items=len(level)):
+                processes = await runner.gather(*[run_command(self.command(item.path), runner, suppress_log=True)
+                                                  for item in level])
+            for process, item in zip(processes, level):
+                self._check(process, item)
+        return self._finish(app, levels, start)
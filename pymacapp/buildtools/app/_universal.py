@@ -0,0 +1,96 @@
+import filecmp
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from ...command import Command
+from ...exceptions import BuildException
+from ...logger import logger
+from ...macho import is_macho
+
+SPLIT_ARCHITECTURES = ["arm64", "x86_64"]
+
+
+class LipoMerger:
+    def __init__(self, lipo: str = "lipo") -> None:
+        """combine single-architecture Mach-O files into one fat file with `lipo -create`
+
+        :param lipo: the lipo executable (or a stand-in accepting the same arguments), defaults to "lipo"
+        :type lipo: str, optional
+        """
+        self.lipo = lipo
+
+    def __repr__(self) -> str:
+        return f"LipoMerger({self.lipo=})"
+
+    def __call__(self, inputs: "list[str]", output: str):
+        process = Command.run([self.lipo, "-create", *inputs, "-output", output], suppress_log=True)
+        if not process or process.process.returncode != 0:
+            raise BuildException(f"unable to merge {inputs} into '{output}': {process.error if process else ''}")
+        shutil.copymode(inputs[0], output)
+
+
+def merge_universal(apps: "list[str]", output: str, merger=None, max_workers: int = None) -> int:
+    """merge single-architecture builds of the same app into one universal2 bundle: Mach-O files are combined with
+    `merger`, everything else must be identical in every build and is copied once
+
+    :param apps: the single-architecture .app bundles (the first one's layout is used for the output)
+    :type apps: list[str]
+    :param output: the universal .app to create (replaced if it exists)
+    :type output: str
+    :param merger: called as merger(inputs, output) for every Mach-O file, defaults to LipoMerger()
+    :type merger: Callable[[list[str], str], None], optional
+    :param max_workers: how many Mach-O files are merged at the same time, defaults to None (executor default)
+    :type max_workers: int, optional
+    :raises BuildException: if the builds do not have the same layout or a non-binary file differs between them
+    :return: the number of Mach-O files merged
+    :rtype: int
+    """
+    merger = merger or LipoMerger()
+    first, others = apps[0], apps[1:]
+    if os.path.exists(output):
+        shutil.rmtree(output)
+    mismatches = []
+    binaries = []
+    seen = set()
+    for directory, dirnames, filenames in os.walk(first):
+        rel_dir = os.path.relpath(directory, first)
+        os.makedirs(os.path.join(output, rel_dir), exist_ok=True)
+        for name in sorted(dirnames + filenames):
+            rel = os.path.normpath(os.path.join(rel_dir, name))
+            seen.add(rel)
+            source = os.path.join(first, rel)
+            counterparts = [os.path.join(other, rel) for other in others]
+            target = os.path.join(output, rel)
+            if os.path.islink(source):
+                link = os.readlink(source)
+                if any(not os.path.islink(c) or os.readlink(c) != link for c in counterparts):
+                    mismatches.append(rel)
+                else:
+                    os.symlink(link, target)
+                if name in dirnames:
+                    # os.walk lists symlinked directories without descending into them
+                    continue
+            elif name in dirnames:
+                if any(not os.path.isdir(c) or os.path.islink(c) for c in counterparts):
+                    mismatches.append(rel)
+            elif any(not os.path.isfile(c) or os.path.islink(c) for c in counterparts):
+                mismatches.append(rel)
+            elif all(filecmp.cmp(source, c, shallow=False) for c in counterparts):
+                # identical in every build (resources, or binaries that are already universal)
+                shutil.copy2(source, target)
+            elif is_macho(source) and all(is_macho(c) for c in counterparts):
+                binaries.append(([source] + counterparts, target))
+            else:
+                mismatches.append(rel)
+    for other in others:
+        for directory, dirnames, filenames in os.walk(other):
+            for name in dirnames + filenames:
+                rel = os.path.normpath(os.path.join(os.path.relpath(directory, other), name))
+                if rel not in seen:
+                    mismatches.append(rel)
+    if mismatches:
+        raise BuildException(f"unable to merge {apps}; these paths differ between the builds: {sorted(set(mismatches))}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda job: merger(*job), binaries))
+    logger.info(f"merged {len(binaries)} binaries from {apps} into '{output}'")
+    return len(binaries)
@@ -0,0 +1,165 @@
+import bisect
+import glob
+import os
+import time
+from ...cache import command_cache
+from ...command import Command, STDOUT
+from ...helpers import CACHE_DIR, LSREGISTER, load_json, write_json_atomic
+from ...logger import logger
+
+UTI_INDEX_FILE = os.path.join(CACHE_DIR, "uti-index.json")
+UTI_INDEX_TTL = 24 * 60 * 60
+_FORMAT_VERSION = 1
+
+
+def iter_dump_utis(lines):
+    """yield the UTI declared on each `uti:` line of an `lsregister -dump`, reading `lines` lazily (a file object,
+    a generator, ...) so the dump never has to be held in memory"""
+    for line in lines:
+        if line.startswith("uti"):
+            uti = line.partition(":")[2].strip()
+            if uti:
+                yield uti
+
+
+def iter_lsregister_dump(lsregister: str = LSREGISTER):
+    """yield the lines of `lsregister -dump` as the tool writes them"""
+    for name, line in Command.iter_lines([lsregister, "-dump"]):
+        if name == STDOUT:
+            yield line
+
+
+def iter_dump_file(path: str):
+    """yield the lines of a saved (or synthetic) `lsregister -dump` output file"""
+    with open(path, "r", errors="replace") as fp:
+        yield from fp
+
+
+def match_dump(lines, utis) -> "set[str]":
+    """scan a dump once for many UTIs at the same time; since a UTI is valid only if it is registered verbatim,
+    matching every requested UTI is a single set lookup per dump line, and the scan stops as soon as all are found
+
+    :param lines: the lines of an `lsregister -dump` (e.g. iter_dump_file(...) or iter_lsregister_dump())
+    :param utis: the UTIs to look for
+    :return: the subset of `utis` registered in the dump
+    """
+    wanted = set(utis)
+    found = set()
+    dump = iter_dump_utis(lines)
+    try:
+        for uti in dump:
+            if uti in wanted:
+                found.add(uti)
+                if len(found) == len(wanted):
+                    break
+    finally:
+        dump.close()
+        if hasattr(lines, "close"):
+            lines.close()
+    return found
+
+
+def parse_dump(lines) -> "list[str]":
+    """collect the unique UTIs declared in (the lines of) an `lsregister -dump`, sorted"""
+    return sorted(set(iter_dump_utis(lines)))
+
+
+def launchservices_databases() -> "list[str]":
+    """locate the current user's LaunchServices database files (empty on systems without LaunchServices)"""
+    resp = command_cache.run(["getconf", "DARWIN_USER_DIR"], ttl=float("inf"), suppress_log=True)
+    if not resp or resp.process.returncode != 0 or not resp.output.strip():
+        return []
+    user_dir = resp.output.strip()
+    return glob.glob(os.path.join(user_dir, "com.apple.LaunchServices*", "*.csstore")) + \
+        glob.glob(os.path.join(user_dir, "com.apple.LaunchServices*.csstore"))
+
+
+class UTIIndex:
+    def __init__(self, path: str = UTI_INDEX_FILE, ttl: float = UTI_INDEX_TTL, lsregister: str = LSREGISTER) -> None:
+        """a sorted, on-disk table of every UTI registered with LaunchServices; it is rebuilt from `lsregister -dump`
+        only when the LaunchServices database changes or the table is older than `ttl`
+
+        :param path: where the index is persisted, defaults to UTI_INDEX_FILE
+        :type path: str, optional
+        :param ttl: seconds before the index is rebuilt even if the database looks unchanged, defaults to one day
+        :type ttl: float, optional
+        :param lsregister: the lsregister executable (or a stand-in producing the same output), defaults to LSREGISTER
+        :type lsregister: str, optional
+        """
+        self.path = path
+        self.ttl = ttl
+        self.lsregister = lsregister
+        self._utis: "list[str]" = None
+        self._created: float = None
+        self._database_mtime: float = None
+
+    def __repr__(self) -> str:
+        return f"UTIIndex({self.path=})"
+
+    @staticmethod
+    def _database_mtime_now() -> float:
+        mtimes = [os.path.getmtime(database) for database in launchservices_databases() if os.path.exists(database)]
+        return max(mtimes) if mtimes else None
+
+    def _is_stale(self) -> bool:
+        if self._utis is None:
+            return True
+        if time.time() - self._created > self.ttl:
+            return True
+        return self._database_mtime != self._database_mtime_now()
+
+    def _load(self) -> bool:
+        data = load_json(self.path, {})
+        if data.get("version") != _FORMAT_VERSION:
+            return False
+        self._utis = data["utis"]
+        self._created = data["created"]
+        self._database_mtime = data["database_mtime"]
+        return True
+
+    def _save(self):
+        try:
+            write_json_atomic(self.path, {"version": _FORMAT_VERSION, "created": self._created,
+                                          "database_mtime": self._database_mtime, "utis": self._utis})
+        except OSError as e:
+            logger.warning(f"unable to save the uti index to '{self.path}': {e}")
+
+    def refresh(self):
+        """rebuild the index from a fresh `lsregister -dump` and persist it"""
+        start = time.time()
+        database_mtime = self._database_mtime_now()
+        self._utis = parse_dump(iter_lsregister_dump(self.lsregister))
+        self._created = time.time()
+        self._database_mtime = database_mtime
+        self._save()
+        logger.debug(f"indexed {len(self._utis)} utis in {round(time.time() - start, 2)} second(s)")
+
+    @property
+    def utis(self) -> "list[str]":
+        """every registered UTI, sorted"""
+        if self._utis is None:
+            self._load()
+        if self._is_stale():
+            self.refresh()
+        return self._utis
+
+    def __contains__(self, uti: str) -> bool:
+        utis = self.utis
+        i = bisect.bisect_left(utis, uti)
+        return i < len(utis) and utis[i] == uti
+
+    def search(self, substring: str) -> "list[str]":
+        """all registered UTIs containing `substring`"""
+        return [uti for uti in self.utis if substring in uti]
+
+    def prefix(self, prefix: str) -> "list[str]":
+        """all registered UTIs starting with `prefix`"""
+        utis = self.utis
+        start = bisect.bisect_left(utis, prefix)
+        end = start
+        while end < len(utis) and utis[end].startswith(prefix):
+            end += 1
+        return utis[start:end]
+
+
+uti_index = UTIIndex()
@@ -0,0 +1,144 @@
+import os
+import shutil
+import sys
+import time
+from ...hashing import sha256_file, sha256_json
+from ...helpers import CACHE_DIR, load_json, write_json_atomic
+from ...logger import logger
+from ...pyinstaller import pyinstaller_version
+
+WORKPATH_CACHE_DIR = os.path.join(CACHE_DIR, "workpaths")
+WORKPATH_CACHE_MAX_BYTES = 10 * 1024 ** 3
+_LAST_USED = ".last-used"
+# key -> size in bytes of each workpath, as of the end of its last build
+_INDEX = "sizes.json"
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(directory, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class WorkpathCache:
+    def __init__(self, root: str = WORKPATH_CACHE_DIR, max_bytes: int = WORKPATH_CACHE_MAX_BYTES) -> None:
+        """keep one pyinstaller workpath per spec so repeat builds reuse pyinstaller's cached analysis and bytecode;
+        the least recently used workpaths are deleted once the cache grows beyond `max_bytes`, going by the size each
+        one had when its last build finished (see .record(...))
+
+        builds of the same spec share a workpath, so they should not run at the same time
+
+        :param root: the directory holding the workpaths, defaults to WORKPATH_CACHE_DIR
+        :type root: str, optional
+        :param max_bytes: the total size the cache may grow to, defaults to 10 GiB
+        :type max_bytes: int, optional
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index = os.path.join(root, _INDEX)
+
+    def __repr__(self) -> str:
+        return f"WorkpathCache({self.root=}, {self.max_bytes=})"
+
+    @staticmethod
+    def key(spec_file: str) -> str:
+        """workpaths are only reusable by the same spec, interpreter and PyInstaller version"""
+        return sha256_json({"spec": sha256_file(spec_file), "python": sys.executable,
+                            "pyinstaller": pyinstaller_version()})[:16]
+
+    def path_for(self, spec_file: str) -> str:
+        """the workpath to build `spec_file` in (created if needed); marks it as most recently used and evicts others
+        if the cache is over its size limit
+
+        :param spec_file: the .spec that will be built
+        :type spec_file: str
+        :return: the workpath
+        :rtype: str
+        """
+        key = self.key(spec_file)
+        path = os.path.join(self.root, key)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, _LAST_USED), "w") as fp:
+            fp.write(str(time.time()))
+        logger.debug(f"using cached workpath '{path}' for '{spec_file}'")
+        self.evict(keep=key)
+        return path
+
+    def record(self, spec_file: str) -> int:
+        """store the size of the workpath of `spec_file` once a build in it has finished, so eviction never has to walk
+        the workpaths
+
+        :param spec_file: the .spec that was built
+        :type spec_file: str
+        :return: the size in bytes
+        :rtype: int
+        """
+        key = self.key(spec_file)
+        path = os.path.join(self.root, key)
+        if not os.path.isdir(path):
+            return 0
+        size = _directory_size(path)
+        sizes = load_json(self._index, {})
+        sizes[key] = size
+        self._write_index(sizes)
+        return size
+
+    def _write_index(self, sizes: "dict[str, int]"):
+        try:
+            write_json_atomic(self._index, sizes)
+        except OSError as e:
+            logger.warning(f"unable to update the workpath cache index '{self._index}': {e}")
+
+    def entries(self) -> "list[tuple[str, float, int]]":
+        """(path, last used, size in bytes) of every cached workpath, least recently used first; sizes come from the
+        index, and only workpaths missing from it (e.g. from an older version of the cache) are measured"""
+        if not os.path.isdir(self.root):
+            return []
+        sizes = load_json(self._index, {})
+        measured = False
+        entries = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if not os.path.isdir(path):
+                continue
+            marker = os.path.join(path, _LAST_USED)
+            last_used = os.path.getmtime(marker) if os.path.exists(marker) else os.path.getmtime(path)
+            if key not in sizes:
+                sizes[key] = _directory_size(path)
+                measured = True
+            entries.append((path, last_used, sizes[key]))
+        if measured:
+            self._write_index(sizes)
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def evict(self, keep: str = None) -> "list[str]":
+        """delete least recently used workpaths until the cache fits in max_bytes
+
+        :param keep: the key of a workpath that must not be deleted, defaults to None
+        :type keep: str, optional
+        :return: the deleted workpaths
+        :rtype: list[str]
+        """
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.basename(path) == keep:
+                continue
+            logger.info(f"evicting cached workpath '{path}' ({size} bytes)")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed.append(path)
+        if removed:
+            sizes = load_json(self._index, {})
+            for path in removed:
+                sizes.pop(os.path.basename(path), None)
+            self._write_index(sizes)
+        return removed
@@ -1,16 +1,35 @@
+import asyncio
+import contextvars
 import os
 import time
-import plistlib
+from concurrent.futures import ThreadPoolExecutor
 from ...pyinstaller import spec
 from ...helpers import MINIMUM_ENTITLEMENTS, write_minimum_entitlements
 from ...command import Command
+from ...cache import command_cache
+from ...jobs import JobRunner, run_command
 from ...logger import logger
+from ...exceptions import BuildException
+from ...tracing import span, traced
+from ...telemetry import BuildRecorder
+from ...versioning import LOCK_FILE, locked_version
 from ._custom_extensions import UTIExtension
+from ._info_plist import InfoPlistEditor
+from ._build_manifest import BuildManifest
+from ._workpath import WorkpathCache
+from ._universal import SPLIT_ARCHITECTURES, merge_universal
+from ._signing import BundleSigner
+from ._inventory import BundleInventory
+from ._qt_pruning import QtProfile
+from ._dedup import deduplicate
+from ._archive import BundleArchiver
+from ._content_manifest import ContentManifest
+from ..notary import IN_PROGRESS, Notary
 import string
 
 
 class App:
-    def __init__(self, name: str, identifier: str = None, icon: str = None) -> None:
+    def __init__(self, name: str, identifier: str = None, icon: str = None, lock_file: str = LOCK_FILE) -> None:
         """create a new application instance
 
         :param name: the name of your application (i.e. "My New App")
@@ -19,6 +38,8 @@ class App:
         :type identifier: str, optional
         :param icon: path to an icon file for your app
         :type icon: str, optional
+        :param lock_file: the VERSION_LOCK.ini whose version builds of this app (and its packages) are recorded under, defaults to LOCK_FILE
+        :type lock_file: str, optional
         """
         self._name = name
         if self._name[-4:] == ".app":
@@ -33,6 +54,7 @@ class App:
                 self._icon = None
             else:
                 self._icon = os.path.abspath(icon)
+        self._lock_file = lock_file
         self._main_script = None
         self._spec = None
         self._build = None
@@ -43,18 +65,31 @@ class App:
         self._built = False
         self._signed = False
         # config()
+        self._architecture: str = None
+        self._spec_arguments: dict = None
         self._pyinstaller_log_level: str = None
         self._entitlements: str = None
         self._extensions: "list[UTIExtension]" = None
+        self._info_plist: dict = None
+        self._binary_plist: bool = False
+        self._qt_profile: QtProfile = None
+        # set by .build(...) when a qt_profile is configured
+        self.size_report: dict = None
+        # set by .notarize(...)
+        self.notarization_id: str = None
+        self.notarization_status: str = None
         logger.debug(f"{self} created")
 
     def __repr__(self) -> str:
         return f"App({self._name=})"
 
+    @traced("app.config")
     def config(self, main: str, architecture: str = "universal2", entitlements: str = MINIMUM_ENTITLEMENTS,
                hidden_imports: "list[str]" = None, collect_submodules: "list[str]" = None,
                specpath: str = os.path.abspath(os.path.dirname(__file__)), log_level: str = "WARN",
-               brute: bool = False, url_schema: str = None, use_custom_spec: str = None, handles_extensions: "list[UTIExtension]" = None):
+               brute: bool = False, url_schema: str = None, use_custom_spec: str = None, handles_extensions: "list[UTIExtension]" = None,
+               info_plist: dict = None, binary_plist: bool = False, use_spec_cache: bool = True,
+               qt_profile: QtProfile = None):
         """configure the .spec file that pyinstaller uses to build the app
 
         :param collect_submodules: list of names of submodules to collect
@@ -75,27 +110,42 @@ class App:
         :type brute: bool, optional
         :param url_schema: the prefix for a custom url schema; defaults to None (no schema)
         :type url_schema: str, optional
+        :param info_plist: extra keys to set in the built app's Info.plist, defaults to None
+        :type info_plist: dict, optional
+        :param binary_plist: write the built app's Info.plist in binary format, which loads faster at launch, defaults to False
+        :type binary_plist: bool, optional
+        :param use_spec_cache: reuse a previously generated .spec when none of its inputs changed, defaults to True
+        :type use_spec_cache: bool, optional
+        :param qt_profile: the Qt modules and plugins the app uses; other Qt modules are excluded from the spec, and unlisted plugins, translations and unused Qt frameworks are pruned after every build, defaults to None (bundle all of Qt)
+        :type qt_profile: QtProfile, optional
         :return: self (current app)
         :rtype: App
         """
         if not os.path.exists(MINIMUM_ENTITLEMENTS):
             write_minimum_entitlements()
+        self._main_script = main
+        self._architecture = architecture
+        self._spec_arguments = None
         if use_custom_spec:
             self._spec = use_custom_spec
             if not os.path.exists(self._spec):
                 raise RuntimeError(f"custom spec {self._spec} does not exist!")
         else:
-            self._spec = spec(name=self._name,
-                              main_script=main,
-                              icon=self._icon,
-                              identifier=self._identifier,
-                              architecture=architecture,
-                              entitlements=entitlements,
-                              hidden_imports=hidden_imports,
-                              collect_submodules=collect_submodules,
-                              specpath=specpath,
-                              log_level=log_level,
-                              brute=False)
+            # the spec is generated by the first build that needs it: split universal2 builds only use single-architecture
+            # specs made from the same arguments
+            self._spec = None
+            self._spec_arguments = dict(name=self._name,
+                                        main_script=main,
+                                        icon=self._icon,
+                                        identifier=self._identifier,
+                                        entitlements=entitlements,
+                                        hidden_imports=hidden_imports,
+                                        collect_submodules=collect_submodules,
+                                        excludes=qt_profile.excluded_modules() if qt_profile else None,
+                                        specpath=specpath,
+                                        log_level=log_level,
+                                        brute=False,
+                                        use_cache=use_spec_cache)
         self._pyinstaller_log_level: str = log_level
         self._entitlements = entitlements
 
@@ -105,27 +155,164 @@ class App:
             logger.debug(f"as of v.2.2.3, the url schema is added after the package is built and before it is signed")
         if handles_extensions:
             self._extensions = handles_extensions
+        self._info_plist = info_plist
+        self._binary_plist = binary_plist
+        self._qt_profile = qt_profile
         return self
 
+    @traced("app.build")
     def build(self, dist_path: str = os.path.join(os.getcwd(), "dist"),
-              build_path: str = os.path.join(os.getcwd(), "build")):
+              build_path: str = os.path.join(os.getcwd(), "build"), incremental: bool = False,
+              workpath_cache: WorkpathCache = None, split_architectures: bool = False, merger=None, check: bool = False,
+              version: str = None):
         """build the current application into a {NAME}.app
 
         :param dist_path: where the built distributable should be placed once it is built, defaults to os.path.join(os.getcwd(), "dist")
         :type dist_path: str, optional
         :param build_path: where the distributable should be built, defaults to os.path.join(os.getcwd(), "build")
         :type build_path: str, optional
+        :param incremental: skip pyinstaller and reuse the existing {NAME}.app if none of the build inputs (spec, main script, imported project modules, data files, interpreter and installed packages) changed since it was built, defaults to False
+        :type incremental: bool, optional
+        :param workpath_cache: build in a persistent workpath kept per spec (overrides build_path), so pyinstaller reuses its analysis from earlier builds, defaults to None
+        :type workpath_cache: WorkpathCache, optional
+        :param split_architectures: for universal2 apps, build arm64 and x86_64 at the same time in separate directories under build_path and merge them into a universal2 bundle, defaults to False
+        :type split_architectures: bool, optional
+        :param merger: called as merger(inputs, output) to combine each Mach-O file of a split build, defaults to None (lipo -create)
+        :type merger: Callable[[list[str], str], None], optional
+        :param check: raise BuildException if pyinstaller fails instead of logging it, defaults to False
+        :type check: bool, optional
+        :param version: the version being built, recorded with the build telemetry, defaults to None (the version locked in the app's lock_file)
+        :type version: str, optional
         :return: self (current app)
         :rtype: App
         """
-        start = time.time()
+        with BuildRecorder("app", self._name, version or locked_version(self._lock_file)) as recorder:
+            start = time.time()
+            command = self._prepare_build(dist_path, build_path, workpath_cache, split_architectures)
+            builds = self._prepare_split_build(workpath_cache) if split_architectures else None
+            manifest = self._current_build_manifest(builds) if incremental else None
+            if manifest is None and builds:
+                with ThreadPoolExecutor(max_workers=len(builds)) as executor:
+                    # carry the caller's context (log fields, scoped tracers) into the worker threads
+                    futures = [executor.submit(contextvars.copy_context().run, Command.stream, command)
+                               for command, _ in builds.values()]
+                    processes = [future.result() for future in futures]
+                process = self._merge_split_build(builds, processes, merger)
+                self._record_build_manifest(process, incremental, builds)
+            elif manifest is None:
+                process = Command.stream(command)
+                self._record_build_manifest(process, incremental)
+            if manifest is None and workpath_cache:
+                self._record_workpaths(workpath_cache, builds)
+            succeeded = manifest is not None or bool(process and process.process.returncode == 0)
+            self._finish_build(start, succeeded, check)
+            if manifest is None:
+                # reused builds say nothing about how long building takes
+                recorder.artifact = self._app
+        return self
+
+    @traced("app.build")
+    async def build_async(self, dist_path: str = os.path.join(os.getcwd(), "dist"),
+                          build_path: str = os.path.join(os.getcwd(), "build"), runner: JobRunner = None,
+                          incremental: bool = False, workpath_cache: WorkpathCache = None,
+                          split_architectures: bool = False, merger=None, check: bool = False,
+                          version: str = None):
+        """awaitable version of .build(...); pyinstaller runs without blocking the event loop
+
+        :param dist_path: where the built distributable should be placed once it is built, defaults to os.path.join(os.getcwd(), "dist")
+        :type dist_path: str, optional
+        :param build_path: where the distributable should be built, defaults to os.path.join(os.getcwd(), "build")
+        :type build_path: str, optional
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (no limit)
+        :type runner: JobRunner, optional
+        :param incremental: reuse the existing {NAME}.app if the build inputs are unchanged (see .build(...)), defaults to False
+        :type incremental: bool, optional
+        :param workpath_cache: build in a persistent workpath kept per spec (overrides build_path), defaults to None
+        :type workpath_cache: WorkpathCache, optional
+        :param split_architectures: build arm64 and x86_64 concurrently and merge them into universal2 (see .build(...)), defaults to False
+        :type split_architectures: bool, optional
+        :param merger: called as merger(inputs, output) to combine each Mach-O file of a split build, defaults to None (lipo -create)
+        :type merger: Callable[[list[str], str], None], optional
+        :param check: raise BuildException if pyinstaller fails instead of logging it, defaults to False
+        :type check: bool, optional
+        :param version: the version being built, recorded with the build telemetry, defaults to None (the version locked in the app's lock_file)
+        :type version: str, optional
+        :return: self (current app)
+        :rtype: App
+        """
+        with BuildRecorder("app", self._name, version or locked_version(self._lock_file)) as recorder:
+            start = time.time()
+            command = self._prepare_build(dist_path, build_path, workpath_cache, split_architectures)
+            builds = self._prepare_split_build(workpath_cache) if split_architectures else None
+            manifest = self._current_build_manifest(builds) if incremental else None
+            if manifest is None and builds:
+                processes = await asyncio.gather(*(run_command(command, runner) for command, _ in builds.values()))
+                process = self._merge_split_build(builds, processes, merger)
+                self._record_build_manifest(process, incremental, builds)
+            elif manifest is None:
+                process = await run_command(command, runner)
+                self._record_build_manifest(process, incremental)
+            if manifest is None and workpath_cache:
+                self._record_workpaths(workpath_cache, builds)
+            succeeded = manifest is not None or bool(process and process.process.returncode == 0)
+            self._finish_build(start, succeeded, check)
+            if manifest is None:
+                # reused builds say nothing about how long building takes
+                recorder.artifact = self._app
+        return self
+
+    def _build_manifest(self, builds: "dict[str, tuple[list[str], str]]" = None) -> BuildManifest:
+        if builds:
+            # a split build is described by its single-architecture specs
+            specs = [command[-1] for command, _ in builds.values()]
+            return BuildManifest(specs[0], self._main_script, extra_files=[self._icon, self._entitlements, *specs[1:]])
+        return BuildManifest(self._universal_spec(), self._main_script, extra_files=[self._icon, self._entitlements])
+
+    def _current_build_manifest(self, builds: "dict[str, tuple[list[str], str]]" = None) -> BuildManifest:
+        """the manifest of the existing build, if the app exists and none of its inputs changed"""
+        manifest_file = BuildManifest.path_for(self._app)
+        if not os.path.isdir(self._app) or not os.path.isfile(manifest_file):
+            return None
+        manifest = self._build_manifest(builds)
+        if not manifest.matches(manifest_file):
+            logger.info(f"build inputs changed since '{self._app}' was built; rebuilding")
+            return None
+        logger.info(f"build inputs unchanged; reusing '{self._app}'")
+        return manifest
+
+    def _record_build_manifest(self, process: Command, incremental: bool,
+                               builds: "dict[str, tuple[list[str], str]]" = None):
+        manifest_file = BuildManifest.path_for(self._app)
+        if incremental and process and process.process.returncode == 0:
+            self._build_manifest(builds).write(manifest_file)
+        elif os.path.exists(manifest_file):
+            # a failed or untracked build leaves the previous manifest describing a bundle that no longer exists
+            os.remove(manifest_file)
+
+    def _universal_spec(self) -> str:
+        """the spec configured with .config(...), generated the first time it is needed"""
+        if self._spec is None and self._spec_arguments:
+            self._spec = spec(architecture=self._architecture, **self._spec_arguments)
+        return self._spec
+
+    def _record_workpaths(self, workpath_cache: WorkpathCache, builds: "dict[str, tuple[list[str], str]]" = None):
+        specs = [command[-1] for command, _ in builds.values()] if builds else [self._universal_spec()]
+        for spec_file in specs:
+            workpath_cache.record(spec_file)
+
+    def _prepare_build(self, dist_path: str, build_path: str, workpath_cache: WorkpathCache = None,
+                       split_architectures: bool = False) -> "list[str]":
+        """create the output directories; returns the pyinstaller command, or None for split builds (see
+        ._prepare_split_build(...))"""
         logger.info(f"(app) build initiated")
         self._build = build_path
         self._dist = dist_path
         self._app = os.path.join(self._dist, f"{self._name}.app")
-        if not self._spec:
+        if not self._spec and not self._spec_arguments:
             logger.error(f"'{self}.__spec' is currently None; call {self}.config(...) to set this value")
             raise RuntimeError(f"'{self}.__spec' is currently None; call {self}.config(...) to set this value")
+        if workpath_cache and not split_architectures:
+            self._build = workpath_cache.path_for(self._universal_spec())
         if not os.path.isdir(self._dist):
             logger.warning(f"dist_path ('{self._dist}') does not exist; attempting to create")
             try:
@@ -139,63 +326,153 @@ class App:
             except:
                 raise RuntimeError(f"failed to create non-existent build_path ('{self._build}')")
 
-        command = f"pyinstaller --noconfirm --log-level {self._pyinstaller_log_level} --distpath '{self._dist}' --workpath '{self._build}' '{self._spec}'"
-        Command.run(command)
-
-        if self._url_schema:
-            logger.debug(f"attempting to add custom schema {self._url_schema} to info.plist")
-            pl_file = os.path.join(self._app, "Contents", "Info.plist")
-            pl = None
-            with open(pl_file, 'rb') as fp:
-                pl = plistlib.load(fp)
-            os.remove(pl_file)
-            logger.debug(pl)
-            pl['CFBundleURLTypes'] = [{
-                'CFBundleURLName': self._identifier,
-                'CFBundleURLSchemes': [f"{self._url_schema}"]
-            }]
-            logger.debug(pl)
-            with open(pl_file, 'w') as fp:
-                pass
-            with open(pl_file, 'wb') as fp:
-                plistlib.dump(pl, fp)
-
-        if self._extensions:
-            logger.debug(f"attempting to register custom extension handling to Info.plist")
-            pl_file = os.path.join(self._app, "Contents", "Info.plist")
-            UTIExtension.add_custom_doc_types(pl_file, self._extensions)
+        if split_architectures:
+            return None
+        return self._pyinstaller_command(self._universal_spec(), self._dist, self._build)
+
+    def _pyinstaller_command(self, spec_file: str, dist_path: str, build_path: str) -> "list[str]":
+        return ["pyinstaller", "--noconfirm", "--log-level", self._pyinstaller_log_level, "--distpath", dist_path,
+                "--workpath", build_path, spec_file]
+
+    def _prepare_split_build(self, workpath_cache: WorkpathCache = None) -> "dict[str, tuple[list[str], str]]":
+        """generate a spec per architecture; returns {architecture: (pyinstaller command, .app it produces)}"""
+        if self._architecture != "universal2" or not self._spec_arguments:
+            raise BuildException(
+                "split_architectures requires App.config(architecture='universal2') without use_custom_spec")
+        builds = {}
+        for architecture in SPLIT_ARCHITECTURES:
+            # every architecture gets its own spec, work and dist directories so the builds cannot collide
+            specpath = os.path.join(self._spec_arguments["specpath"], architecture)
+            os.makedirs(specpath, exist_ok=True)
+            arch_spec = spec(architecture=architecture, **{**self._spec_arguments, "specpath": specpath})
+            root = os.path.join(self._build, architecture)
+            dist = os.path.join(root, "dist")
+            work = workpath_cache.path_for(arch_spec) if workpath_cache else os.path.join(root, "work")
+            os.makedirs(dist, exist_ok=True)
+            os.makedirs(work, exist_ok=True)
+            builds[architecture] = (self._pyinstaller_command(arch_spec, dist, work),
+                                    os.path.join(dist, f"{self._name}.app"))
+        return builds
+
+    @traced("app.merge_universal")
+    def _merge_split_build(self, builds: "dict[str, tuple[list[str], str]]", processes: "list[Command]",
+                           merger=None) -> Command:
+        for architecture, process in zip(builds, processes):
+            if not process or process.process.returncode != 0:
+                logger.error(f"the {architecture} build failed; not merging into universal2")
+                return process
+        merge_universal([app for _, app in builds.values()], self._app, merger=merger)
+        return processes[0]
+
+    def _finish_build(self, start: float, succeeded: bool, check: bool = False):
+        if not succeeded:
+            self._built = False
+            message = f"(app) build of '{self._app}' failed after {round(time.time() - start, 2)} second(s)"
+            if check:
+                raise BuildException(message)
+            logger.error(message)
+            return
+        if self._qt_profile:
+            with span("app.qt_prune"):
+                self.size_report = self._qt_profile.prune(self._app)
+        self._patch_info_plist()
 
         self._built = True
         end = time.time()
         logger.info(f"(app) build completed in {round(end - start, 2)} second(s)")
-        return self
 
-    def sign(self, hash: str):
-        """sign an application
+    @traced("app.info_plist")
+    def _patch_info_plist(self):
+        if not (self._url_schema or self._extensions or self._info_plist or self._binary_plist):
+            return
+        pl_file = os.path.join(self._app, "Contents", "Info.plist")
+        # every post-build change goes through one editing session and a single atomic write
+        with InfoPlistEditor(pl_file, binary=self._binary_plist or None) as pl:
+            if self._url_schema:
+                logger.debug(f"attempting to add custom schema {self._url_schema} to info.plist")
+                pl.set_url_types(self._identifier, [f"{self._url_schema}"])
+            if self._extensions:
+                logger.debug(f"attempting to register custom extension handling to Info.plist")
+                pl.set_document_types(UTIExtension.document_types(self._extensions))
+            if self._info_plist:
+                logger.debug(f"attempting to add {list(self._info_plist)} to Info.plist")
+                pl.update(self._info_plist)
+
+    @traced("app.sign")
+    def sign(self, hash: str, deep: bool = False, codesign: str = "codesign", max_workers: int = None,
+             incremental: bool = False):
+        """sign an application inside-out: every nested binary and bundle is signed (each nesting level in parallel)
+        before the app itself
 
         :param hash: hash of an Application ID (Developer); use pymacapp.helpers.get_first_application_hash() to pull the default (see docs)
         :type hash: str
+        :param deep: sign with a single `codesign --deep` instead (the previous, serial behaviour), defaults to False
+        :type deep: bool, optional
+        :param codesign: the codesign executable (or a stand-in accepting the same arguments), defaults to "codesign"
+        :type codesign: str, optional
+        :param max_workers: how many items are signed at the same time, defaults to None (see BundleSigner)
+        :type max_workers: int, optional
+        :param incremental: only re-sign binaries (and the bundles containing them) that changed since the app was last signed with the same identity and entitlements; a manifest is kept next to the app, defaults to False
+        :type incremental: bool, optional
         :return: self (current app)
         :rtype: App
         """
-        APP = self._app
-        __entitlements = ""
-        __HASH = hash
+        if deep:
+            Command.run(self._sign_command(hash, codesign))
+        else:
+            self._signer(hash, codesign, max_workers).sign(self._app, incremental=incremental)
+        self._signed = True
+        return self
+
+    @traced("app.sign")
+    async def sign_async(self, hash: str, runner: JobRunner = None, deep: bool = False, codesign: str = "codesign",
+                         incremental: bool = False):
+        """awaitable version of .sign(...)
+
+        :param hash: hash of an Application ID (Developer)
+        :type hash: str
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (no limit)
+        :type runner: JobRunner, optional
+        :param deep: sign with a single `codesign --deep` instead, defaults to False
+        :type deep: bool, optional
+        :param codesign: the codesign executable (or a stand-in accepting the same arguments), defaults to "codesign"
+        :type codesign: str, optional
+        :param incremental: only re-sign what changed since the last signing pass (see .sign(...)), defaults to False
+        :type incremental: bool, optional
+        :return: self (current app)
+        :rtype: App
+        """
+        if deep:
+            await run_command(self._sign_command(hash, codesign), runner)
+        else:
+            signer = self._signer(hash, codesign, runner.max_jobs if runner else None)
+            await signer.sign_async(self._app, runner=runner, incremental=incremental)
+        self._signed = True
+        return self
+
+    def _signing_entitlements(self) -> str:
         if self._entitlements == None:
             logger.info(f"{self._entitlements=}, using default entitlements ({MINIMUM_ENTITLEMENTS=})")
             if not os.path.exists(MINIMUM_ENTITLEMENTS):
                 write_minimum_entitlements()
-            __entitlements = MINIMUM_ENTITLEMENTS
+            return MINIMUM_ENTITLEMENTS
         elif os.path.exists(self._entitlements):
-            __entitlements = self._entitlements
-        else:
-            logger.error(f"{self._entitlements=} does not exist")
+            return self._entitlements
+        logger.error(f"{self._entitlements=} does not exist")
+        return ""
+
+    def _signer(self, hash: str, codesign: str, max_workers: int) -> BundleSigner:
+        if not os.path.exists(self._app):
+            raise BuildException(f".app ('{self._app}') does not exist; call .build(...) first")
+        return BundleSigner(hash, entitlements=self._signing_entitlements(), codesign=codesign, max_workers=max_workers)
+
+    def _sign_command(self, hash: str, codesign: str = "codesign") -> "list[str]":
+        APP = self._app
+        __entitlements = self._signing_entitlements()
         if not os.path.exists(APP):
             logger.error(f".app ('{APP}') does not exist; call .build(...) first")
-        command = f"codesign --deep --force --timestamp --options runtime --entitlements '{__entitlements}' --sign '{__HASH}' '{APP}'"
-        Command.run(command)
-        self._signed = True
-        return self
+        return [codesign, "--deep", "--force", "--timestamp", "--options", "runtime", "--entitlements", __entitlements,
+                "--sign", hash, APP]
 
     def verify(self):
         """verify the signature on the app by sending output to console, optional / not required (for debug purposes only)
@@ -204,24 +481,119 @@ class App:
         :rtype: App
         """
         logger.info("***** begin signature verification *****")
-        Command.run(f"codesign --verify --verbose '{self._app}'")
-        Command.run(f"codesign -dvvv '{self._app}'")
+        Command.run(["codesign", "--verify", "--verbose", self._app])
+        Command.run(["codesign", "-dvvv", self._app])
         logger.info("***** end signature verification *****")
         return self
 
+    def inspect(self, roots: "list[str]" = None) -> BundleInventory:
+        """list the binaries in the built app and how they link against each other; unresolved dependencies and
+        binaries nothing loads (dead weight in the download) are logged
+
+        :param roots: the binaries loaded directly, defaults to None (see BundleInventory.default_roots())
+        :type roots: list[str], optional
+        :return: the inventory (use .report() for a JSON-serializable summary)
+        :rtype: BundleInventory
+        """
+        if not self._app or not os.path.exists(self._app):
+            raise BuildException(f".app ('{self._app}') does not exist; call .build(...) first")
+        inventory = BundleInventory(self._app)
+        report = inventory.report(roots)
+        logger.info(f"'{self._app}' contains {len(report['binaries'])} binaries")
+        for path, names in report["missing"].items():
+            logger.warning(f"'{path}' links against {names}, which are not in the app")
+        if report["unreachable"]:
+            logger.info(f"{len(report['unreachable'])} binaries ({report['unreachable_bytes']} bytes) are never loaded: "
+                        f"{report['unreachable']}")
+        return inventory
+
+    @traced("app.dedup")
+    def dedup(self, min_size: int = 1024, dry_run: bool = False) -> dict:
+        """replace byte-identical files in the built app with relative symlinks (never across nested bundles); call
+        before .sign(...), since it changes the bundle's contents
+
+        :param min_size: ignore files smaller than this many bytes, defaults to 1024
+        :type min_size: int, optional
+        :param dry_run: only report what would be replaced, defaults to False
+        :type dry_run: bool, optional
+        :return: the files replaced and the bytes saved (see pymacapp.buildtools.app._dedup.deduplicate)
+        :rtype: dict
+        """
+        if not self._app or not os.path.exists(self._app):
+            raise BuildException(f".app ('{self._app}') does not exist; call .build(...) first")
+        if self._signed:
+            logger.warning(f"{self} is already signed; deduplicating invalidates the signature, call .sign(...) again")
+        return deduplicate(self._app, min_size=min_size, dry_run=dry_run)
+
+    @traced("app.manifest")
+    def manifest(self, max_workers: int = None) -> ContentManifest:
+        """hash every file in the built app (in parallel) into a canonical manifest; compare .root_digest of two builds
+        to tell whether they are identical, or .diff(...) them to see what differs
+
+        :param max_workers: how many files are hashed at the same time, defaults to None (executor default)
+        :type max_workers: int, optional
+        :return: the manifest (write it with .write(path), read it back with ContentManifest.load(path))
+        :rtype: ContentManifest
+        """
+        if not self._app or not os.path.exists(self._app):
+            raise BuildException(f".app ('{self._app}') does not exist; call .build(...) first")
+        manifest = ContentManifest.of(self._app, max_workers=max_workers)
+        logger.info(f"'{self._app}' has {len(manifest.entries)} entries, root digest {manifest.root_digest}")
+        return manifest
+
+    @traced("app.archive")
+    def archive(self, output: str = None, level: int = 6, max_workers: int = None) -> str:
+        """zip the built app for notarization (keeping symlinks and permissions), compressing in parallel
+
+        :param output: the .zip to write, defaults to None ({NAME}.zip next to the .app)
+        :type output: str, optional
+        :param level: the deflate level, defaults to 6
+        :type level: int, optional
+        :param max_workers: how many chunks are compressed at the same time, defaults to None (os.cpu_count())
+        :type max_workers: int, optional
+        :return: the path of the zip
+        :rtype: str
+        """
+        if not self._app or not os.path.exists(self._app):
+            raise BuildException(f".app ('{self._app}') does not exist; call .build(...) first")
+        output = output or f"{os.path.splitext(self._app.rstrip(os.sep))[0]}.zip"
+        BundleArchiver(level=level, max_workers=max_workers).write(self._app, output)
+        return output
+
+    @traced("app.notarize")
+    def notarize(self, notary: Notary, wait: bool = True, archive: str = None, **kwargs):
+        """notarize the signed app without building a package: the app is zipped, uploaded, and (once accepted) the
+        ticket is stapled to the .app itself
+
+        :param notary: the notary to submit through (see pymacapp.buildtools.notary)
+        :type notary: Notary
+        :param wait: poll until the notary service is done (with Notary.poll(...), which takes the extra keyword arguments), defaults to True
+        :type wait: bool, optional
+        :param archive: where to write the zip, defaults to None (see .archive(...))
+        :type archive: str, optional
+        :return: self (current app); .notarization_id and .notarization_status are set
+        :rtype: App
+        """
+        if not self._signed:
+            logger.warning(f"{self} was not signed by pymacapp; notarization will likely be rejected")
+        self.notarization_id = notary.submit(self.archive(archive), staple_path=self._app)
+        self.notarization_status = IN_PROGRESS
+        if wait:
+            self.notarization_status = notary.poll([self.notarization_id], **kwargs)[self.notarization_id]
+        return self
+
     @staticmethod
     def get_first_hash(output: bool = False) -> str:
-        """equivalent to running "security find-identity -p basic -v" in terminal and looking for the hash next to "Developer ID Application"
+        """equivalent to running "security find-identity -p basic -v" in terminal and looking for the hash next to "Developer ID Application"; the query is cached between calls (see pymacapp.cache.command_cache)
 
         :param output: log output and errors from the command to find the application hash, defaults to False
         :type output: bool, optional
         :return: the Developer ID Application hash
         :rtype: str
         """
-        command = "security find-identity -p basic -v"
+        command = ["security", "find-identity", "-p", "basic", "-v"]
 
-        # process = subprocess.Popen(command, stdout=subprocess.PIPE, cwd=os.getcwd())
-        process, output, error = Command.run(command, suppress_log=not output)
+        process, output, error = command_cache.run(command, suppress_log=not output)
         if not error:
             lines = output.splitlines()
             for line in lines:
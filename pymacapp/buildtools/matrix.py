@@ -0,0 +1,206 @@
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from ..exceptions import BuildException
+from ..logger import JsonLinesHandler, add_handler, formatter, log_context, logger, new_build_id, remove_handler
+from ..versioning import VersionLocker
+
+
+@dataclass(repr=True)
+class BuildJob:
+    """one app (and optionally its package) for BuildMatrix to build
+
+    :param name: the app name (i.e. "My New App")
+    :type name: str
+    :param main: the app's main script
+    :type main: str
+    :param identifier: the app's bundle identifier, defaults to None
+    :type identifier: str, optional
+    :param icon: path to an icon file, defaults to None
+    :type icon: str, optional
+    :param config: extra keyword arguments for App.config(...), defaults to {}
+    :type config: dict, optional
+    :param build: extra keyword arguments for App.build(...), defaults to {}
+    :type build: dict, optional
+    :param app_hash: sign the app with this Developer ID Application hash, defaults to None (unsigned)
+    :type app_hash: str, optional
+    :param package: keyword arguments for Package(...) (e.g. identifier), defaults to None (no package)
+    :type package: dict, optional
+    :param package_build: extra keyword arguments for Package.build(...) (e.g. postinstall_script), defaults to {}
+    :type package_build: dict, optional
+    :param installer_hash: sign the package with this Developer ID Installer hash, defaults to None (unsigned)
+    :type installer_hash: str, optional
+    :param credentials: (apple_id, app_specific_password, team_id); the signed package is notarized and stapled if given, defaults to None
+    :type credentials: tuple, optional
+    :param version: the version being built: telemetry is recorded under it, and it is locked in the job's own VERSION_LOCK.ini once the job succeeds, defaults to None
+    :type version: str, optional
+    """
+    name: str
+    main: str
+    identifier: str = None
+    icon: str = None
+    config: dict = field(default_factory=dict)
+    build: dict = field(default_factory=dict)
+    app_hash: str = None
+    package: dict = None
+    package_build: dict = field(default_factory=dict)
+    installer_hash: str = None
+    credentials: tuple = None
+    version: str = None
+
+
+@dataclass(repr=True)
+class JobResult:
+    """the outcome of one BuildJob"""
+    name: str
+    ok: bool
+    duration: float
+    log_file: str
+    app: str = None
+    package: str = None
+    error: str = None
+
+
+def job_directory(root: str, name: str) -> str:
+    return os.path.join(root, re.sub(r"[^0-9A-Za-z.\-]+", "-", name).strip("-") or "job")
+
+
+def _isolate_worker(level: int):
+    # prompts (e.g. VersionLocker re-using a version) must fail instead of blocking a worker forever
+    sys.stdin = open(os.devnull, "r")
+    # spawned workers import pymacapp afresh; log at the parent's level
+    logger.setLevel(level)
+
+
+def _artifact(path: str) -> str:
+    """`path`, once a step claims to have produced it"""
+    if not os.path.exists(path):
+        raise BuildException(f"'{path}' was not produced")
+    return path
+
+
+def run_job(job: BuildJob, root: str, json_log: bool = False) -> JobResult:
+    """build a single job in its own directory (build/, dist/, specs/, scripts/, build.log and, if `json_log`,
+    build.jsonl) under `root`"""
+    from .app import App
+    from .package import Package
+
+    start = time.time()
+    directory = job_directory(root, job.name)
+    paths = {name: os.path.join(directory, name) for name in ("build", "dist", "specs", "scripts", "build-pkg", "dist-pkg")}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    log_file = os.path.join(directory, "build.log")
+    lock_file = os.path.join(directory, "VERSION_LOCK.ini")
+    file_handler = logging.FileHandler(log_file, mode="w")
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+    build_id = new_build_id()
+    if json_log:
+        handlers.append(JsonLinesHandler(os.path.join(directory, "build.jsonl"), build_id=build_id))
+    for handler in handlers:
+        add_handler(handler)
+    result = JobResult(name=job.name, ok=False, duration=0.0, log_file=log_file)
+    with log_context(build_id=build_id, job=job.name):
+        try:
+            app = App(job.name, identifier=job.identifier, icon=job.icon, lock_file=lock_file)
+            app.config(job.main, **{"specpath": paths["specs"], **job.config})
+            app.build(**{"dist_path": paths["dist"], "build_path": paths["build"], **job.build, "check": True,
+                         "version": job.version})
+            result.app = _artifact(app._app)
+            if job.app_hash:
+                app.sign(job.app_hash)
+            if job.package is not None:
+                package = Package(app, scripts_path=paths["scripts"], **job.package)
+                package.build(**{"dist_path": paths["dist-pkg"], "build_path": paths["build-pkg"], **job.package_build,
+                                 "check": True, "version": job.version})
+                result.package = _artifact(os.path.join(paths["build-pkg"], f"{app._name}.pkg"))
+                if job.installer_hash:
+                    package.sign(job.installer_hash, check=True)
+                    result.package = _artifact(os.path.join(paths["dist-pkg"], f"{app._name}.pkg"))
+                    if job.credentials:
+                        package.login(*job.credentials)
+                        package.notarize(check=True)
+                        package.staple(check=True)
+            if job.version:
+                VersionLocker(job.version, lock_file=lock_file).lock()
+            result.ok = True
+        except Exception as e:
+            logger.error(f"job {job.name} failed: {e}")
+            result.error = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        finally:
+            result.duration = time.time() - start
+            for handler in handlers:
+                remove_handler(handler)
+                handler.close()
+    return result
+
+
+class BuildMatrix:
+    def __init__(self, jobs: "list[BuildJob]", root: str = os.path.join(os.getcwd(), "matrix"),
+                 max_workers: int = None, json_logs: bool = False) -> None:
+        """build many apps/packages in parallel worker processes; every job gets its own build, dist, spec, scripts
+        and version-lock paths plus a log file under `root`/<job name>
+
+        scripts using BuildMatrix must guard their entry point with ``if __name__ == "__main__":``, since workers are
+        started with the "spawn" method
+
+        :param jobs: the apps to build
+        :type jobs: list[BuildJob]
+        :param root: where every job's directory is created, defaults to os.path.join(os.getcwd(), "matrix")
+        :type root: str, optional
+        :param max_workers: how many jobs run at the same time, defaults to None (os.cpu_count())
+        :type max_workers: int, optional
+        :param json_logs: also write every job's log as JSON lines (build.jsonl, see pymacapp.logger.JsonLinesHandler), defaults to False
+        :type json_logs: bool, optional
+        """
+        names = [job_directory(root, job.name) for job in jobs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"job names must map to distinct directories: {[job.name for job in jobs]}")
+        self.jobs = jobs
+        self.root = os.path.abspath(root)
+        self.max_workers = max_workers
+        self.json_logs = json_logs
+
+    def __repr__(self) -> str:
+        return f"BuildMatrix({len(self.jobs)} jobs, {self.root=}, {self.max_workers=})"
+
+    def run(self) -> "list[JobResult]":
+        """run every job and return their results, in the order the jobs were given"""
+        start = time.time()
+        os.makedirs(self.root, exist_ok=True)
+        logger.info(f"(matrix) running {len(self.jobs)} job(s) in '{self.root}'")
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                 initializer=_isolate_worker, initargs=(logger.level,)) as executor:
+            futures = [executor.submit(run_job, job, self.root, self.json_logs) for job in self.jobs]
+            results = []
+            for job, future in zip(self.jobs, futures):
+                try:
+                    results.append(future.result())
+                except BaseException as e:
+                    # the worker itself died (the job's own errors are reported in its JobResult)
+                    results.append(JobResult(name=job.name, ok=False, duration=0.0,
+                                             log_file=os.path.join(job_directory(self.root, job.name), "build.log"),
+                                             error=repr(e)))
+        for line in self.summary(results).splitlines():
+            logger.info(line)
+        logger.info(f"(matrix) completed in {round(time.time() - start, 2)} second(s)")
+        return results
+
+    @staticmethod
+    def summary(results: "list[JobResult]") -> str:
+        """a one-line-per-job report of `results`"""
+        width = max([len(result.name) for result in results] + [3])
+        lines = [f"{'job':<{width}}  status  seconds  log"]
+        for result in results:
+            status = "ok" if result.ok else "FAILED"
+            lines.append(f"{result.name:<{width}}  {status:<6}  {result.duration:>7.1f}  {result.log_file}")
+        return "\n".join(lines)
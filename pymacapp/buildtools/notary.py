@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Union
+from ..command import Command
+from ..exceptions import BuildException
+from ..helpers import CACHE_DIR, load_json, write_json_atomic
+from ..logger import logger
+from ..tracing import traced
+
+NOTARY_STATE_FILE = os.path.join(CACHE_DIR, "notary.json")
+
+IN_PROGRESS = "In Progress"
+ACCEPTED = "Accepted"
+INVALID = "Invalid"
+REJECTED = "Rejected"
+# set by the poller, never by the notary service
+STAPLED = "Stapled"
+STAPLE_FAILED = "Staple Failed"
+# the status could not be checked `max_failures` times in a row (bad credentials, unknown id, no notarytool, ...)
+ERROR = "Error"
+FINAL_STATUSES = (ACCEPTED, STAPLED, STAPLE_FAILED, INVALID, REJECTED, ERROR)
+
+
+@dataclass(repr=False)
+class NotaryCredentials:
+    apple_id: str
+    password: str
+    team_id: str
+
+    def __repr__(self) -> str:
+        return f"NotaryCredentials({self.apple_id=}, {self.team_id=})"
+
+    def arguments(self) -> "list[str]":
+        return ["--apple-id", self.apple_id, "--password", self.password, "--team-id", self.team_id]
+
+
+def _argv(tool: Union[str, "list[str]"]) -> "list[str]":
+    return [tool] if isinstance(tool, str) else list(tool)
+
+
+class Notary:
+    def __init__(self, credentials: NotaryCredentials, notarytool: Union[str, "list[str]"] = ("xcrun", "notarytool"),
+                 stapler: Union[str, "list[str]"] = ("xcrun", "stapler"), state_file: str = NOTARY_STATE_FILE) -> None:
+        """submit files to Apple's notary service without waiting, and poll many submissions at once, stapling each
+        one as soon as it is accepted
+
+        submissions are recorded in `state_file` (never the credentials), so a later process can resume polling them
+
+        :param credentials: the Apple developer account to notarize with
+        :type credentials: NotaryCredentials
+        :param notarytool: the notarytool command (or a stand-in accepting the same arguments), defaults to ("xcrun", "notarytool")
+        :type notarytool: str | list[str], optional
+        :param stapler: the stapler command (or a stand-in), defaults to ("xcrun", "stapler")
+        :type stapler: str | list[str], optional
+        :param state_file: where submissions are recorded, defaults to NOTARY_STATE_FILE
+        :type state_file: str, optional
+        """
+        self.credentials = credentials
+        self.notarytool = _argv(notarytool)
+        self.stapler = _argv(stapler)
+        self.state_file = state_file
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Notary({self.credentials=}, {self.state_file=})"
+
+    def submissions(self) -> "dict[str, dict]":
+        """every recorded submission: id -> {"path", "staple", "status", "submitted", "updated"}"""
+        return load_json(self.state_file, {}).get("submissions", {})
+
+    def _record(self, submission_id: str, **values):
+        with self._lock:
+            state = load_json(self.state_file, {})
+            entry = state.setdefault("submissions", {}).setdefault(submission_id, {})
+            entry.update(values, updated=time.time())
+            write_json_atomic(self.state_file, state)
+
+    def forget(self, submission_id: str = None):
+        """drop a submission (or, if None, every finished one) from the state file"""
+        with self._lock:
+            state = load_json(self.state_file, {})
+            submissions = state.get("submissions", {})
+            for key in list(submissions):
+                if key == submission_id or (submission_id is None and submissions[key].get("status") in FINAL_STATUSES):
+                    del submissions[key]
+            write_json_atomic(self.state_file, state)
+
+    def _notarytool(self, *arguments: str) -> dict:
+        command = self.notarytool + list(arguments) + self.credentials.arguments() + ["--output-format", "json"]
+        process = Command.run(command, suppress_log=True)
+        if not process or process.process.returncode != 0:
+            raise BuildException(f"notarytool {arguments[0]} failed: {process.error if process else ''}")
+        try:
+            return json.loads(process.output)
+        except ValueError:
+            raise BuildException(f"notarytool {arguments[0]} returned unexpected output: {process.output}")
+
+    @traced("notary.submit")
+    def submit(self, path: str, staple_path: str = None) -> str:
+        """upload a .pkg, .dmg or .zip to the notary service and return immediately
+
+        :param path: the file to notarize
+        :type path: str
+        :param staple_path: what to staple once accepted, e.g. the .app a .zip was made from, defaults to None (`path`)
+        :type staple_path: str, optional
+        :raises BuildException: if the upload fails
+        :return: the submission id
+        :rtype: str
+        """
+        path = os.path.abspath(path)
+        result = self._notarytool("submit", path)
+        submission_id = result.get("id")
+        if not submission_id:
+            raise BuildException(f"notarytool did not return a submission id: {result}")
+        self.track(submission_id, path, staple_path)
+        logger.info(f"uploaded '{path}' to notary service (uuid={submission_id})")
+        return submission_id
+
+    def track(self, submission_id: str, path: str, staple_path: str = None):
+        """record a submission made elsewhere (e.g. `notarytool submit` without --wait) so it can be polled and stapled"""
+        self._record(submission_id, path=os.path.abspath(path), staple=os.path.abspath(staple_path or path),
+                     status=IN_PROGRESS, submitted=time.time())
+
+    def status(self, submission_id: str) -> str:
+        """the notary service's current status of a submission ("In Progress", "Accepted", "Invalid" or "Rejected")"""
+        return self._notarytool("info", submission_id).get("status", IN_PROGRESS)
+
+    def log(self, submission_id: str) -> str:
+        """the notary service's log of a (finished) submission"""
+        command = self.notarytool + ["log", submission_id] + self.credentials.arguments()
+        process = Command.run(command, suppress_log=True)
+        return process.output if process else ""
+
+    @traced("notary.staple")
+    def staple(self, path: str) -> bool:
+        """staple the notarization ticket to `path`"""
+        process = Command.run(self.stapler + ["staple", path], suppress_log=True)
+        if not process or process.process.returncode != 0:
+            logger.error(f"unable to staple '{path}': {process.error if process else ''}")
+            return False
+        logger.info(f"stapled '{path}'")
+        return True
+
+    @traced("notary.wait")
+    def _poll_one(self, submission_id: str, initial_delay: float, max_delay: float, backoff: float, deadline: float,
+                  staple: bool, max_failures: int) -> str:
+        entry = self.submissions().get(submission_id, {})
+        path = entry.get("path")
+        delay = initial_delay
+        failures = 0
+        while True:
+            try:
+                status = self.status(submission_id)
+                failures = 0
+            except BuildException as e:
+                # network trouble is common during long waits, but errors that keep coming back will not go away
+                failures += 1
+                if failures >= max_failures:
+                    logger.error(f"giving up on {submission_id} ('{path}') after {failures} failed check(s): {e}")
+                    self._record(submission_id, status=ERROR, error=str(e))
+                    return ERROR
+                logger.warning(f"unable to check notarization of {submission_id} ({failures}/{max_failures}): {e}")
+                status = IN_PROGRESS
+            if status != IN_PROGRESS:
+                break
+            if deadline is not None and time.monotonic() + delay > deadline:
+                logger.warning(f"stopped waiting for {submission_id} ('{path}'); poll again later to resume")
+                return IN_PROGRESS
+            time.sleep(delay)
+            delay = min(delay * backoff, max_delay)
+        logger.info(f"notarization of '{path}' ({submission_id}) finished: {status}")
+        if status == ACCEPTED and staple and path:
+            status = STAPLED if self.staple(entry.get("staple", path)) else STAPLE_FAILED
+        elif status in (INVALID, REJECTED):
+            logger.error(f"notary log for {submission_id}:\n{self.log(submission_id)}")
+        self._record(submission_id, status=status)
+        return status
+
+    def poll(self, submission_ids: "list[str]" = None, initial_delay: float = 15.0, max_delay: float = 300.0,
+             backoff: float = 2.0, timeout: float = None, staple: bool = True, max_workers: int = None,
+             max_failures: int = 5) -> "dict[str, str]":
+        """wait for submissions concurrently, checking each one with exponential backoff, and staple each file as soon
+        as it is accepted
+
+        :param submission_ids: the submissions to wait for, defaults to None (every unfinished one in the state file)
+        :type submission_ids: list[str], optional
+        :param initial_delay: seconds between the first checks of a submission, defaults to 15.0
+        :type initial_delay: float, optional
+        :param max_delay: the longest wait between two checks, defaults to 300.0
+        :type max_delay: float, optional
+        :param backoff: how much the wait grows after every check, defaults to 2.0
+        :type backoff: float, optional
+        :param timeout: give up (leaving the submissions resumable) after this many seconds, defaults to None (wait forever)
+        :type timeout: float, optional
+        :param staple: staple accepted files, defaults to True
+        :type staple: bool, optional
+        :param max_workers: how many submissions are checked at the same time, defaults to None (all of them)
+        :type max_workers: int, optional
+        :param max_failures: record a submission as "Error" once its status could not be checked this many times in a row, defaults to 5
+        :type max_failures: int, optional
+        :return: submission id -> final status ("Stapled", "Accepted", "Invalid", "Error", ...), or "In Progress" on timeout
+        :rtype: dict[str, str]
+        """
+        if submission_ids is None:
+            submission_ids = [key for key, entry in self.submissions().items()
+                              if entry.get("status") not in FINAL_STATUSES]
+        if not submission_ids:
+            return {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers or len(submission_ids)) as executor:
+            statuses = list(executor.map(
+                lambda submission_id: self._poll_one(submission_id, initial_delay, max_delay, backoff, deadline, staple,
+                                                  max_failures),
+                submission_ids))
+        logger.info(f"polled {len(submission_ids)} submission(s) in {round(time.time() - start, 2)} second(s)")
+        return dict(zip(submission_ids, statuses))
@@ -2,30 +2,51 @@ from ..app import App
 from ...logger import logger
 from ...helpers import COLLECT_SCRIPTS_HERE
 from ...command import Command
+from ...exceptions import BuildException
+from ...cache import command_cache
+from ...jobs import JobRunner, run_command
+from ...tracing import redact, traced
+from ...telemetry import BuildRecorder
+from ...versioning import locked_version
+from ..notary import NOTARY_STATE_FILE, Notary, NotaryCredentials
+from typing import Union
 import time
 import shutil
 import os
 
 
 class Package:
-    def __init__(self, app: App, version: str = "0.0.1", identifier: str = None) -> None:
+    def __init__(self, app: App, version: str = "0.0.1", identifier: str = None, scripts_path: str = None) -> None:
+        """create a new package instance
+
+        :param app: the (built) app to package
+        :type app: App
+        :param version: the package version, defaults to "0.0.1"
+        :type version: str, optional
+        :param identifier: the package identifier, defaults to None
+        :type identifier: str, optional
+        :param scripts_path: the directory pre/postinstall scripts are collected in, defaults to None (COLLECT_SCRIPTS_HERE, shared by every package)
+        :type scripts_path: str, optional
+        """
         self.app: App = app
         self.identifier = identifier
         self.version = version
+        self.__scripts = scripts_path or COLLECT_SCRIPTS_HERE
         self.__build = None
         self.__dist = None
         self.__developer_id: str = None
         self.__developer_team_id: str = None
         self.__developer_app_specific_password: str = None
+        self.__request_uuid: str = None
         logger.debug(f"{self} created")
         if not os.path.exists(self.app._app):
             logger.error(f"app build ('{self.app._app}') does not exist")
             raise RuntimeError()
-        if not os.path.exists(COLLECT_SCRIPTS_HERE):
+        if not os.path.exists(self.__scripts):
             try:
-                os.mkdir(COLLECT_SCRIPTS_HERE)
+                os.mkdir(self.__scripts)
             except:
-                logger.warning(f"unable to make temp directory '{COLLECT_SCRIPTS_HERE}'")
+                logger.warning(f"unable to make temp directory '{self.__scripts}'")
 
     def __repr__(self) -> str:
         return f"Package({self.app=})"
@@ -34,9 +55,22 @@ class Package:
     def is_logged_in(self):
         return self.__developer_id and self.__developer_app_specific_password and self.__developer_team_id
 
+    @staticmethod
+    def _succeeded(process: Command, step: str, check: bool) -> bool:
+        """whether a step's command exited with 0; a failure is logged, or raised as a BuildException if `check`"""
+        if process and process.process.returncode == 0:
+            return True
+        message = f"(package) {step} failed: {(process.error or '').strip() if process else 'unable to run the command'}"
+        if check:
+            raise BuildException(message)
+        logger.error(message)
+        return False
+
+    @traced("package.build")
     def build(self, preinstall_script: str = None, postinstall_script: str = None,
-              dist_path: str = os.path.join(os.getcwd(), "dist"), build_path: str = os.path.join(os.getcwd(), "build")):
-        """build the current application into a {NAME}.pkg
+              dist_path: str = os.path.join(os.getcwd(), "dist"), build_path: str = os.path.join(os.getcwd(), "build"),
+              check: bool = False, version: str = None):
+        """build the current application into a {NAME}.pkg; stops at the first command that fails
 
         :param preinstall_script: location of a preinstall script, defaults to None
         :type preinstall_script: str, optional
@@ -46,10 +80,60 @@ class Package:
         :type dist_path: str, optional
         :param build_path: where the distributable should be built, defaults to os.path.join(os.getcwd(), "build-pkg")
         :type build_path: str, optional
+        :param check: raise BuildException if a command fails instead of logging it, defaults to False
+        :type check: bool, optional
+        :param version: the version being built, recorded with the build telemetry, defaults to None (the version locked in the app's lock_file, else .version)
+        :type version: str, optional
         :return: self (current package)
         :rtype: Package
         """
-        start = time.time()
+        with BuildRecorder("package", self.app._name, version or locked_version(self.app._lock_file) or self.version) as recorder:
+            start = time.time()
+            built = True
+            for command in self._build_commands(preinstall_script, postinstall_script, dist_path, build_path):
+                if not self._succeeded(Command.run(command), os.path.basename(command[0]), check):
+                    built = False
+                    break
+            end = time.time()
+            logger.info(f"(package) build completed in {round(end - start, 2)} second(s)")
+            if built:
+                # a failed build leaves the previous .pkg (if any) behind, which says nothing about this one
+                recorder.artifact = os.path.join(self.__build, f"{self.app._name}.pkg")
+        return self
+
+    @traced("package.build")
+    async def build_async(self, preinstall_script: str = None, postinstall_script: str = None,
+                          dist_path: str = os.path.join(os.getcwd(), "dist"),
+                          build_path: str = os.path.join(os.getcwd(), "build"), runner: JobRunner = None,
+                          check: bool = False, version: str = None):
+        """awaitable version of .build(...)
+
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (no limit)
+        :type runner: JobRunner, optional
+        :param check: raise BuildException if a command fails instead of logging it, defaults to False
+        :type check: bool, optional
+        :param version: the version being built, recorded with the build telemetry, defaults to None (the version locked in the app's lock_file, else .version)
+        :type version: str, optional
+        :return: self (current package)
+        :rtype: Package
+        """
+        with BuildRecorder("package", self.app._name, version or locked_version(self.app._lock_file) or self.version) as recorder:
+            start = time.time()
+            built = True
+            for command in self._build_commands(preinstall_script, postinstall_script, dist_path, build_path):
+                if not self._succeeded(await run_command(command, runner), os.path.basename(command[0]), check):
+                    built = False
+                    break
+            end = time.time()
+            logger.info(f"(package) build completed in {round(end - start, 2)} second(s)")
+            if built:
+                # a failed build leaves the previous .pkg (if any) behind, which says nothing about this one
+                recorder.artifact = os.path.join(self.__build, f"{self.app._name}.pkg")
+        return self
+
+    def _build_commands(self, preinstall_script: str, postinstall_script: str, dist_path: str,
+                        build_path: str) -> "list[list[str]]":
+        commands = []
         logger.info(f"(pkg) build initiated")
         self.__build = build_path
         if not os.path.exists(self.__build):
@@ -71,7 +155,7 @@ class Package:
                 logger.info(f"created {self.__dist}")
 
         # 1: make sure Scripts are executable: sudo chmod -R +x $SCRIPTS
-        scripts = COLLECT_SCRIPTS_HERE
+        scripts = self.__scripts
         if not os.path.exists(scripts):
             logger.debug(f"scripts directory '{scripts}' does not exist; attempting to create it now")
             os.mkdir(scripts)
@@ -102,51 +186,71 @@ class Package:
             if verified_postinstall_script:
                 shutil.copyfile(verified_postinstall_script, os.path.join(scripts, "postinstall"))
             logger.info(f"ensuring {scripts=} is executable (sudo chmod -R +x {scripts})")
-            Command.run(f"sudo -S chmod -R +x {scripts}")
+            commands.append(["sudo", "-S", "chmod", "-R", "+x", scripts])
 
         # 2: productbuild
-        build_command = f"pkgbuild"
+        build_command = ["pkgbuild"]
         if self.version:
-            build_command = build_command + f" --version {self.version}"
+            build_command += ["--version", self.version]
         if self.identifier:
-            build_command = build_command + f" --identifier {self.identifier}"
+            build_command += ["--identifier", self.identifier]
         else:
             raise RuntimeError(f"cannot package without an identifier; set in the Package's constructor")
         if verified_preinstall_script or verified_postinstall_script:
-            build_command = build_command + f" --scripts '{COLLECT_SCRIPTS_HERE}'"
-        build_command = build_command + f" --root '{self.app._app}' --install-location '/Applications/{self.app._name}.app' '{os.path.join(self.__build, f'{self.app._name}.pkg')}'"
-        Command.run(build_command)
-        end = time.time()
-        logger.info(f"(package) build completed in {round(end - start, 2)} second(s)")
-        return self
+            build_command += ["--scripts", scripts]
+        build_command += ["--root", self.app._app, "--install-location", f"/Applications/{self.app._name}.app",
+                          os.path.join(self.__build, f"{self.app._name}.pkg")]
+        commands.append(build_command)
+        return commands
 
-    def sign(self, hash: str):
+    @traced("package.sign")
+    def sign(self, hash: str, check: bool = False):
         """sign the current package
 
         :param hash: hash of an Installer ID (Developer); use pymacapp.helpers.get_first_installer_hash() to pull the default (see docs)
         :type hash: str
+        :param check: raise BuildException if productsign fails instead of logging it, defaults to False
+        :type check: bool, optional
         :return: self (current package)
         :rtype: Package
         """
-        command = f"productsign --sign {hash}"
-        command = command + f""" '{os.path.join(self.__build, f"{self.app._name}.pkg")}'"""
-        command = command + f""" '{os.path.join(self.__dist, f"{self.app._name}.pkg")}'"""
-        logger.debug(f"signing with: {command}")
-        logger.info("attempting to package sign")
-        Command.run(command)
+        self._succeeded(Command.run(self._sign_command(hash)), "productsign", check)
+        return self
+
+    @traced("package.sign")
+    async def sign_async(self, hash: str, runner: JobRunner = None, check: bool = False):
+        """awaitable version of .sign(...)
+
+        :param hash: hash of an Installer ID (Developer)
+        :type hash: str
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (no limit)
+        :type runner: JobRunner, optional
+        :param check: raise BuildException if productsign fails instead of logging it, defaults to False
+        :type check: bool, optional
+        :return: self (current package)
+        :rtype: Package
+        """
+        self._succeeded(await run_command(self._sign_command(hash), runner), "productsign", check)
         return self
 
+    def _sign_command(self, hash: str) -> "list[str]":
+        command = ["productsign", "--sign", hash, os.path.join(self.__build, f"{self.app._name}.pkg"),
+                   os.path.join(self.__dist, f"{self.app._name}.pkg")]
+        logger.debug("signing with: %s", redact(command))
+        logger.info("attempting to package sign")
+        return command
+
     @staticmethod
     def get_first_hash(output: bool = False) -> str:
-        """equivalent to running "security find-identity -p basic -v" in terminal and looking for the hash next to "Developer ID Installer"
+        """equivalent to running "security find-identity -p basic -v" in terminal and looking for the hash next to "Developer ID Installer"; the query is cached between calls (see pymacapp.cache.command_cache)
 
         :param output: log output and errors from the command to find the application hash, defaults to False
         :type output: bool, optional
         :return: the Developer ID Installer hash
         :rtype: str
         """
-        command = "security find-identity -p basic -v"
-        process, output, error = Command.run(command, suppress_log=not output)
+        command = ["security", "find-identity", "-p", "basic", "-v"]
+        process, output, error = command_cache.run(command, suppress_log=not output)
         if not error:
             lines = output.splitlines()
             for line in lines:
@@ -185,9 +289,45 @@ class Package:
             if input("Are you sure you want to continue (y): ") != "y":
                 raise KeyboardInterrupt()
 
-    def notarize(self, wait: bool = True):
-        """notarize the current package through Apple's notary service (ensure you call .login(...) first)"""
+    @traced("package.notarize")
+    def notarize(self, wait: bool = True, check: bool = False):
+        """notarize the current package through Apple's notary service (ensure you call .login(...) first); with
+        `check`, a failed submission raises BuildException instead of being logged"""
+        command = self._notarize_command(wait)
+
+        # the submission id is printed long before `--wait` returns, so pick it out of the live output
+        def find_request_uuid(line: str):
+            if self.__request_uuid is None:
+                self._find_request_uuid(line)
+
+        self.__request_uuid = None
+        self._succeeded(Command.stream(command, on_stdout=find_request_uuid), "notarytool submit", check)
+        return self
+
+    @traced("package.notarize")
+    async def notarize_async(self, wait: bool = True, runner: JobRunner = None, check: bool = False):
+        """awaitable version of .notarize(...); other steps keep running while the notary service is waited on
+
+        :param wait: wait for the notary service to accept or reject the package, defaults to True
+        :type wait: bool, optional
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (no limit)
+        :type runner: JobRunner, optional
+        :param check: raise BuildException if the submission fails instead of logging it, defaults to False
+        :type check: bool, optional
+        :return: self (current package)
+        :rtype: Package
+        """
+        command = self._notarize_command(wait)
+        self.__request_uuid = None
+        process = await run_command(command, runner)
+        self._succeeded(process, "notarytool submit", check)
+        if process and process.output:
+            for line in process.output.splitlines():
+                if self._find_request_uuid(line):
+                    break
+        return self
 
+    def _notarize_command(self, wait: bool) -> "list[str]":
         if not self.app._signed:
             logger.warning(
                 f"pymacapp does not indicate that your app {self.app} was signed; notary service may fail if the .app is not signed (you should call .sign(...) on your App instance)")
@@ -196,33 +336,105 @@ class Package:
 
         self._check_login()
 
-        command = f"""xcrun notarytool submit --apple-id={self.__developer_id} --password {self.__developer_app_specific_password} --team-id {self.__developer_team_id} '{os.path.join(self.__dist, f"{self.app._name}.pkg")}'"""
+        command = ["xcrun", "notarytool", "submit", f"--apple-id={self.__developer_id}",
+                   "--password", self.__developer_app_specific_password, "--team-id", self.__developer_team_id,
+                   os.path.join(self.__dist, f"{self.app._name}.pkg")]
         if(wait):
-            command = command + " --wait"
+            command.append("--wait")
 
-        logger.debug(f"signing with: {command}")
+        # the app-specific password and Apple ID must never reach a log file
+        logger.debug("notarizing with: %s", redact(command))
         logger.info("attempting to notarize")
         if(wait):
             logger.warn("waiting for notarization to complete, this may take some time; call .notarize(wait=False) if you do not want this behavior (NOT RECCOMENDED)")
-        process = Command.run(command)
-        output, error = process.output, process.error
-        if output:
-            for line in output.splitlines():
-                if "  id:" in line:
-                    self.__request_uuid = line.split(": ")[1]
-                    logger.info(f"uploaded to notary service (uuid={self.__request_uuid})")
-                    break
-        return self
+        return command
+
+    def notary(self, notarytool: Union[str, "list[str]"] = ("xcrun", "notarytool"),
+               stapler: Union[str, "list[str]"] = ("xcrun", "stapler"), state_file: str = NOTARY_STATE_FILE) -> Notary:
+        """a Notary using the credentials from .login(...); share one between packages to poll them together
+
+        :param notarytool: the notarytool command (or a stand-in accepting the same arguments), defaults to ("xcrun", "notarytool")
+        :type notarytool: str | list[str], optional
+        :param stapler: the stapler command (or a stand-in), defaults to ("xcrun", "stapler")
+        :type stapler: str | list[str], optional
+        :param state_file: where submissions are recorded, defaults to NOTARY_STATE_FILE
+        :type state_file: str, optional
+        :return: the notary
+        :rtype: Notary
+        """
+        self._check_login()
+        credentials = NotaryCredentials(self.__developer_id, self.__developer_app_specific_password,
+                                        self.__developer_team_id)
+        return Notary(credentials, notarytool=notarytool, stapler=stapler, state_file=state_file)
+
+    @traced("package.submit_notarization")
+    def submit_notarization(self, notary: Notary = None) -> str:
+        """upload the signed package to the notary service without waiting; follow with .poll_notarization(...) or
+        poll many packages at once with Notary.poll(...)
+
+        :param notary: the notary to submit through, defaults to None (.notary())
+        :type notary: Notary, optional
+        :return: the submission id
+        :rtype: str
+        """
+        notary = notary or self.notary()
+        self.__request_uuid = notary.submit(os.path.join(self.__dist, f"{self.app._name}.pkg"))
+        return self.__request_uuid
+
+    @traced("package.poll_notarization")
+    def poll_notarization(self, notary: Notary = None, **kwargs) -> str:
+        """wait for the submission made by .submit_notarization(...) and staple the package once it is accepted; takes
+        the same keyword arguments as Notary.poll(...)
+
+        :param notary: the notary to poll through, defaults to None (.notary())
+        :type notary: Notary, optional
+        :return: the final status ("Stapled", "Invalid", ...), or "In Progress" if polling timed out
+        :rtype: str
+        """
+        if not self.__request_uuid:
+            raise RuntimeError("nothing to poll; call .submit_notarization(...) first")
+        notary = notary or self.notary()
+        if self.__request_uuid not in notary.submissions():
+            # submitted with .notarize(wait=False)
+            notary.track(self.__request_uuid, os.path.join(self.__dist, f"{self.app._name}.pkg"))
+        return notary.poll([self.__request_uuid], **kwargs)[self.__request_uuid]
+
+    def _find_request_uuid(self, line: str) -> bool:
+        if "  id:" in line:
+            self.__request_uuid = line.split(": ")[1]
+            logger.info(f"uploaded to notary service (uuid={self.__request_uuid})")
+            return True
+        return False
 
     def log_full_notary_log(self):
         """logs full notary output (called when notarization fails, used to get log from notary)"""
         self._check_login()
-        command = f"xcrun notarytool log --apple-id={self.__developer_id} --password {self.__developer_app_specific_password} --team-id {self.__developer_team_id} {self.__request_uuid}"
+        command = ["xcrun", "notarytool", "log", f"--apple-id={self.__developer_id}",
+                   "--password", self.__developer_app_specific_password, "--team-id", self.__developer_team_id,
+                   self.__request_uuid]
         Command.run(command)
 
-    def staple(self):
-        """staple a package that has been notarized successfully, called automatically if .wait() is used after .notorize()"""
+    @traced("package.staple")
+    def staple(self, check: bool = False):
+        """staple a package that has been notarized successfully, called automatically if .wait() is used after .notorize()
+
+        :param check: raise BuildException if stapler fails instead of logging it, defaults to False
+        :type check: bool, optional
+        """
+        self._succeeded(Command.run(self._staple_command()), "stapler", check)
+
+    @traced("package.staple")
+    async def staple_async(self, runner: JobRunner = None, check: bool = False):
+        """awaitable version of .staple()
+
+        :param runner: a JobRunner limiting how many commands run at once, defaults to None (no limit)
+        :type runner: JobRunner, optional
+        :param check: raise BuildException if stapler fails instead of logging it, defaults to False
+        :type check: bool, optional
+        """
+        self._succeeded(await run_command(self._staple_command(), runner), "stapler", check)
+
+    def _staple_command(self) -> "list[str]":
         logger.info("preparing to staple")
         package = os.path.join(self.__dist, f"{self.app._name}.pkg")
-        command = f"xcrun stapler staple '{package}'"
-        Command.run(command)
+        return ["xcrun", "stapler", "staple", package]
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Union
+from .command import Command
+from .logger import logger
+
+# results of read-only toolchain queries (`security find-identity`, `lsregister -dump`, ...) are reused for this long
+DEFAULT_TTL = 300.0
+
+
+def _environment_digest(env: dict = None) -> str:
+    env = os.environ if env is None else env
+    digest = hashlib.sha1()
+    for key, value in sorted(env.items()):
+        digest.update(f"{key}={value}\0".encode())
+    return digest.hexdigest()
+
+
+class CommandCache:
+    def __init__(self, ttl: float = DEFAULT_TTL) -> None:
+        """memoize the results of read-only commands, keyed by the command, working directory and environment
+
+        :param ttl: the default number of seconds a result stays valid, defaults to DEFAULT_TTL
+        :type ttl: float, optional
+        """
+        self.ttl = ttl
+        self._entries: "dict[tuple, tuple[float, Command]]" = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"CommandCache({self.ttl=}, entries={len(self._entries)})"
+
+    @staticmethod
+    def key(cmd: Union[str, "list[str]"], cwd: str = None, env: dict = None) -> tuple:
+        """the cache key for a command run in `cwd` with the environment `env` (defaults to os.environ)"""
+        command = cmd if isinstance(cmd, str) else tuple(cmd)
+        return command, os.path.abspath(cwd or os.getcwd()), _environment_digest(env)
+
+    def run(self, cmd: Union[str, "list[str]"], ttl: float = None, cwd: str = None, **kwargs) -> Command:
+        """return the cached result of `cmd` if it is younger than `ttl`, otherwise execute it with Command.run(...);
+        only successful (exit status 0) results are cached
+
+        :param cmd: a command-line string or an argv list
+        :type cmd: str | list[str]
+        :param ttl: seconds a cached result stays valid, defaults to the cache's ttl
+        :type ttl: float, optional
+        :param cwd: the directory to execute the command in, defaults to os.getcwd()
+        :type cwd: str, optional
+        :return: the (possibly cached) completed command
+        :rtype: Command
+        """
+        ttl = self.ttl if ttl is None else ttl
+        key = self.key(cmd, cwd)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and now - entry[0] < ttl:
+            logger.debug(f"using cached result of {entry[1]}")
+            return entry[1]
+        result = Command.run(cmd, cwd=cwd or os.getcwd(), **kwargs)
+        if result and result.process.returncode == 0:
+            with self._lock:
+                self._entries[key] = (now, result)
+        return result
+
+    def invalidate(self, cmd: Union[str, "list[str]"] = None) -> int:
+        """drop cached results for `cmd` (regardless of working directory or environment), or everything if None
+
+        :param cmd: a command-line string or an argv list, defaults to None (all commands)
+        :type cmd: str | list[str], optional
+        :return: the number of entries removed
+        :rtype: int
+        """
+        with self._lock:
+            if cmd is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            command = cmd if isinstance(cmd, str) else tuple(cmd)
+            stale = [key for key in self._entries if key[0] == command]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+
+# shared by every query helper in pymacapp; call command_cache.invalidate() after e.g. installing a new certificate
+command_cache = CommandCache()
@@ -1,31 +1,152 @@
+import asyncio
+import resource
 import subprocess
 import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from queue import Queue
 from subprocess import CompletedProcess
+from typing import Union
 from .logger import logger
+from .tracing import command_span, redact
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+# ru_maxrss is reported in bytes on macOS but in kilobytes everywhere else
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass(frozen=True, repr=True)
+class ResourceUsage:
+    """resources consumed by a single command
+
+    :param wall_time: elapsed (wall-clock) seconds
+    :type wall_time: float
+    :param user_time: seconds of user CPU time used by the command's processes
+    :type user_time: float
+    :param system_time: seconds of system CPU time used by the command's processes
+    :type system_time: float
+    :param max_rss: peak resident set size, in bytes, of the largest child process reaped so far; the kernel only
+        exposes a running maximum across all children, so this is exact only for the largest command run to date
+    :type max_rss: int
+    """
+    wall_time: float
+    user_time: float
+    system_time: float
+    max_rss: int
+
+
+class _UsageMeter:
+    """measure a command through deltas of getrusage(RUSAGE_CHILDREN); CPU times are only attributable to a single
+    command while no other children are reaped at the same time (i.e. they are approximate under concurrency)"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def stop(self) -> ResourceUsage:
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return ResourceUsage(wall_time=time.perf_counter() - self.started,
+                             user_time=after.ru_utime - self.before.ru_utime,
+                             system_time=after.ru_stime - self.before.ru_stime,
+                             max_rss=after.ru_maxrss * _MAXRSS_UNIT)
+
+
+def _describe(cmd: Union[str, "list[str]"]) -> str:
+    return cmd if isinstance(cmd, str) else subprocess.list2cmdline(cmd)
+
+
+class _DeferredDescription:
+    """a command line with its credentials masked (see pymacapp.tracing.redact), only built if the record mentioning it
+    is emitted"""
+
+    def __init__(self, cmd: Union[str, "list[str]"]) -> None:
+        self.cmd = cmd
+
+    def __str__(self) -> str:
+        return redact(self.cmd)
+
+
+def _check_environment(cmd: Union[str, "list[str]"], executable: str, cwd: str):
+    # argv lists are executed directly, so the shell does not need to exist
+    if isinstance(cmd, str) and not os.access(executable, os.X_OK):
+        logger.error(f"'{executable}' is not an executable")
+        raise RuntimeError()
+    if not os.path.isdir(cwd):
+        logger.error(f"'{cwd}' is not a directory")
+        raise RuntimeError()
+
+
+def _popen_arguments(cmd: Union[str, "list[str]"], executable: str) -> dict:
+    if isinstance(cmd, str):
+        return {"shell": True, "executable": executable}
+    return {}
+
+
+def _not_found(cmd: "list[str]") -> CompletedProcess:
+    # mirror what the shell reports for a missing program so argv and string commands fail the same way
+    return CompletedProcess(cmd, 127, "", f"{cmd[0]}: command not found\n")
+
+
+def _pump(process: subprocess.Popen):
+    """yield ``(stream, line)`` tuples from a running process's stdout and stderr as they are written
+
+    each pipe is drained by its own thread so that neither can fill up and stall the process
+    """
+    lines = Queue()
+
+    def reader(name, pipe):
+        try:
+            for line in pipe:
+                lines.put((name, line))
+        finally:
+            pipe.close()
+            lines.put((name, None))
+
+    threads = [threading.Thread(target=reader, args=(STDOUT, process.stdout), daemon=True),
+               threading.Thread(target=reader, args=(STDERR, process.stderr), daemon=True)]
+    for thread in threads:
+        thread.start()
+    open_pipes = len(threads)
+    while open_pipes:
+        name, line = lines.get()
+        if line is None:
+            open_pipes -= 1
+        else:
+            yield name, line
+    for thread in threads:
+        thread.join()
+
 
 class Command:
-    def __init__(self, process: CompletedProcess) -> None:
+    def __init__(self, process: CompletedProcess, usage: ResourceUsage = None) -> None:
         """
         Command should never be initialized using Command(...); instead, always use classmethod Command.run(...)
         :param process: a completed process
+        :param usage: the resources the process consumed
         """
         self.process = process
         self.output = self.process.stdout
         self.error = self.process.stderr
-    
+        self.usage = usage
+
     def __getitem__(self, item):
         if item == 0:
             return self.process
         elif item == 1:
             return self.output
-        elif item == 2: 
+        elif item == 2:
             return self.error
         else:
             raise IndexError("Object only has three indices: \n[0] process:subprocess.CompletedProcess\n[1] output:str\n[2] error:str")
 
     def __str__(self) -> str:
-        return subprocess.list2cmdline(self.process.args)
-    
+        return _describe(self.process.args)
+
     def recover_command(self) -> 'list[str]':
         """return the list of arguments send to the executable; use str(Output) to recover the full command-line as a string
 
@@ -36,31 +157,194 @@ class Command:
         return r
 
     @classmethod
-    def run(cls, cmd:str, executable:str='/bin/bash', cwd:str=os.getcwd(), suppress_log = False):
+    def run(cls, cmd:Union[str, "list[str]"], executable:str='/bin/bash', cwd:str=os.getcwd(), suppress_log = False):
+        """execute a command and capture its output
+
+        :param cmd: a command-line string (run through `executable`) or an argv list (run directly, without a shell)
+        :type cmd: str | list[str]
+        :param executable: the shell used to execute string commands, defaults to '/bin/bash'
+        :type executable: str, optional
+        :param cwd: the directory to execute the command in, defaults to os.getcwd()
+        :type cwd: str, optional
+        :param suppress_log: do not log the command or its output, defaults to False
+        :type suppress_log: bool, optional
+        :return: the completed command
+        :rtype: Command
+        """
+        if not suppress_log:
+            logger.debug('attempting to execute "%s" using "%s" in "%s"', _DeferredDescription(cmd),
+                         executable if isinstance(cmd, str) else "argv", cwd)
+        _check_environment(cmd, executable, cwd)
+        meter = _UsageMeter()
+        try:
+            with command_span(cmd) as details:
+                process = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True,
+                                         **_popen_arguments(cmd, executable))
+                if details is not None:
+                    details["returncode"] = process.returncode
+        except FileNotFoundError:
+            process = _not_found(cmd)
+            usage = meter.stop()
+            if not suppress_log:
+                cls._log_completed(process, usage)
+            return cls(process, usage)
+        except Exception as e:
+            logger.warning(f"an exception occurred while trying to execute command: {e}")
+        else:
+            usage = meter.stop()
+            if not suppress_log:
+                cls._log_completed(process, usage)
+            return cls(process, usage)
+
+    @staticmethod
+    def _log_completed(process: CompletedProcess, usage: ResourceUsage):
+        # outputs can be megabytes; they are passed as arguments so they are only formatted if a handler emits them
+        logger.info("process will be returned as a Command object in index 0")
+        if process.stdout:
+            logger.info("BEGIN OUTPUT FROM COMMAND: \n%s", process.stdout)
+            logger.info("END OUTPUT FROM COMMAND")
+            logger.info("output will be returned as an Output object in index 1")
+        if process.stderr:
+            logger.error("BEGIN OUTPUT FROM COMMAND: \n%s", process.stderr)
+            logger.error("END OUTPUT FROM COMMAND")
+            logger.info("error will be returned as an Output object in index 2")
+        Command._log_usage(usage)
+
+    @staticmethod
+    def _log_usage(usage: ResourceUsage):
+        logger.debug("command used %.3fs wall, %.3fs user, %.3fs system, %d bytes peak rss", usage.wall_time,
+                     usage.user_time, usage.system_time, usage.max_rss)
+
+    @staticmethod
+    def iter_lines(cmd:Union[str, "list[str]"], executable:str='/bin/bash', cwd:str=os.getcwd()):
+        """run a command and yield ``(stream, line)`` tuples as soon as the process writes them, where stream is
+        ``"stdout"`` or ``"stderr"``; nothing is buffered beyond the current line, and the process is killed if the
+        generator is closed before the command finishes
+
+        :param cmd: a command-line string (run through `executable`) or an argv list (run directly, without a shell)
+        :type cmd: str | list[str]
+        :param executable: the shell used to execute string commands, defaults to '/bin/bash'
+        :type executable: str, optional
+        :param cwd: the directory to execute the command in, defaults to os.getcwd()
+        :type cwd: str, optional
+        :return: the return code of the process (as the generator's return value)
+        :rtype: int
+        """
+        _check_environment(cmd, executable, cwd)
+        try:
+            process = subprocess.Popen(cmd, cwd=cwd, text=True, bufsize=1, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, **_popen_arguments(cmd, executable))
+        except FileNotFoundError:
+            missing = _not_found(cmd)
+            yield STDERR, missing.stderr
+            return missing.returncode
+        try:
+            yield from _pump(process)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        return process.returncode
+
+    @classmethod
+    def stream(cls, cmd:Union[str, "list[str]"], executable:str='/bin/bash', cwd:str=os.getcwd(), on_stdout=None,
+               on_stderr=None, tail:int=1000, suppress_log=False):
+        """execute a command like Command.run(...), but log and dispatch each line of output as it arrives instead of
+        after the process exits; only the last `tail` lines of each stream are kept for the returned Command
+
+        :param cmd: a command-line string (run through `executable`) or an argv list (run directly, without a shell)
+        :type cmd: str | list[str]
+        :param executable: the shell used to execute string commands, defaults to '/bin/bash'
+        :type executable: str, optional
+        :param cwd: the directory to execute the command in, defaults to os.getcwd()
+        :type cwd: str, optional
+        :param on_stdout: called with each line (without its newline) written to stdout, defaults to None
+        :type on_stdout: Callable[[str], None], optional
+        :param on_stderr: called with each line (without its newline) written to stderr, defaults to None
+        :type on_stderr: Callable[[str], None], optional
+        :param tail: the number of trailing lines of each stream to keep in memory (None keeps everything), defaults to 1000
+        :type tail: int, optional
+        :param suppress_log: do not log the command or its output, defaults to False
+        :type suppress_log: bool, optional
+        :return: a Command whose output and error hold the retained tail of each stream
+        :rtype: Command
+        """
         if not suppress_log:
-            logger.debug(f"""attempting to execute "{cmd}" using "{executable}" in "{cwd}" """)
-        if os.access(executable, os.X_OK):
-            if os.path.isdir(cwd):
-                try:
-                    process = subprocess.run(cmd, shell=True, executable=executable, cwd=cwd, capture_output=True, text=True)
-                except Exception as e:
-                    logger.warning(f"an exception occurred while trying to execute command: {e}")
-                else:
+            logger.debug('attempting to stream "%s" using "%s" in "%s"', _DeferredDescription(cmd),
+                         executable if isinstance(cmd, str) else "argv", cwd)
+        buffers = {STDOUT: deque(maxlen=tail), STDERR: deque(maxlen=tail)}
+        callbacks = {STDOUT: on_stdout, STDERR: on_stderr}
+        meter = _UsageMeter()
+        lines = cls.iter_lines(cmd, executable=executable, cwd=cwd)
+        with command_span(cmd) as details:
+            try:
+                while True:
+                    name, line = next(lines)
+                    buffers[name].append(line)
+                    stripped = line.rstrip("\n")
                     if not suppress_log:
-                        logger.info(f"process will be returned as a Command object in index 0")
-                    if process.stdout and not suppress_log:
-                            logger.info(f"BEGIN OUTPUT FROM COMMAND: \n{process.stdout}")
-                            logger.info(f"END OUTPUT FROM COMMAND")
-                            logger.info(f"output will be returned as an Output object in index 1")
-                    if process.stderr and not suppress_log:
-                        logger.error(f"BEGIN OUTPUT FROM COMMAND: \n{process.stderr}")
-                        logger.error(f"END OUTPUT FROM COMMAND")
-                        logger.info(f"error will be returned as an Output object in index 2")
-                    return cls(process)
-                    
-            else:
-                logger.error(f"'{cwd}' is not a directory")
-                raise RuntimeError()
+                        if name == STDOUT:
+                            logger.info("[stdout] %s", stripped)
+                        else:
+                            logger.error("[stderr] %s", stripped)
+                    if callbacks[name]:
+                        callbacks[name](stripped)
+            except StopIteration as stop:
+                returncode = stop.value
+            finally:
+                lines.close()
+            if details is not None:
+                details["returncode"] = returncode
+        usage = meter.stop()
+        process = CompletedProcess(cmd, returncode, "".join(buffers[STDOUT]), "".join(buffers[STDERR]))
+        if not suppress_log:
+            cls._log_usage(usage)
+        return cls(process, usage)
+
+
+class AsyncCommand(Command):
+    """asyncio counterpart to Command; results expose the same process/output/error indices"""
+
+    @classmethod
+    async def run(cls, cmd:Union[str, "list[str]"], executable:str='/bin/bash', cwd:str=os.getcwd(), suppress_log = False):
+        """execute a command without blocking the event loop (await AsyncCommand.run(...))
+
+        :param cmd: a command-line string (run through `executable`) or an argv list (run directly, without a shell)
+        :type cmd: str | list[str]
+        :param executable: the shell used to execute string commands, defaults to '/bin/bash'
+        :type executable: str, optional
+        :param cwd: the directory to execute the command in, defaults to os.getcwd()
+        :type cwd: str, optional
+        :param suppress_log: do not log the command or its output, defaults to False
+        :type suppress_log: bool, optional
+        :return: the completed command (usage CPU times are approximate when other commands finish concurrently)
+        :rtype: AsyncCommand
+        """
+        if not suppress_log:
+            logger.debug('attempting to execute "%s" using "%s" in "%s" (async)', _DeferredDescription(cmd),
+                         executable if isinstance(cmd, str) else "argv", cwd)
+        _check_environment(cmd, executable, cwd)
+        argv = [executable, "-c", cmd] if isinstance(cmd, str) else cmd
+        meter = _UsageMeter()
+        try:
+            with command_span(cmd) as details:
+                process = await asyncio.create_subprocess_exec(*argv, cwd=cwd,
+                                                               stdout=asyncio.subprocess.PIPE,
+                                                               stderr=asyncio.subprocess.PIPE)
+                stdout, stderr = await process.communicate()
+                if details is not None:
+                    details["returncode"] = process.returncode
+        except FileNotFoundError:
+            completed = _not_found(cmd)
+            usage = meter.stop()
+            if not suppress_log:
+                cls._log_completed(completed, usage)
+            return cls(completed, usage)
+        except Exception as e:
+            logger.warning(f"an exception occurred while trying to execute command: {e}")
         else:
-            logger.error(f"'{executable}' is not an executable")
-            raise RuntimeError()
\ No newline at end of file
+            usage = meter.stop()
+            completed = CompletedProcess(cmd, process.returncode, stdout.decode(), stderr.decode())
+            if not suppress_log:
+                cls._log_completed(completed, usage)
+            return cls(completed, usage)
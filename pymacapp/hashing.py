@@ -0,0 +1,30 @@
+import hashlib
+import json
+import mmap
+import os
+
+_CHUNK_SIZE = 1 << 20
+
+
+def sha256_file(path: str) -> str:
+    """hex sha256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_json(obj) -> str:
+    """hex sha256 of a JSON-serializable object in canonical form (sorted keys, no whitespace)"""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def sha256_mmap(path: str) -> str:
+    """hex sha256 of a file's contents, hashed straight from a memory map (no copies; hashlib releases the GIL, so
+    several large files can be hashed in parallel threads)"""
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
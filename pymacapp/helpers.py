@@ -1,4 +1,6 @@
+import json
 import os
+import tempfile
 
 
 MINIMUM_ENTITLEMENTS = os.path.join(os.path.dirname(__file__), "entitlements.plist")
@@ -16,9 +18,12 @@ def write_minimum_entitlements() -> str:
         <true/>
 </dict>
 </plist>"""
+    # written through a temp file and a rename, since parallel builds may all try to create it at once
     try:
-        with open(MINIMUM_ENTITLEMENTS,"w") as file:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(MINIMUM_ENTITLEMENTS), suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
             file.writelines(contents)
+        os.replace(tmp, MINIMUM_ENTITLEMENTS)
     except:
         raise RuntimeError("unable to create minimum entitlements file")
     return MINIMUM_ENTITLEMENTS
@@ -30,4 +35,34 @@ COLLECT_SCRIPTS_HERE = os.path.join(os.path.dirname(__file__), "Scripts/")
 APP_NAME_REGEX = r"^[0-9A-Za-z\d\s]+$"
 BUNDLE_IDENTIFIER_REGEX = r"^[A-Za-z0-9\.\-]+$"
 ARCHITECTURES = ["x86_64", "arm64", "universal2"]
-PYINSTALLER_LOG_LEVELS = ["TRACE", "DEBUG", "INFO", "WARN", "ERROR", "CRITICAL"]
\ No newline at end of file
+PYINSTALLER_LOG_LEVELS = ["TRACE", "DEBUG", "INFO", "WARN", "ERROR", "CRITICAL"]
+
+# macOS tools
+LSREGISTER = "/System/Library/Frameworks/CoreServices.framework/Frameworks/LaunchServices.framework/Versions/A/Support/lsregister"
+
+# persistent caches (UTI index, generated specs, ...) are kept here; override with $PYMACAPP_CACHE_DIR
+CACHE_DIR = os.environ.get("PYMACAPP_CACHE_DIR", os.path.join(os.path.expanduser("~"), "Library", "Caches", "pymacapp"))
+
+
+def load_json(path: str, default=None):
+    """read a JSON file, returning `default` if it is missing or unreadable"""
+    try:
+        with open(path, "r") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json_atomic(path: str, data) -> None:
+    """write a JSON file through a temp file and a rename so concurrent readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,57 @@
+import asyncio
+import os
+from typing import Union
+from .command import AsyncCommand
+from .logger import logger
+
+
+class JobRunner:
+    def __init__(self, max_jobs: int = None) -> None:
+        """limit how many external commands run at the same time when App/Package steps are awaited concurrently
+
+        :param max_jobs: the maximum number of commands executing at once, defaults to os.cpu_count()
+        :type max_jobs: int, optional
+        """
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        # created lazily so that the semaphore binds to the loop that actually awaits it
+        self._semaphore: asyncio.Semaphore = None
+        logger.debug(f"{self} created")
+
+    def __repr__(self) -> str:
+        return f"JobRunner({self.max_jobs=})"
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_jobs)
+        return self._semaphore
+
+    async def run(self, cmd: Union[str, "list[str]"], **kwargs) -> AsyncCommand:
+        """execute a command once a slot is free; takes the same keyword arguments as AsyncCommand.run(...)
+
+        :param cmd: a command-line string or an argv list
+        :type cmd: str | list[str]
+        :return: the completed command
+        :rtype: AsyncCommand
+        """
+        async with self.semaphore:
+            return await AsyncCommand.run(cmd, **kwargs)
+
+    async def gather(self, *aws) -> list:
+        """await several App/Package steps (or any awaitables) concurrently, returning their results in order"""
+        return await asyncio.gather(*aws)
+
+    def run_all(self, *aws) -> list:
+        """blocking entry point: run the given coroutines on a new event loop and return their results in order
+
+        e.g. ``JobRunner(4).run_all(app_a.build_async(runner=r), app_b.build_async(runner=r))``
+        """
+        self._semaphore = None
+        return asyncio.run(self.gather(*aws))
+
+
+async def run_command(cmd: Union[str, "list[str]"], runner: JobRunner = None, **kwargs) -> AsyncCommand:
+    """execute a command through `runner` if one is given, otherwise immediately"""
+    if runner:
+        return await runner.run(cmd, **kwargs)
+    return await AsyncCommand.run(cmd, **kwargs)
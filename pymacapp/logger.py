@@ -1,8 +1,189 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
 
 logger = logging.Logger(__name__)
+# everything is logged by default; e.g. PYMACAPP_LOG_LEVEL=INFO drops DEBUG records before anything is built
+if os.environ.get("PYMACAPP_LOG_LEVEL"):
+    logger.setLevel(os.environ["PYMACAPP_LOG_LEVEL"].upper())
 formatter = logging.Formatter("%(asctime)s pymacapp >>> %(filename)s @ %(lineno)d in .%(funcName)s(...) [%(levelname)s]: %(message)s")
 streamHandler = logging.StreamHandler()
 streamHandler.setLevel(logging.DEBUG)
 streamHandler.setFormatter(formatter)
-logger.addHandler(streamHandler)
\ No newline at end of file
+
+_context = contextvars.ContextVar("pymacapp_log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """attach `fields` (e.g. build_id, stage) to every record logged inside the block, in this thread or task; the
+    JSON-lines sink writes them out with each record
+
+    e.g.::
+
+        with log_context(build_id=new_build_id(), stage="sign"):
+            app.sign(APP_HASH)
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_context() -> dict:
+    """the log_context(...) fields in effect"""
+    return dict(_context.get())
+
+
+def new_build_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """hand records to the listener thread as they are: unlike QueueHandler, the message is not merged with its
+    arguments here, so formatting (and any large output passed as an argument) costs nothing in the calling thread, and
+    nothing at all if no handler emits the record; records never leave the process, so arguments need not be pickled"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _Listener(logging.handlers.QueueListener):
+    def handle(self, record: logging.LogRecord):
+        flushed = getattr(record, "flushed", None)
+        if flushed is not None:
+            flushed.set()
+            return
+        super().handle(record)
+
+
+_queue: queue.SimpleQueue = None
+_queueHandler: _DeferredQueueHandler = None
+_listener: _Listener = None
+_lock = threading.Lock()
+
+
+def _start(*handlers: logging.Handler):
+    """route the logger through a new queue and listener thread emitting to `handlers`"""
+    global _queue, _queueHandler, _listener
+    _queue = queue.SimpleQueue()
+    _queueHandler = _DeferredQueueHandler(_queue)
+    _queueHandler.addFilter(_ContextFilter())
+    _listener = _Listener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(_queueHandler)
+
+
+def flush(timeout: float = None) -> bool:
+    """wait until every record logged so far has been handled (e.g. before reading a log file)"""
+    if _queueHandler not in logger.handlers:
+        return True
+    record = logging.makeLogRecord({"flushed": threading.Event()})
+    _queue.put(record)
+    return record.flushed.wait(timeout)
+
+
+def add_handler(handler: logging.Handler):
+    """emit pymacapp's records through `handler` too; handlers run on the logging thread, never in the caller's"""
+    with _lock:
+        _listener.handlers = _listener.handlers + (handler,)
+        if _queueHandler not in logger.handlers:
+            logger.addHandler(handler)
+
+
+def remove_handler(handler: logging.Handler):
+    """stop emitting through `handler`, once every record logged before the call has reached it"""
+    flush()
+    with _lock:
+        _listener.handlers = tuple(h for h in _listener.handlers if h is not handler)
+        logger.removeHandler(handler)
+
+
+class JsonLinesHandler(logging.Handler):
+    def __init__(self, path: str, build_id: str = None, level: int = logging.DEBUG) -> None:
+        """write one JSON object per record to `path` (appending): time, level, message, file, line, function, the
+        build id, and every log_context(...) field of the record (e.g. stage)
+
+        :param path: the .jsonl file
+        :type path: str
+        :param build_id: the build id of records logged outside any log_context(build_id=...), defaults to None (new_build_id())
+        :type build_id: str, optional
+        :param level: the lowest level written, defaults to logging.DEBUG
+        :type level: int, optional
+        """
+        super().__init__(level)
+        self.path = path
+        self.build_id = build_id or new_build_id()
+        self.stream = open(path, "a", encoding="utf-8")
+
+    def __repr__(self) -> str:
+        return f"JsonLinesHandler({self.path=}, {self.build_id=})"
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            entry = {"time": record.created, "level": record.levelname, "message": record.getMessage(),
+                     "file": record.filename, "line": record.lineno, "function": record.funcName,
+                     "build_id": self.build_id, "stage": None, **getattr(record, "context", {})}
+            if record.exc_info:
+                entry["exception"] = formatter.formatException(record.exc_info)
+            self.stream.write(json.dumps(entry, default=str) + "\n")
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        with self.lock:
+            if not self.stream.closed:
+                self.stream.close()
+        super().close()
+
+
+def add_json_log(path: str, build_id: str = None, level: int = logging.DEBUG) -> JsonLinesHandler:
+    """start writing pymacapp's records to the JSON-lines file `path` (see JsonLinesHandler); stop with
+    remove_handler(...)
+
+    :return: the handler
+    :rtype: JsonLinesHandler
+    """
+    handler = JsonLinesHandler(path, build_id=build_id, level=level)
+    add_handler(handler)
+    return handler
+
+
+def _shutdown():
+    # drain what is queued, then log directly so records from other atexit hooks are not lost
+    with _lock:
+        if _queueHandler not in logger.handlers:
+            return
+        logger.removeHandler(_queueHandler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            logger.addHandler(handler)
+
+
+def _after_fork():
+    # the listener thread does not survive fork(); a forked child starts its own, on a queue of its own
+    global _lock
+    _lock = threading.Lock()
+    if _queueHandler in logger.handlers:
+        logger.removeHandler(_queueHandler)
+        _start(*_listener.handlers)
+
+
+_start(streamHandler)
+atexit.register(_shutdown)
+os.register_at_fork(after_in_child=_after_fork)
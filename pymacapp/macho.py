@@ -0,0 +1,201 @@
+import mmap
+import os
+import struct
+from dataclasses import dataclass, field
+
+MH_MAGIC = 0xfeedface
+MH_CIGAM = 0xcefaedfe
+MH_MAGIC_64 = 0xfeedfacf
+MH_CIGAM_64 = 0xcffaedfe
+FAT_MAGIC = 0xcafebabe
+FAT_CIGAM = 0xbebafeca
+FAT_MAGIC_64 = 0xcafebabf
+FAT_CIGAM_64 = 0xbfbafeca
+
+THIN_MAGICS = (MH_MAGIC, MH_CIGAM, MH_MAGIC_64, MH_CIGAM_64)
+FAT_MAGICS = (FAT_MAGIC, FAT_CIGAM, FAT_MAGIC_64, FAT_CIGAM_64)
+
+# java class files share 0xcafebabe; their next word is a class file version (>= 45), never a plausible slice count
+_MAX_FAT_ARCHS = 30
+
+MH_EXECUTE = 0x2
+MH_DYLIB = 0x6
+MH_BUNDLE = 0x8
+
+LC_REQ_DYLD = 0x80000000
+LC_LOAD_DYLIB = 0xc
+LC_ID_DYLIB = 0xd
+LC_LOAD_WEAK_DYLIB = 0x18 | LC_REQ_DYLD
+LC_RPATH = 0x1c | LC_REQ_DYLD
+LC_REEXPORT_DYLIB = 0x1f | LC_REQ_DYLD
+LC_LAZY_LOAD_DYLIB = 0x20
+LC_LOAD_UPWARD_DYLIB = 0x23 | LC_REQ_DYLD
+DYLIB_LOAD_COMMANDS = (LC_LOAD_DYLIB, LC_LOAD_WEAK_DYLIB, LC_REEXPORT_DYLIB, LC_LAZY_LOAD_DYLIB, LC_LOAD_UPWARD_DYLIB)
+
+_CPU_ARCH_ABI64 = 0x01000000
+CPU_TYPES = {7: "i386", 7 | _CPU_ARCH_ABI64: "x86_64", 12: "arm", 12 | _CPU_ARCH_ABI64: "arm64",
+             18: "ppc", 18 | _CPU_ARCH_ABI64: "ppc64"}
+_CPU_SUBTYPE_ARM64E = 2
+
+
+def macho_kind(header: bytes) -> str:
+    """classify the first 8 bytes of a file as "thin", "fat" or None (not Mach-O)"""
+    if len(header) < 8:
+        return None
+    magic, = struct.unpack(">I", header[:4])
+    if magic in THIN_MAGICS:
+        return "thin"
+    if magic in FAT_MAGICS:
+        count, = struct.unpack(">I" if magic in (FAT_MAGIC, FAT_MAGIC_64) else "<I", header[4:8])
+        if 0 < count <= _MAX_FAT_ARCHS:
+            return "fat"
+    return None
+
+
+def is_macho(path: str) -> bool:
+    """whether `path` is a regular file holding a (thin or fat) Mach-O binary; symlinks are never Mach-O"""
+    if os.path.islink(path) or not os.path.isfile(path):
+        return False
+    try:
+        with open(path, "rb") as fp:
+            return macho_kind(fp.read(8)) is not None
+    except OSError:
+        return False
+
+
+class MachOError(ValueError):
+    pass
+
+
+@dataclass(repr=True)
+class MachOSlice:
+    """one architecture of a Mach-O file"""
+    architecture: str
+    filetype: int
+    install_name: str = None
+    dependencies: "list[str]" = field(default_factory=list)
+    weak_dependencies: "list[str]" = field(default_factory=list)
+    rpaths: "list[str]" = field(default_factory=list)
+
+
+@dataclass(repr=True)
+class MachOFile:
+    path: str
+    fat: bool
+    slices: "list[MachOSlice]"
+
+    @property
+    def architectures(self) -> "list[str]":
+        return [s.architecture for s in self.slices]
+
+    @property
+    def filetype(self) -> int:
+        return self.slices[0].filetype if self.slices else None
+
+    @property
+    def install_name(self) -> str:
+        return next((s.install_name for s in self.slices if s.install_name), None)
+
+    def _union(self, attribute: str) -> "list[str]":
+        values = {}
+        for s in self.slices:
+            values.update(dict.fromkeys(getattr(s, attribute)))
+        return list(values)
+
+    @property
+    def dependencies(self) -> "list[str]":
+        """the install names this file links against, in any of its architectures (weak ones included)"""
+        return self._union("dependencies")
+
+    @property
+    def weak_dependencies(self) -> "list[str]":
+        return self._union("weak_dependencies")
+
+    @property
+    def rpaths(self) -> "list[str]":
+        return self._union("rpaths")
+
+
+def _architecture(cputype: int, cpusubtype: int) -> str:
+    name = CPU_TYPES.get(cputype, f"cpu{cputype:#x}")
+    if name == "arm64" and cpusubtype & 0xff == _CPU_SUBTYPE_ARM64E:
+        return "arm64e"
+    return name
+
+
+def _c_string(data, start: int, end: int) -> str:
+    terminator = data.find(b"\0", start, end)
+    return bytes(data[start:end if terminator < 0 else terminator]).decode("utf-8", "replace")
+
+
+def _parse_slice(data, offset: int, size: int) -> MachOSlice:
+    end = offset + size
+    if end > len(data) or size < 28:
+        raise MachOError(f"truncated Mach-O header at offset {offset}")
+    magic, = struct.unpack_from("<I", data, offset)
+    if magic in (MH_MAGIC, MH_MAGIC_64):
+        endian = "<"
+    elif magic in (MH_CIGAM, MH_CIGAM_64):
+        endian = ">"
+    else:
+        raise MachOError(f"no Mach-O header at offset {offset}")
+    cputype, cpusubtype, filetype, ncmds, sizeofcmds, _ = struct.unpack_from(endian + "iiIIII", data, offset + 4)
+    header_size = 32 if magic in (MH_MAGIC_64, MH_CIGAM_64) else 28
+    result = MachOSlice(_architecture(cputype & 0xffffffff, cpusubtype & 0xffffffff), filetype)
+    position = offset + header_size
+    commands_end = min(position + sizeofcmds, end)
+    for _ in range(ncmds):
+        if position + 8 > commands_end:
+            raise MachOError(f"load commands run past the end of the header at offset {offset}")
+        cmd, cmdsize = struct.unpack_from(endian + "II", data, position)
+        if cmdsize < 8 or position + cmdsize > commands_end:
+            raise MachOError(f"invalid load command size {cmdsize} at offset {position}")
+        if cmd in DYLIB_LOAD_COMMANDS or cmd == LC_ID_DYLIB or cmd == LC_RPATH:
+            name_offset, = struct.unpack_from(endian + "I", data, position + 8)
+            name = _c_string(data, position + name_offset, position + cmdsize)
+            if cmd == LC_ID_DYLIB:
+                result.install_name = name
+            elif cmd == LC_RPATH:
+                result.rpaths.append(name)
+            else:
+                result.dependencies.append(name)
+                if cmd == LC_LOAD_WEAK_DYLIB:
+                    result.weak_dependencies.append(name)
+        position += cmdsize
+    return result
+
+
+def parse_macho(path: str) -> MachOFile:
+    """read the architectures and linkage (LC_ID_DYLIB, LC_LOAD_*DYLIB, LC_RPATH) of a Mach-O file; the file is
+    memory-mapped, so only its headers are ever read from disk
+
+    :param path: the file to parse
+    :type path: str
+    :raises MachOError: if the file looks like Mach-O but its headers are malformed
+    :return: the parsed file, or None if `path` is not a (regular) Mach-O file
+    :rtype: MachOFile
+    """
+    if os.path.islink(path) or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size < 8:
+            return None
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            kind = macho_kind(data[:8])
+            if kind == "thin":
+                return MachOFile(path, False, [_parse_slice(data, 0, len(data))])
+            if kind != "fat":
+                return None
+            magic, = struct.unpack_from(">I", data, 0)
+            endian = ">" if magic in (FAT_MAGIC, FAT_MAGIC_64) else "<"
+            count, = struct.unpack_from(endian + "I", data, 4)
+            wide = magic in (FAT_MAGIC_64, FAT_CIGAM_64)
+            arch_format, arch_size = (endian + "iiQQII", 32) if wide else (endian + "iiIII", 20)
+            slices = []
+            for index in range(count):
+                position = 8 + index * arch_size
+                if position + arch_size > len(data):
+                    raise MachOError(f"truncated fat header in '{path}'")
+                _, _, offset, size = struct.unpack_from(arch_format, data, position)[:4]
+                slices.append(_parse_slice(data, offset, size))
+            return MachOFile(path, True, slices)
@@ -0,0 +1,309 @@
+import asyncio
+import contextvars
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+from .exceptions import BuildException
+from .jobs import JobRunner
+from .logger import log_context, logger
+from .tracing import span
+
+# stages that keep a core busy (pyinstaller, codesign) share a pool sized to the machine
+CPU = "cpu"
+# stages that mostly wait (uploads, the notary service, stapling) are coroutines awaited on the event loop
+IO = "io"
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+@dataclass(repr=True)
+class Stage:
+    name: str
+    action: Callable
+    inputs: "list[str]" = field(default_factory=list)
+    outputs: "list[str]" = field(default_factory=list)
+    kind: str = CPU
+    status: str = PENDING
+    result: object = None
+    error: BaseException = None
+    started: float = None
+    finished: float = None
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+@dataclass(repr=True)
+class PipelineReport:
+    stages: "list[Stage]"
+    started: float
+    finished: float
+    critical_path: "list[Stage]"
+
+    @property
+    def failed(self) -> "list[Stage]":
+        return [stage for stage in self.stages if stage.status == FAILED]
+
+    @property
+    def skipped(self) -> "list[Stage]":
+        return [stage for stage in self.stages if stage.status == SKIPPED]
+
+    def summary(self) -> str:
+        """one line per stage (start offset, duration, status), critical path stages marked with *"""
+        critical = {stage.name for stage in self.critical_path}
+        width = max([len(stage.name) for stage in self.stages] + [5])
+        lines = [f"  {'stage':<{width}}  kind  start(s)  took(s)  status"]
+        for stage in sorted(self.stages, key=lambda s: (s.started is None, s.started or 0)):
+            offset = f"{stage.started - self.started:8.1f}" if stage.started is not None else f"{'-':>8}"
+            mark = "*" if stage.name in critical else " "
+            lines.append(f"{mark} {stage.name:<{width}}  {stage.kind:<4}  {offset}  {stage.duration:7.1f}  {stage.status}")
+        total = sum(stage.duration for stage in self.critical_path)
+        lines.append(f"critical path ({round(total, 2)}s of {round(self.finished - self.started, 2)}s): "
+                     f"{' -> '.join(stage.name for stage in self.critical_path)}")
+        return "\n".join(lines)
+
+
+class Pipeline:
+    def __init__(self, max_workers: int = None) -> None:
+        """run App/Package steps as a graph of stages: a stage starts as soon as every stage producing one of its
+        inputs has finished, so waiting on the notary service for one app overlaps with building the next
+
+        e.g.::
+
+            pipeline = Pipeline()
+            pipeline.add("a:build", app_a.build, outputs=["a.app"])
+            pipeline.add("a:sign", lambda: app_a.sign(APP_HASH), inputs=["a.app"], outputs=["a.signed"])
+            pipeline.add("b:build", app_b.build, outputs=["b.app"])
+            pipeline.run()
+
+        :param max_workers: how many CPU stages run at the same time, defaults to None (os.cpu_count())
+        :type max_workers: int, optional
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.stages: "dict[str, Stage]" = {}
+
+    def __repr__(self) -> str:
+        return f"Pipeline({len(self.stages)} stages, {self.max_workers=})"
+
+    def add(self, name: str, action: Callable, inputs: "list[str]" = None, outputs: "list[str]" = None,
+            kind: str = CPU) -> Stage:
+        """add a stage
+
+        :param name: a unique stage name
+        :type name: str
+        :param action: called without arguments; coroutine functions are awaited on the event loop, anything else runs
+            in the CPU pool
+        :type action: Callable
+        :param inputs: artifacts the stage needs (each must be an output of another stage), defaults to None
+        :type inputs: list[str], optional
+        :param outputs: artifacts the stage produces, defaults to None
+        :type outputs: list[str], optional
+        :param kind: CPU (limited to max_workers at once) or IO (a coroutine function, awaited on the event loop without
+            taking a worker), defaults to CPU
+        :type kind: str, optional
+        :return: the stage (its status, result, error and timings are filled in by .run())
+        :rtype: Stage
+        """
+        if name in self.stages:
+            raise ValueError(f"a stage named '{name}' already exists")
+        if kind not in (CPU, IO):
+            raise ValueError(f"{kind=} must be CPU or IO")
+        if kind == IO and not inspect.iscoroutinefunction(action):
+            raise ValueError(f"IO stage '{name}' must be a coroutine function (e.g. Package.notarize_async)")
+        stage = Stage(name, action, list(inputs or []), list(outputs or []), kind)
+        self.stages[name] = stage
+        return stage
+
+    def dependencies(self) -> "dict[str, list[str]]":
+        """stage name -> the names of the stages producing its inputs"""
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise BuildException(f"'{output}' is produced by both '{producers[output]}' and '{stage.name}'")
+                producers[output] = stage.name
+        dependencies = {}
+        for stage in self.stages.values():
+            missing = [i for i in stage.inputs if i not in producers]
+            if missing:
+                raise BuildException(f"no stage produces {missing}, needed by '{stage.name}'")
+            dependencies[stage.name] = sorted({producers[i] for i in stage.inputs})
+        # reject cycles before anything runs
+        visiting, done = set(), set()
+
+        def visit(name, chain):
+            if name in done:
+                return
+            if name in visiting:
+                raise BuildException(f"stages form a cycle: {' -> '.join(chain + [name])}")
+            visiting.add(name)
+            for dependency in dependencies[name]:
+                visit(dependency, chain + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in dependencies:
+            visit(name, [])
+        return dependencies
+
+    @staticmethod
+    def critical_path(stages: "list[Stage]", dependencies: "dict[str, list[str]]") -> "list[Stage]":
+        """the chain of dependent stages with the largest total duration"""
+        by_name = {stage.name: stage for stage in stages}
+        best: "dict[str, tuple[float, list[str]]]" = {}
+
+        def longest(name):
+            if name not in best:
+                tails = [longest(dependency) for dependency in dependencies[name]]
+                total, chain = max(tails, key=lambda tail: tail[0], default=(0.0, []))
+                best[name] = (total + by_name[name].duration, chain + [name])
+            return best[name]
+
+        if not stages:
+            return []
+        _, chain = max((longest(name) for name in by_name), key=lambda entry: entry[0])
+        return [by_name[name] for name in chain]
+
+    async def _execute(self, stage: Stage, cpu_pool: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+
+        def begin():
+            # timed from when a worker picks the stage up, not from when it was queued
+            stage.started = time.time()
+            logger.info(f"(pipeline) starting {stage.name}")
+
+        def call():
+            with log_context(stage=stage.name), span(stage.name, "pipeline", kind=stage.kind):
+                begin()
+                return stage.action()
+
+        try:
+            if inspect.iscoroutinefunction(stage.action):
+                with log_context(stage=stage.name), span(stage.name, "pipeline", kind=stage.kind):
+                    begin()
+                    stage.result = await stage.action()
+            else:
+                # executor threads do not inherit the task's context (e.g. a log_context(build_id=...)); carry it over
+                stage.result = await loop.run_in_executor(cpu_pool, contextvars.copy_context().run, call)
+            stage.status = DONE
+        except Exception as e:
+            stage.status = FAILED
+            stage.error = e
+            logger.error(f"(pipeline) {stage.name} failed: {e}")
+        finally:
+            stage.finished = time.time()
+        logger.info(f"(pipeline) {stage.name} {stage.status} after {round(stage.duration, 2)} second(s)")
+
+    async def run_async(self, raise_on_failure: bool = True) -> PipelineReport:
+        """awaitable version of .run(...)"""
+        dependencies = self.dependencies()
+        start = time.time()
+        remaining = dict(dependencies)
+        running: "dict[asyncio.Task, str]" = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as cpu_pool:
+            while remaining or running:
+                for name, needs in list(remaining.items()):
+                    statuses = [self.stages[need].status for need in needs]
+                    if any(status in (FAILED, SKIPPED) for status in statuses):
+                        self.stages[name].status = SKIPPED
+                        logger.warning(f"(pipeline) skipping {name}; a stage it depends on did not succeed")
+                        del remaining[name]
+                    elif all(status == DONE for status in statuses):
+                        task = asyncio.ensure_future(self._execute(self.stages[name], cpu_pool))
+                        running[task] = name
+                        del remaining[name]
+                if not running:
+                    # everything left depends on something that was just skipped
+                    continue
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    del running[task]
+        stages = list(self.stages.values())
+        report = PipelineReport(stages, start, time.time(), self.critical_path(stages, dependencies))
+        for line in report.summary().splitlines():
+            logger.info(f"(pipeline) {line}")
+        if raise_on_failure and report.failed:
+            raise BuildException(f"pipeline stages failed: {[stage.name for stage in report.failed]}") \
+                from report.failed[0].error
+        return report
+
+    def run(self, raise_on_failure: bool = True) -> PipelineReport:
+        """run every stage as soon as its inputs are ready; stages depending on a failed stage are skipped
+
+        :param raise_on_failure: raise once everything that could run has finished if any stage failed, defaults to True
+        :type raise_on_failure: bool, optional
+        :raises BuildException: if a stage failed (and raise_on_failure), or the stages do not form a valid graph
+        :return: every stage's status and timings, plus the critical path
+        :rtype: PipelineReport
+        """
+        return asyncio.run(self.run_async(raise_on_failure))
+
+
+def add_release(pipeline: Pipeline, app, app_hash: str = None, package=None, installer_hash: str = None,
+                notarize: bool = False, runner: JobRunner = None, build: dict = None,
+                package_build: dict = None) -> "list[Stage]":
+    """add the usual App -> Package flow for one app: build, sign, package build, package sign, then submit to the
+    notary service, wait and staple (as one IO stage, awaited on the event loop); stages are named "<app name>:<step>"
+    and fail if their command does
+
+    :param pipeline: the pipeline to add to
+    :type pipeline: Pipeline
+    :param app: a configured App
+    :type app: App
+    :param app_hash: sign the app with this Developer ID Application hash, defaults to None (unsigned)
+    :type app_hash: str, optional
+    :param package: a Package of `app` (created after the app is built, e.g. with a lambda), defaults to None (no package)
+    :type package: Callable[[], Package], optional
+    :param installer_hash: sign the package with this Developer ID Installer hash, defaults to None (unsigned)
+    :type installer_hash: str, optional
+    :param notarize: notarize and staple the signed package (the package must be logged in), defaults to False
+    :type notarize: bool, optional
+    :param runner: a JobRunner limiting how many notarytool/stapler commands run at once, defaults to None (no limit)
+    :type runner: JobRunner, optional
+    :param build: keyword arguments for App.build(...), defaults to None
+    :type build: dict, optional
+    :param package_build: keyword arguments for Package.build(...), defaults to None
+    :type package_build: dict, optional
+    :return: the stages that were added
+    :rtype: list[Stage]
+    """
+    name = app._name
+    stages = [pipeline.add(f"{name}:build", lambda: app.build(**(build or {}), check=True), outputs=[f"{name}.app"])]
+    last = f"{name}.app"
+    if app_hash:
+        stages.append(pipeline.add(f"{name}:sign", lambda: app.sign(app_hash), inputs=[last],
+                                   outputs=[f"{name}.app(signed)"]))
+        last = f"{name}.app(signed)"
+    if package is None:
+        return stages
+    packages = []
+
+    def build_package():
+        packages.append(package())
+        return packages[0].build(**(package_build or {}), check=True)
+
+    stages.append(pipeline.add(f"{name}:package", build_package, inputs=[last], outputs=[f"{name}.pkg"]))
+    last = f"{name}.pkg"
+    if installer_hash:
+        stages.append(pipeline.add(f"{name}:sign-package", lambda: packages[0].sign(installer_hash, check=True), inputs=[last],
+                                   outputs=[f"{name}.pkg(signed)"]))
+        last = f"{name}.pkg(signed)"
+        if notarize:
+            async def notarize_package():
+                # stapling fails unless the submission was accepted
+                await packages[0].notarize_async(wait=True, runner=runner, check=True)
+                await packages[0].staple_async(runner=runner, check=True)
+                return packages[0]
+
+            stages.append(pipeline.add(f"{name}:notarize", notarize_package, inputs=[last],
+                                       outputs=[f"{name}.pkg(notarized)"], kind=IO))
+    return stages
@@ -2,10 +2,14 @@ from .logger import logger
 from .exceptions import BuildException
 from .validators import validate_app_name, validate_directory, validate_file, validate_identifier, \
     validate_pyinstaller_architecture, validate_pyinstaller_log_level
-from .helpers import ARCHITECTURES, PYINSTALLER_LOG_LEVELS
+from .helpers import ARCHITECTURES, PYINSTALLER_LOG_LEVELS, CACHE_DIR, load_json, write_json_atomic
+from .hashing import sha256_file, sha256_json
+from .tracing import traced
 from .command import Command
 import os
+import re
 from dataclasses import dataclass
+from importlib import metadata
 
 """
 Full list of needed commands (remember to separate with spaces)
@@ -36,6 +40,93 @@ class Data:
     dest: str
 
 
+SPEC_CACHE_FILE = os.path.join(CACHE_DIR, "specs.json")
+
+
+def pyinstaller_version() -> str:
+    try:
+        return metadata.version("pyinstaller")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _spec_key(command: "list[str]", main_script: str) -> str:
+    main_digest = sha256_file(main_script) if os.path.isfile(main_script) else None
+    return sha256_json({"command": command, "main_script": main_digest, "pyinstaller": pyinstaller_version()})
+
+
+def _cached_spec(key: str) -> str:
+    entry = load_json(SPEC_CACHE_FILE, {}).get(key)
+    if not entry or not os.path.isfile(entry["path"]):
+        return None
+    # the spec may have been overwritten by another configuration with the same name/specpath, or edited by hand
+    if sha256_file(entry["path"]) != entry["digest"]:
+        return None
+    return entry["path"]
+
+
+def _cache_spec(key: str, path: str):
+    entries = load_json(SPEC_CACHE_FILE, {})
+    entries[key] = {"path": path, "digest": sha256_file(path)}
+    try:
+        write_json_atomic(SPEC_CACHE_FILE, entries)
+    except OSError as e:
+        logger.warning(f"unable to update the spec cache '{SPEC_CACHE_FILE}': {e}")
+
+
+# PyInstaller versions whose (private) makespec option handling _makespec_in_process(...) is known to work with
+IN_PROCESS_PYINSTALLER_VERSIONS = ((5, 0), (7, 0))
+
+
+def _version_tuple(version: str) -> "tuple[int, ...]":
+    parts = []
+    for part in version.split("."):
+        digits = re.match(r"\d+", part)
+        if not digits:
+            break
+        parts.append(int(digits.group()))
+        if digits.end() < len(part):
+            # a pre-release such as "0rc1"
+            break
+    return tuple(parts)
+
+
+def _makespec_in_process(arguments: "list[str]") -> str:
+    """run PyInstaller's makespec machinery in this interpreter, with the same arguments pyi-makespec would receive
+
+    :return: the path to the written .spec file, or None (after a warning) if PyInstaller cannot be used here
+    :rtype: str
+    """
+    version = pyinstaller_version()
+    lowest, highest = IN_PROCESS_PYINSTALLER_VERSIONS
+    if not lowest <= _version_tuple(version) < highest:
+        logger.warning(f"PyInstaller {version} is outside the range makespec can run in-process with "
+                       f"(>={'.'.join(map(str, lowest))},<{'.'.join(map(str, highest))}); falling back to pyi-makespec")
+        return None
+    try:
+        import PyInstaller.log
+        import PyInstaller.building.makespec
+        from PyInstaller.utils.cliutils.makespec import generate_parser
+    except ImportError as e:
+        logger.warning(f"unable to import PyInstaller in-process ({e}); falling back to pyi-makespec")
+        return None
+    # pyi-makespec applies --log-level etc. through this private (name-mangled) helper
+    process_options = getattr(PyInstaller.log, "__process_options", None)
+    if process_options is None:
+        logger.warning(f"PyInstaller {version} has no PyInstaller.log.__process_options; falling back to pyi-makespec")
+        return None
+    parser = generate_parser()
+    try:
+        args = parser.parse_args(arguments)
+    except SystemExit:
+        raise BuildException(f"PyInstaller rejected the makespec arguments {arguments}")
+    process_options(parser, args)
+    # pyi-makespec splits --paths on the path separator before handing them over
+    args.pathex = [path for paths in args.pathex for path in paths.split(os.pathsep)]
+    return PyInstaller.building.makespec.main(args.scriptname, **vars(args))
+
+
+@traced("pyinstaller.spec")
 def spec(name: str,
          main_script: str,
          icon: str = None,
@@ -44,20 +135,37 @@ def spec(name: str,
          entitlements: str = None,
          hidden_imports: "list[str]" = None,
          collect_submodules: "list[str]" = None,
+         excludes: "list[str]" = None,
          # add_data:"list[Data]"=None,
          specpath: str = os.path.abspath(os.path.dirname(__file__)),
          log_level: str = "INFO",
-         brute: bool = False):
-    command = "pyi-makespec --windowed"
+         brute: bool = False,
+         use_cache: bool = True,
+         in_process: bool = True):
+    """generate a .spec file with pyi-makespec; a spec generated earlier from identical inputs (arguments, main script
+    contents and PyInstaller version) is reused without running pyi-makespec, as long as it is unmodified
+
+    :param excludes: modules pyinstaller must not bundle (--exclude-module), defaults to None
+    :type excludes: list[str], optional
+    :param use_cache: reuse a previously generated spec for identical inputs, defaults to True
+    :type use_cache: bool, optional
+    :param in_process: call PyInstaller's makespec API directly instead of spawning pyi-makespec (falls back to the
+        subprocess, with a warning, if PyInstaller is not importable from this interpreter or its version is outside
+        IN_PROCESS_PYINSTALLER_VERSIONS), defaults to True
+    :type in_process: bool, optional
+    :return: the path to the .spec file
+    :rtype: str
+    """
+    command = ["pyi-makespec", "--windowed"]
 
     if not validate_app_name(name):
         if not brute:
             raise BuildException(f"unable to validate {name=}")
         else:
-            command += f" --name '{name}'"
+            command += ["--name", name]
             logger.debug(f" --name '{name}'")
     else:
-        command += f" --name '{name}'"
+        command += ["--name", name]
         logger.debug(f" --name '{name}'")
 
     if not validate_file(main_script, ".py"):
@@ -66,29 +174,29 @@ def spec(name: str,
 
     if icon:
         if validate_file(icon):
-            command += f" --icon '{icon}'"
+            command += ["--icon", icon]
             logger.debug(f"adding --icon f'{icon}'")
         else:
             if not brute:
                 raise BuildException(f"unable to validate {icon=}")
             else:
-                command += f" --icon '{icon}'"
+                command += ["--icon", icon]
                 logger.debug(f"adding --icon f'{icon}'")
 
     if identifier:
         if validate_identifier(identifier):
-            command += f" --osx-bundle-identifier {identifier}"
+            command += ["--osx-bundle-identifier", identifier]
             logger.debug(f"adding: --osx-bundle-identifier {identifier}")
         else:
             if not brute:
                 raise BuildException(f"unable to validate {identifier=}")
             else:
-                command += f" --osx-bundle-identifier {identifier}"
+                command += ["--osx-bundle-identifier", identifier]
                 logger.debug(f"adding: --osx-bundle-identifier {identifier}")
 
     if architecture:
         if validate_pyinstaller_architecture(architecture):
-            command += f" --target-architecture {architecture}"
+            command += ["--target-architecture", architecture]
             logger.debug(f"adding: --target-architecture {architecture}")
         else:
             raise BuildException(
@@ -96,46 +204,67 @@ def spec(name: str,
 
     if hidden_imports:
         for hidden_import in hidden_imports:
-            command += f" --hidden-import {hidden_import}"
+            command += ["--hidden-import", hidden_import]
 
     if collect_submodules:
         for submodule in collect_submodules:
-            command += f" --collect-submodules {submodule}"
+            command += ["--collect-submodules", submodule]
+
+    if excludes:
+        for module in excludes:
+            command += ["--exclude-module", module]
 
     if entitlements:
         if validate_file(entitlements, ".plist"):
-            command += f" --osx-entitlements-file '{entitlements}'"
+            command += ["--osx-entitlements-file", entitlements]
             logger.debug(f"adding --osx-entitlements-file '{entitlements}'")
         else:
             if not brute:
                 raise BuildException(f"unable to validate {entitlements=}")
             else:
-                command += f" --osx-entitlements-file '{entitlements}'"
+                command += ["--osx-entitlements-file", entitlements]
                 logger.debug(f"adding --osx-entitlements-file '{entitlements}'")
 
     if specpath:
         if validate_directory(specpath):
-            command += f" --specpath '{specpath}'"
+            command += ["--specpath", specpath]
             logger.debug(f"adding --specpath '{specpath}'")
         else:
             if not brute:
                 raise BuildException(f"unable to validate {specpath=}")
             else:
-                command += f" --specpath '{specpath}'"
+                command += ["--specpath", specpath]
                 logger.debug(f"adding --specpath '{specpath}'")
 
     if log_level:
         if validate_pyinstaller_log_level(log_level):
-            command += f" --log-level {log_level}"
+            command += ["--log-level", log_level]
             logger.debug(f"adding: --log-level {log_level}")
         else:
             raise BuildException(
                 f"unable to validate {log_level=}; must be one of {PYINSTALLER_LOG_LEVELS} (will not be ignored by brute=True)")
 
-    command += f" '{main_script}'"
+    command.append(main_script)
+
+    key = _spec_key(command, main_script)
+    if use_cache:
+        cached = _cached_spec(key)
+        if cached:
+            logger.info(f"using cached spec '{cached}' (inputs unchanged)")
+            return cached
+
+    if in_process:
+        path = _makespec_in_process(command[1:])
+        if path:
+            logger.info(f"wrote spec '{path}'")
+            _cache_spec(key, path)
+            return path
 
     resp: Command = Command.run(command)
 
     for line in resp.output.splitlines():
         if "Wrote " in line:
-            return line[6:-1]
+            path = line[6:-1]
+            if os.path.isfile(path):
+                _cache_spec(key, path)
+            return path
@@ -0,0 +1,305 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from .helpers import CACHE_DIR
+from .logger import current_context, logger
+from .macho import is_macho
+from .tracing import Tracer
+
+TELEMETRY_FILE = os.path.join(CACHE_DIR, "telemetry.sqlite3")
+
+DURATION = "duration"
+BUNDLE_BYTES = "bundle_bytes"
+FILES = "files"
+BINARIES = "binaries"
+# per-stage durations are recorded as "stage:<span name>" (see pymacapp.tracing)
+STAGE_PREFIX = "stage:"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT,
+    build_id TEXT,
+    started REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_name ON runs (kind, name, id);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, metric)
+);
+"""
+
+
+def telemetry_enabled() -> bool:
+    """builds are only recorded if PYMACAPP_TELEMETRY=1"""
+    return os.environ.get("PYMACAPP_TELEMETRY", "0") == "1"
+
+
+def bundle_stats(path: str) -> "dict[str, int]":
+    """the size in bytes, file count and Mach-O binary count of a bundle (symlinks are not counted), or of a single
+    file such as a .pkg"""
+    if os.path.isfile(path):
+        return {BUNDLE_BYTES: os.path.getsize(path), FILES: 1, BINARIES: int(is_macho(path))}
+    stats = {BUNDLE_BYTES: 0, FILES: 0, BINARIES: 0}
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            filepath = os.path.join(directory, filename)
+            if os.path.islink(filepath):
+                continue
+            stats[BUNDLE_BYTES] += os.path.getsize(filepath)
+            stats[FILES] += 1
+            stats[BINARIES] += is_macho(filepath)
+    return stats
+
+
+@dataclass(repr=True)
+class Regression:
+    """a metric of a run that grew past the threshold compared to the median of the runs before it"""
+    metric: str
+    value: float
+    baseline: float
+
+    @property
+    def change(self) -> float:
+        """the relative growth (0.25 is 25% worse than the baseline)"""
+        return (self.value - self.baseline) / self.baseline if self.baseline else float("inf")
+
+    def __str__(self) -> str:
+        return f"{self.metric}: {round(self.value, 2)} vs baseline {round(self.baseline, 2)} (+{round(self.change * 100, 1)}%)"
+
+
+class TelemetryStore:
+    def __init__(self, path: str = TELEMETRY_FILE) -> None:
+        """a local history of build durations (in total and per stage) and bundle sizes, to spot regressions over time
+
+        :param path: the SQLite database, defaults to TELEMETRY_FILE
+        :type path: str, optional
+        """
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f"TelemetryStore({self.path=})"
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # concurrent builds (e.g. BuildMatrix workers) write to the same file
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def record(self, kind: str, name: str, version: str, metrics: "dict[str, float]", build_id: str = None,
+               started: float = None) -> int:
+        """store one run
+
+        :param kind: "app" or "package"
+        :type kind: str
+        :param name: the app name
+        :type name: str
+        :param version: the version being built, or None
+        :type version: str
+        :param metrics: metric -> value (DURATION, BUNDLE_BYTES, FILES, BINARIES, "stage:<name>", ...)
+        :type metrics: dict[str, float]
+        :param build_id: the build id (see pymacapp.logger.log_context), defaults to None
+        :type build_id: str, optional
+        :param started: when the run started, defaults to None (now)
+        :type started: float, optional
+        :return: the run id
+        :rtype: int
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                cursor = connection.execute("INSERT INTO runs (kind, name, version, build_id, started) VALUES (?, ?, ?, ?, ?)",
+                                            (kind, name, version, build_id, started or time.time()))
+                run_id = cursor.lastrowid
+                connection.executemany("INSERT INTO metrics (run_id, metric, value) VALUES (?, ?, ?)",
+                                       [(run_id, metric, float(value)) for metric, value in metrics.items()])
+        finally:
+            connection.close()
+        return run_id
+
+    def runs(self, name: str = None, kind: str = None, limit: int = 20) -> "list[dict]":
+        """the most recent runs first: {"id", "kind", "name", "version", "build_id", "started"}"""
+        query, parameters = "SELECT id, kind, name, version, build_id, started FROM runs", []
+        conditions = []
+        if name is not None:
+            conditions.append("name = ?")
+            parameters.append(name)
+        if kind is not None:
+            conditions.append("kind = ?")
+            parameters.append(kind)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC LIMIT ?"
+        parameters.append(limit)
+        connection = self._connect()
+        try:
+            rows = connection.execute(query, parameters).fetchall()
+        finally:
+            connection.close()
+        return [dict(zip(("id", "kind", "name", "version", "build_id", "started"), row)) for row in rows]
+
+    def metrics(self, run_id: int) -> "dict[str, float]":
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT metric, value FROM metrics WHERE run_id = ?", (run_id,)).fetchall()
+        finally:
+            connection.close()
+        return dict(rows)
+
+    def compare(self, name: str, kind: str = "app", run_id: int = None, window: int = 5, threshold: float = 0.2,
+                min_seconds: float = 1.0, min_bytes: int = 1024 ** 2) -> "list[Regression]":
+        """compare a run against the median of the `window` runs of the same app and kind before it
+
+        :param name: the app name
+        :type name: str
+        :param kind: "app" or "package", defaults to "app"
+        :type kind: str, optional
+        :param run_id: the run to check, defaults to None (the latest)
+        :type run_id: int, optional
+        :param window: how many earlier runs form the baseline, defaults to 5
+        :type window: int, optional
+        :param threshold: flag metrics that grew by more than this fraction, defaults to 0.2 (20%)
+        :type threshold: float, optional
+        :param min_seconds: ignore durations that grew by less than this many seconds (noise), defaults to 1.0
+        :type min_seconds: float, optional
+        :param min_bytes: ignore sizes that grew by less than this many bytes, defaults to 1 MiB
+        :type min_bytes: int, optional
+        :return: the regressions, worst first; empty if there is nothing to compare against
+        :rtype: list[Regression]
+        """
+        connection = self._connect()
+        try:
+            if run_id is None:
+                row = connection.execute("SELECT MAX(id) FROM runs WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+                run_id = row[0]
+            if run_id is None:
+                return []
+            baseline_ids = [row[0] for row in connection.execute(
+                "SELECT id FROM runs WHERE kind = ? AND name = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (kind, name, run_id, window))]
+            if not baseline_ids:
+                return []
+            history = {}
+            for metric, value in connection.execute(
+                    f"SELECT metric, value FROM metrics WHERE run_id IN ({','.join('?' * len(baseline_ids))})",
+                    baseline_ids):
+                history.setdefault(metric, []).append(value)
+        finally:
+            connection.close()
+        regressions = []
+        for metric, value in self.metrics(run_id).items():
+            if metric not in history:
+                continue
+            baseline = statistics.median(history[metric])
+            minimum = min_bytes if metric == BUNDLE_BYTES else min_seconds if _is_duration(metric) else 0
+            if value > baseline * (1 + threshold) and value - baseline >= minimum:
+                regressions.append(Regression(metric, value, baseline))
+        return sorted(regressions, key=lambda regression: regression.change, reverse=True)
+
+
+def _is_duration(metric: str) -> bool:
+    return metric == DURATION or metric.startswith(STAGE_PREFIX)
+
+
+class BuildRecorder:
+    def __init__(self, kind: str, name: str, version: str = None, store: TelemetryStore = None) -> None:
+        """record a build into the telemetry history: use as a context manager around the build, and set .artifact to
+        what it produced; stage durations come from the tracing spans opened inside the block, and regressions against
+        the recent builds are logged as warnings
+
+        nothing is recorded unless telemetry is enabled (PYMACAPP_TELEMETRY=1), nor if the block raises or .artifact
+        does not exist
+
+        :param kind: "app" or "package"
+        :type kind: str
+        :param name: the app name
+        :type name: str
+        :param version: the version being built, defaults to None
+        :type version: str, optional
+        :param store: where to record, defaults to None (TelemetryStore())
+        :type store: TelemetryStore, optional
+        """
+        self.kind = kind
+        self.name = name
+        self.version = version
+        self.store = store
+        self.artifact: str = None
+        self.run_id: int = None
+        self._tracer = None
+        self._started = None
+
+    def __repr__(self) -> str:
+        return f"BuildRecorder({self.kind=}, {self.name=}, {self.version=})"
+
+    def __enter__(self) -> "BuildRecorder":
+        if telemetry_enabled():
+            self._started = time.time()
+            self._tracer = Tracer(scoped=True).__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._tracer is None:
+            return
+        self._tracer.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None or not self.artifact or not os.path.exists(self.artifact):
+            return
+        metrics = {DURATION: time.time() - self._started, **bundle_stats(self.artifact)}
+        metrics.update({f"{STAGE_PREFIX}{name}": seconds for name, seconds in self._tracer.durations().items()})
+        store = self.store or TelemetryStore()
+        try:
+            self.run_id = store.record(self.kind, self.name, self.version, metrics,
+                                       build_id=current_context().get("build_id"), started=self._started)
+            regressions = store.compare(self.name, self.kind, self.run_id)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"unable to record build telemetry in '{store.path}': {e}")
+            return
+        for regression in regressions:
+            logger.warning(f"({self.kind}) {self.name} regressed: {regression}")
+
+
+def main(argv: "list[str]" = None) -> int:
+    """python -m pymacapp.telemetry runs|compare ...; compare exits with 1 if anything regressed"""
+    parser = argparse.ArgumentParser(prog="python -m pymacapp.telemetry",
+                                     description="inspect pymacapp's build telemetry history")
+    parser.add_argument("--db", default=TELEMETRY_FILE, help="the telemetry database (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    runs = commands.add_parser("runs", help="list recent runs and their metrics")
+    runs.add_argument("name", nargs="?", help="only runs of this app")
+    runs.add_argument("--kind", choices=("app", "package"))
+    runs.add_argument("--limit", type=int, default=10)
+    compare = commands.add_parser("compare", help="flag metrics of a run that regressed against the runs before it")
+    compare.add_argument("name", help="the app name")
+    compare.add_argument("--kind", choices=("app", "package"), default="app")
+    compare.add_argument("--run", type=int, help="the run id (default: the latest)")
+    compare.add_argument("--window", type=int, default=5, help="how many earlier runs form the baseline")
+    compare.add_argument("--threshold", type=float, default=0.2, help="allowed growth, as a fraction")
+    arguments = parser.parse_args(argv)
+    store = TelemetryStore(arguments.db)
+    if arguments.command == "runs":
+        for run in store.runs(arguments.name, arguments.kind, arguments.limit):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started"]))
+            print(f"#{run['id']}  {started}  {run['kind']:<7}  {run['name']}  {run['version'] or '-'}")
+            for metric, value in sorted(store.metrics(run["id"]).items()):
+                print(f"    {metric:<40} {round(value, 3)}")
+        return 0
+    regressions = store.compare(arguments.name, arguments.kind, arguments.run, arguments.window, arguments.threshold)
+    for regression in regressions:
+        print(regression)
+    if not regressions:
+        print(f"no regressions for {arguments.kind} '{arguments.name}'")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
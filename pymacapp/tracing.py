@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import inspect
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from typing import Union
+from .helpers import write_json_atomic
+from .logger import logger
+
+# arguments that must never end up in a trace file
+_SECRET_FLAGS = ("--password", "--apple-id")
+_SECRET_PATTERN = re.compile(r"(--password[= ]\s*|--apple-id[= ]\s*)\S+")
+
+# tracers recording every span in the process, and tracers recording only spans opened in their own context
+_active: "tuple[Tracer, ...]" = ()
+_scoped = contextvars.ContextVar("pymacapp_tracers", default=())
+
+
+class Tracer:
+    def __init__(self, scoped: bool = False) -> None:
+        """collect timed spans from every thread and asyncio task while active, and export them as Chrome trace-event
+        JSON (open in https://ui.perfetto.dev or chrome://tracing)
+
+        spans opened inside another span on the same thread or task are shown nested under it; spans on other threads
+        or tasks get their own track, so steps that overlap are shown side by side
+
+        e.g.::
+
+            with Tracer() as tracer:
+                app.build()
+                app.sign(APP_HASH)
+            tracer.export("trace.json")
+
+        :param scoped: only record spans opened in the context the tracer was entered in (the same thread or task, and
+            threads or tasks that inherit its context), so concurrent builds can each be traced on their own, defaults to False
+        :type scoped: bool, optional
+        """
+        self.scoped = scoped
+        self.events: "list[dict]" = []
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._tracks: "dict[tuple, int]" = {}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def __repr__(self) -> str:
+        return f"Tracer({len(self.spans())} spans)"
+
+    def __enter__(self) -> "Tracer":
+        global _active
+        if self.scoped:
+            self._token = _scoped.set(_scoped.get() + (self,))
+        else:
+            _active = _active + (self,)
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        if self.scoped:
+            _scoped.reset(self._token)
+        else:
+            _active = tuple(tracer for tracer in _active if tracer is not self)
+
+    def now(self) -> float:
+        """microseconds since the tracer was created"""
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    def _track(self) -> int:
+        """a track per thread, and per asyncio task on an event loop's thread"""
+        thread = threading.current_thread()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = (thread.ident, id(task) if task else None)
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = len(self._tracks) + 1
+                self._tracks[key] = track
+                name = f"{thread.name} / {task.get_name()}" if task else thread.name
+                self.events.append({"ph": "M", "name": "thread_name", "pid": self.pid, "tid": track,
+                                    "args": {"name": name}})
+        return track
+
+    def record(self, name: str, category: str, start: float, end: float, track: int, args: dict = None):
+        event = {"ph": "X", "name": name, "cat": category, "ts": start, "dur": end - start, "pid": self.pid,
+                 "tid": track}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name: str, category: str = "pymacapp", **args):
+        """time the block as a span of this tracer, whether or not it is active"""
+        return self._span(name, category, args)
+
+    @contextmanager
+    def _span(self, name: str, category: str, args: dict):
+        track = self._track()
+        start = self.now()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = repr(e)
+            raise
+        finally:
+            self.record(name, category, start, self.now(), track, args)
+
+    def durations(self) -> "dict[str, float]":
+        """span name -> total seconds spent in spans of that name"""
+        totals = {}
+        for event in self.spans():
+            totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+        return totals
+
+    def spans(self, name: str = None) -> "list[dict]":
+        """the recorded spans (optionally only those called `name`), in the order they finished"""
+        with self._lock:
+            return [event for event in self.events if event["ph"] == "X" and (name is None or event["name"] == name)]
+
+    def chrome_trace(self) -> dict:
+        with self._lock:
+            events = list(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"producer": "pymacapp", "process": self.pid}}
+
+    def export(self, path: str) -> str:
+        """write the trace as Chrome trace-event JSON
+
+        :param path: the .json file to write
+        :type path: str
+        :return: the path written
+        :rtype: str
+        """
+        write_json_atomic(path, self.chrome_trace())
+        logger.info(f"wrote {len(self.spans())} span(s) to '{path}'")
+        return path
+
+
+def _tracers() -> "tuple[Tracer, ...]":
+    return _active + _scoped.get()
+
+
+def current_tracer() -> Tracer:
+    """the innermost active tracer, or None if nothing is being traced"""
+    tracers = _tracers()
+    return tracers[-1] if tracers else None
+
+
+@contextmanager
+def span(name: str, category: str = "pymacapp", **args):
+    """time the block as a span of every active tracer; does nothing (and yields None) if no tracer is active
+
+    the yielded dict is recorded with the span, so details found inside the block can be added to it
+    """
+    tracers = _tracers()
+    if not tracers:
+        yield None
+        return
+    with ExitStack() as stack:
+        for tracer in tracers:
+            stack.enter_context(tracer._span(name, category, args))
+        yield args
+
+
+def traced(name: str, category: str = "pymacapp"):
+    """decorate a function or coroutine function so every call is a span of the active tracer"""
+
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def decorated_async(*args, **kwargs):
+                if not _tracers():
+                    return await f(*args, **kwargs)
+                with span(name, category):
+                    return await f(*args, **kwargs)
+
+            return decorated_async
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not _tracers():
+                return f(*args, **kwargs)
+            with span(name, category):
+                return f(*args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+
+def redact(cmd: Union[str, "list[str]"]) -> str:
+    """a command line with passwords and account names masked"""
+    if isinstance(cmd, str):
+        return _SECRET_PATTERN.sub(lambda match: f"{match.group(1)}***", cmd)
+    redacted = []
+    for index, argument in enumerate(cmd):
+        if index and cmd[index - 1] in _SECRET_FLAGS:
+            redacted.append("***")
+        elif argument.startswith(("--password=", "--apple-id=")):
+            redacted.append(f"{argument.split('=', 1)[0]}=***")
+        else:
+            redacted.append(argument)
+    return subprocess.list2cmdline(redacted)
+
+
+def command_span(cmd: Union[str, "list[str]"]):
+    """a span for running `cmd`, named after the program; a no-op if no tracer is active"""
+    if not _tracers():
+        return span(None)
+    program = cmd.split(maxsplit=1)[0] if isinstance(cmd, str) and cmd.strip() else (cmd[0] if cmd else "")
+    return span(os.path.basename(program), "command", command=redact(cmd))
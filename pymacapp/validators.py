@@ -16,7 +16,7 @@ def validate_version(version:list) -> bool:
         elif item < 0:
             logger.warning(f"invalid version: {version} (<0 value int detected)")
             return False
-    logger.info(f"validated: {version}")
+    logger.debug("validated: %s", version)
     return True
 
 def validate_app_name(name:str) -> bool:
@@ -24,7 +24,7 @@ def validate_app_name(name:str) -> bool:
     # Maximum Length: 50
     # Pattern: ^[0-9A-Za-z\d\s]+$
     if bool(re.fullmatch(APP_NAME_REGEX, name)) and len(name) <= 50:
-        logger.info(f"validated: {name}")
+        logger.debug("validated: %s", name)
         return True
     else:
         logger.warning(f"invalid app name: {name}")
@@ -35,7 +35,7 @@ def validate_identifier(identifier:str) -> bool:
     # Maximum Length: 155
     # Pattern: ^[A-Za-z0-9\.\-]+$
     if bool(re.fullmatch(BUNDLE_IDENTIFIER_REGEX, identifier)) and len(identifier) <= 155:
-        logger.info(f"validated: {identifier}")
+        logger.debug("validated: %s", identifier)
         return True
     else:
         logger.warning(f"invalid bundle identifier: {identifier}")
@@ -43,7 +43,7 @@ def validate_identifier(identifier:str) -> bool:
 
 def validate_directory(path:str) -> bool:
     if os.path.exists(path) and os.path.isdir(path):
-        logger.info(f"validated: {path}")
+        logger.debug("validated: %s", path)
         return True
     else:
         logger.warning(f"invalid directory: {path}")
@@ -53,13 +53,13 @@ def validate_file(path:str, type:str=None) -> bool:
     if os.path.exists(path) and os.path.isfile(path):
         if type:
             if path[-len(type):] == type:
-                logger.info(f"validated: {path}")
+                logger.debug("validated: %s", path)
                 return True
             else:
                 logger.warning(f"invalid file: {path}")
                 return False
         else:
-            logger.info(f"validated: {path}")
+            logger.debug("validated: %s", path)
             return True
     else:
         logger.warning(f"invalid file: {path}")
@@ -67,7 +67,7 @@ def validate_file(path:str, type:str=None) -> bool:
 
 def validate_pyinstaller_architecture(arch:str) -> bool:
     if arch in ARCHITECTURES:
-        logger.info(f"validated: {arch}")
+        logger.debug("validated: %s", arch)
         return True
     else:
         logger.warning(f"invalid architecture: {arch}")
@@ -75,7 +75,7 @@ def validate_pyinstaller_architecture(arch:str) -> bool:
 
 def validate_pyinstaller_log_level(level:str) -> bool:
     if level in PYINSTALLER_LOG_LEVELS:
-        logger.info(f"validated: {level}")
+        logger.debug("validated: %s", level)
         return True
     else:
         logger.warning(f"invalid log level: {level}")
@@ -15,15 +15,23 @@ def _version_str_to_list(version:str) -> "list[int]":
         return lst
 
 
+def locked_version(lock_file: str = LOCK_FILE) -> str:
+    """the version last locked in `lock_file`, or None if nothing was locked yet"""
+    config = configparser.ConfigParser()
+    if not config.read(lock_file):
+        return None
+    return config.get("VERSION", "__version__", fallback=None)
+
+
 class VersionLocker:
 
     def make_lock_file(self, version:str) -> bool:
-        if not os.path.exists(LOCK_FILE):
+        if not os.path.exists(self.lock_file):
             if validate_version(_version_str_to_list(version)):
                 self.config["VERSION"] = {"__version__":version}
                 v = self.config["VERSION"]
                 # print(f"new version: {v}")
-                with open(LOCK_FILE, "w") as configfile:
+                with open(self.lock_file, "w") as configfile:
                     self.config.write(configfile)
                     return True
             else:
@@ -31,9 +39,9 @@ class VersionLocker:
         return False
     
     def _update_version(self, version:str):
-        os.remove(LOCK_FILE)
+        os.remove(self.lock_file)
         self.config["VERSION"] = {"__version__":version}
-        with open(LOCK_FILE, "w") as configfile:
+        with open(self.lock_file, "w") as configfile:
             self.config.write(configfile)
             return True
 
@@ -46,7 +54,7 @@ class VersionLocker:
         :return: _description_
         :rtype: bool
         """
-        with open(LOCK_FILE, "r") as configfile:
+        with open(self.lock_file, "r") as configfile:
             self.config.read_file(configfile)
             last_version = self.config["VERSION"]["__version__"]
             cur_ver_list = _version_str_to_list(version)
@@ -74,9 +82,14 @@ class VersionLocker:
                         else:
                             return True
 
-    def __init__(self, version:str) -> None:
+    def __init__(self, version:str, lock_file:str=LOCK_FILE) -> None:
+        """
+        :param version: a period-delimited string of integers representing a build version ("1.2.4.10")
+        :param lock_file: where the last-built version is stored, defaults to LOCK_FILE (shared by every build using pymacapp)
+        """
         self.config = configparser.ConfigParser()
         self.version = version
+        self.lock_file = lock_file
     
     def lock(self):
         if not self.make_lock_file(self.version):